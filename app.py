@@ -5,58 +5,286 @@ Author: lhchlsy2000@163.com
 Date: 2024
 """
 
-from flask import Flask, request, jsonify, send_file, render_template, Response, stream_with_context, send_from_directory
+from flask import Flask, request, jsonify, send_file, render_template, Response, stream_with_context, send_from_directory, g
 import argparse
+import cProfile
+import io
+import logging
 import os
 import tempfile
-from md2ppt import MarkdownToPPT
-import requests
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from md_stream import IMAGE, SectionBuffer
+from fanout import fan_out, split_outline
+from template_cache import TemplateCache
+from image_store import ImageStore
+from llm_client import LLMError, LLMBusyError
+from llm_router import LLMRouter
+from llm_cache import MemoryCache, cache_key, create_cache
+from metrics import HTTP_REQUEST_SECONDS, REGISTRY
+from result_cache import DiskCache, KeyedLocks, result_key
+from slide_ir import content_id, dumps as dump_ir, parse_document
+from token_budget import TokenBudget, continuation_messages, count_headings
+from jobs import PRIORITY_LARGE, PRIORITY_SMALL, DONE, JobQueueFull, JobRunner, create_job_queue
 import json
-import pandas as pd
 from werkzeug.utils import secure_filename
 import config
 
+# python-pptx、pandas等渲染依赖在用到的路由中才导入（见 warmup），
+# 只调用LLM的路由和新启动的进程不需要加载它们
+
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
+
+logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+# LLM客户端，请求按未完成请求数分配到各后端，失败的后端熔断；每个后端共用连接池并限制同时进行的请求数
+llm_client = LLMRouter(
+    config.LLM_BACKENDS,
+    config.LLM_MODEL,
+    retries=config.LLM_ROUTER_RETRIES,
+    failure_threshold=config.LLM_CIRCUIT_FAILURES,
+    open_seconds=config.LLM_CIRCUIT_OPEN_SECONDS,
+    health_interval=config.LLM_HEALTH_CHECK_INTERVAL,
+    hedge_delay=config.LLM_HEDGE_DELAY,
+    pool_size=config.LLM_POOL_SIZE,
+    max_inflight=config.LLM_MAX_INFLIGHT,
+    connect_timeout=config.LLM_CONNECT_TIMEOUT,
+    read_timeout=config.LLM_READ_TIMEOUT,
+    queue_timeout=config.LLM_QUEUE_TIMEOUT,
+)
+
+# LLM token预算，按路由和提示词长度计算max_tokens，记录各路由的token用量
+token_budget = TokenBudget(config.LLM_TOKEN_BUDGETS, config.LLM_CONTEXT_WINDOW, config.LLM_TOKENIZER)
+
+# LLM响应缓存，相同的提示词直接返回缓存的结果
+llm_cache = create_cache(
+    config.LLM_CACHE_BACKEND,
+    max_size=config.LLM_CACHE_SIZE,
+    ttl=config.LLM_CACHE_TTL,
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), config.LLM_CACHE_PATH),
+)
 
-# 自定义LLM API配置
-LLM_API_URL = config.LLM_API_URL
+# 生成结果缓存，相同的内容、模板、图片和表格直接返回已生成的PPT；同时到达的相同请求只渲染一次
+result_cache = None
+if config.RESULT_CACHE_MAX_BYTES:
+    result_cache = DiskCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), config.RESULT_CACHE_DIR),
+                             config.RESULT_CACHE_MAX_BYTES)
+result_flights = KeyedLocks()
 
 # 配置上传文件存储路径
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_EXCEL_EXTENSIONS = {'xlsx', 'xls'}
 
+# cProfile结果保存目录
+PROFILE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), config.PROFILE_DIR)
+
 # 确保上传目录存在
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 上传图片索引，记录尺寸并保存缩小后的图片，相同内容只保存一份
+image_store = ImageStore(UPLOAD_FOLDER)
+
+# 模板缓存，按模板内容哈希复用已解析的模板
+template_cache = TemplateCache(config.TEMPLATE_CACHE_SIZE)
+
+# 边生成边渲染得到的PPT，等待客户端下载
+deck_store = MemoryCache(config.DECK_STORE_SIZE, config.DECK_STORE_TTL)
+
+# 上次清理上传图片的时间
+last_upload_gc = [0.0]
+
+def collect_uploads():
+    """距上次清理超过 UPLOAD_GC_INTERVAL 秒时，按大小和上传时间清理上传的图片"""
+    if not (config.UPLOAD_GC_MAX_BYTES or config.UPLOAD_GC_MAX_AGE):
+        return
+    now = time.time()
+    if now - last_upload_gc[0] < config.UPLOAD_GC_INTERVAL:
+        return
+    last_upload_gc[0] = now
+    removed = image_store.collect_garbage(config.UPLOAD_GC_MAX_BYTES, config.UPLOAD_GC_MAX_AGE)
+    if removed:
+        logger.info('Removed %d uploaded images', removed)
+
+# 已解析的Excel工作表，生成PPT时按excel_id取用
+excel_cache = MemoryCache(config.EXCEL_CACHE_SIZE, config.EXCEL_CACHE_TTL)
+
+# 解析后的幻灯片IR，按内容哈希缓存，预览后生成PPT时不再重复解析
+ir_cache = MemoryCache(config.IR_CACHE_SIZE, config.IR_CACHE_TTL)
+
+def sections_size(sections):
+    """增量渲染缓存条目的字节数"""
+    from md2ppt import sections_size
+    return sections_size(sections)
+
+# 按会话缓存上次渲染的各段幻灯片，编辑后重新生成时只渲染有变化的段；
+# 图片只记录文件路径，按幻灯片XML的总大小限制内存
+section_cache = MemoryCache(config.SECTION_CACHE_SIZE, config.SECTION_CACHE_TTL,
+                            max_bytes=config.SECTION_CACHE_MAX_BYTES, sizeof=sections_size)
+
+def parse_content(content):
+    """解析Markdown内容，返回 (ir_id, Deck)，相同内容只解析一次"""
+    ir_id = content_id(content)
+    deck = ir_cache.get(ir_id)
+    if deck is None:
+        deck = parse_document(content)
+        ir_cache.set(ir_id, deck)
+    return ir_id, deck
+
+# 同时进行的渲染数，渲染是CPU密集型，同一进程内更多的并发渲染只会互相争抢GIL
+render_slots = threading.BoundedSemaphore(config.RENDER_CONCURRENCY)
+
+# 后台渲染任务队列，工作线程在第一次提交任务时启动；SQLite队列见 start_shared_job_runner
+job_queue = create_job_queue(
+    config.JOB_QUEUE_BACKEND,
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), config.JOB_QUEUE_PATH),
+    max_running_per_client=config.JOB_MAX_RUNNING_PER_CLIENT,
+    max_queued_per_client=config.JOB_MAX_QUEUED_PER_CLIENT,
+    retention=config.JOB_RETENTION,
+    max_result_bytes=config.JOB_RESULT_MAX_BYTES,
+    lease=config.JOB_LEASE,
+    max_attempts=config.JOB_MAX_ATTEMPTS,
+)
+
+def render_job(job, progress):
+    """在工作线程中渲染后台任务"""
+    from batch import render_document
+
+    def report(done, total, slides):
+        progress(sections_done=done, sections=total, slides=slides)
+    with render_slots:
+        converter = render_document(job['payload']['content'], job['template'], UPLOAD_FOLDER,
+                                    image_store=image_store, progress=report)
+        output = io.BytesIO()
+        converter.save(output)
+    return output.getvalue()
+
+job_runner = JobRunner(job_queue, render_job, config.JOB_WORKERS)
+
+def start_shared_job_runner():
+    """SQLite队列由多个进程共享，其他进程提交的任务、领取者退出后重新排队的任务
+    都要靠本进程的工作线程领取，不能等到本进程提交任务才启动。
+    在工作进程启动后和查询任务时调用；不能在fork之前调用"""
+    if config.JOB_QUEUE_BACKEND == 'sqlite':
+        job_runner.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # 按请求开启cProfile：请求头 X-Profile: 1 或查询参数 profile=1
+    g.profiler = None
+    if config.PROFILE_ENABLED and (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 同一时刻只能有一个profiler运行（Python 3.12+）
+            return
+        g.profiler = profiler
+
+@app.after_request
+def record_request_metrics(response):
+    """记录请求耗时；流式响应只计算到开始返回响应体为止"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unknown',
+                                     str(response.status_code))
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_FOLDER, exist_ok=True)
+        name = f"{request.endpoint or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_FOLDER, name))
+        response.headers['X-Profile-File'] = name
+    return response
+
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def call_llm_api(messages, stream=False):
-    """调用自定义LLM API"""
+def call_llm_api(messages, stream=False, cache=False, route='default', items=0, hedge=False):
+    """调用自定义LLM API，stream为True时返回增量内容的生成器，cache为True时使用响应缓存
+
+    max_tokens按路由（见 config.LLM_TOKEN_BUDGETS）、项数（子主题数、大纲标题数）和提示词长度计算，
+    回复因长度截断时自动续写，返回拼接后的完整内容。hedge为True时非流式请求使用对冲调用。
+    """
+    key = None
+    if cache and llm_cache is not None:
+        key = cache_key('stream' if stream else 'chat', config.LLM_MODEL, messages, config.LLM_REQUEST_CONFIG)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return iter(cached) if stream else cached
+    if stream:
+        chunks = stream_with_budget(messages, route, items)
+        return record_stream(chunks, key) if key else chunks
     try:
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": config.LLM_MODEL,
-            "messages": messages,
-            "stream": stream,
-            "temperature": config.LLM_REQUEST_CONFIG["temperature"],
-            "max_tokens": config.LLM_REQUEST_CONFIG["max_tokens"]
-        }
-        
-        response = requests.post(LLM_API_URL, headers=headers, json=payload, stream=stream)
-        response.raise_for_status()
-        
-        if stream:
-            return response.iter_lines()
-        else:
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        content = ''.join(chat_with_budget(messages, route, items, hedge))
+    except LLMBusyError:
+        raise
     except Exception as e:
-        raise Exception(f"LLM API调用失败: {str(e)}")
+        raise LLMError(f"LLM API调用失败: {str(e)}")
+    if key:
+        llm_cache.set(key, content)
+    return content
+
+def budgeted_calls(messages, route, items, call):
+    """按token预算调用 call(消息列表, result, 请求参数)，回复因长度截断时请求模型继续
+
+    call返回增量内容的迭代器，依次返回各次调用的增量内容；最多续写 LLM_MAX_CONTINUATIONS 次，
+    上下文中没有剩余空间时不再续写。
+    """
+    partial = []
+    for attempt in range(config.LLM_MAX_CONTINUATIONS + 1):
+        request_messages = continuation_messages(messages, ''.join(partial)) if attempt else messages
+        prompt_tokens = token_budget.count(request_messages)
+        max_tokens = token_budget.max_tokens(route, prompt_tokens, items)
+        if not max_tokens:
+            if attempt:
+                return
+            raise LLMError('提示词过长，超过了模型的上下文长度')
+        result = {}
+        for content in call(request_messages, result, dict(config.LLM_REQUEST_CONFIG, max_tokens=max_tokens)):
+            partial.append(content)
+            yield content
+        token_budget.calibrate(request_messages, result.get('prompt_tokens'))
+        token_budget.record(route, prompt_tokens, max_tokens, result, continued=bool(attempt))
+        if result.get('finish_reason') != 'length':
+            return
+
+def chat_with_budget(messages, route, items=0, hedge=False):
+    """非流式调用，返回各次调用（含续写）的内容"""
+    # 单个后端的 LLMClient 没有对冲调用
+    chat = llm_client.hedged_chat if hedge and isinstance(llm_client, LLMRouter) else llm_client.chat
+    
+    def call(request_messages, result, options):
+        return [chat(request_messages, result, **options)]
+    return budgeted_calls(messages, route, items, call)
+
+def stream_with_budget(messages, route, items=0):
+    """流式调用，续写的内容接在原来的内容之后"""
+    def call(request_messages, result, options):
+        return llm_client.stream_chat(request_messages, result, **options)
+    return budgeted_calls(messages, route, items, call)
+
+def record_stream(chunks, key):
+    """边返回边记录增量内容，完整读完后写入缓存，中途出错或断开时不缓存"""
+    recorded = []
+    for content in chunks:
+        recorded.append(content)
+        yield content
+    llm_cache.set(key, recorded)
+
+def stream_llm_events(messages, cache=False, route='default', items=0):
+    """把LLM流式输出转换为SSE事件"""
+    try:
+        for content in call_llm_api(messages, stream=True, cache=cache, route=route, items=items):
+            yield f"data: {json.dumps({'content': content})}\n\n"
+    except Exception as e:
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        yield "data: [DONE]\n\n"
 
 @app.route('/')
 def index():
@@ -79,9 +307,12 @@ def generate_topics():
     """
     
     try:
-        content = call_llm_api([{"role": "user", "content": prompt}])
+        content = call_llm_api([{"role": "user", "content": prompt}], cache=True, route='topics',
+                               items=int(topic_num) if str(topic_num).isdigit() else 0, hedge=True)
         topics = content.strip().split('\n')
         return jsonify({'topics': topics})
+    except LLMBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -101,34 +332,13 @@ def generate_outline():
     7. 标题要简洁明了，每个标题不超过15个字。
     """
     
-    def generate():
-        try:
-            for line in call_llm_api([{"role": "user", "content": prompt}], stream=True):
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        try:
-                            data = json.loads(line[6:])
-                            if 'choices' in data and len(data['choices']) > 0:
-                                content = data['choices'][0].get('delta', {}).get('content', '')
-                                if content:
-                                    yield f"data: {json.dumps({'content': content})}\n\n"
-                        except json.JSONDecodeError:
-                            continue
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-        finally:
-            yield "data: [DONE]\n\n"
-    
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+    messages = [{"role": "user", "content": prompt}]
+    return Response(stream_with_context(stream_llm_events(messages, cache=True, route='outline')),
+                    mimetype='text/event-stream')
 
-@app.route('/api/generate_content', methods=['POST'])
-def generate_content():
-    data = request.json
-    outline = data.get('outline')
-    requirement = data.get('requirement', '内容专业、通俗易懂')
-    
-    prompt = f"""我对大纲进行了如下修改,这是修改后的大纲:
+def build_content_prompt(outline, requirement):
+    """根据大纲生成正文的提示词"""
+    return f"""我对大纲进行了如下修改,这是修改后的大纲:
     {outline}
     请根据大纲生成的PPT文本的正文内容,我希望你同样以markdown的格式返回,并且请遵循以下要求:
     1. 不要丢失原有的大纲markdown信息和格式。
@@ -142,21 +352,124 @@ def generate_content():
     9. 确保每个标题和段落之间有适当的空行。
     10. 不要在大纲标题和内容之间添加额外的空行。
     """
+
+def build_chapter_prompt(title, chapter, requirement):
+    """分章节生成时，根据一个章节的大纲生成正文的提示词"""
+    return f"""这是PPT《{title}》大纲中的一章:
+    {chapter}
+    请根据这一章的大纲生成PPT文本的正文内容,我希望你同样以markdown的格式返回,并且请遵循以下要求:
+    1. 只生成这一章的内容，不要丢失这一章原有的大纲markdown信息和格式。
+    2. 每个标题必须独占一行，标题前后不能有其他内容。
+    3. 每个段落必须使用<p></p>标签包围，并且独占一行。
+    4. 对正文来说，要求{requirement}。
+    5. 你需要把生成的段落放在正确的位置。
+    6. 所有内容必须使用中文。
+    7. 每个段落要简洁明了，控制在50-100字之间。
+    8. 使用专业但通俗易懂的语言。
+    9. 确保每个标题和段落之间有适当的空行。
+    """
+
+def stream_chapter_events(preamble, chapters, requirement):
+    """各章节并行生成正文，按章节顺序转换为带章节序号的SSE事件"""
+    title = next((line[2:].strip() for line in preamble.splitlines() if line.startswith('# ')), '')
+    
+    def stream(index, chapter):
+        messages = [{"role": "user", "content": build_chapter_prompt(title, chapter, requirement)}]
+        return stream_with_budget(messages, 'chapter', count_headings(chapter))
+    
+    # 章节之间空一行
+    separator = '\n\n'
+    try:
+        if preamble.strip():
+            yield f"data: {json.dumps({'content': preamble.strip() + separator})}\n\n"
+        retries = {}
+        for index, event, value in fan_out(chapters, stream, config.CONTENT_FANOUT_PARALLELISM,
+                                           config.CONTENT_FANOUT_RETRIES, config.CONTENT_FANOUT_RETRY_DELAY):
+            if event == 'content':
+                yield f"data: {json.dumps({'chapter': index, 'content': value})}\n\n"
+            elif event == 'retry':
+                retries[index] = retries.get(index, 0) + 1
+                yield f"data: {json.dumps({'chapter': index, 'retry': retries[index], 'error': value})}\n\n"
+            elif event == 'error':
+                yield f"data: {json.dumps({'chapter': index, 'error': value})}\n\n"
+            else:
+                yield f"data: {json.dumps({'chapter': index, 'content': separator})}\n\n"
+    except Exception as e:
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        yield "data: [DONE]\n\n"
+
+@app.route('/api/generate_content', methods=['POST'])
+def generate_content():
+    """根据大纲流式生成正文
+
+    fanout为true（默认为 CONTENT_FANOUT）且大纲有多个二级标题章节时，各章节并行生成，
+    内容事件带章节序号 {'chapter': i, 'content': ...}，按章节顺序推送；章节失败重试时
+    推送 {'chapter': i, 'retry': 次数, 'error': ...}，客户端应丢弃该章节已收到的内容；
+    重试用完后推送 {'chapter': i, 'error': ...}，其余章节照常生成。
+    """
+    data = request.json
+    outline = data.get('outline')
+    requirement = data.get('requirement', '内容专业、通俗易懂')
+    
+    if data.get('fanout', config.CONTENT_FANOUT):
+        preamble, chapters = split_outline(outline or '')
+        if len(chapters) > 1:
+            return Response(stream_with_context(stream_chapter_events(preamble, chapters, requirement)),
+                            mimetype='text/event-stream')
+    
+    messages = [{"role": "user", "content": build_content_prompt(outline, requirement)}]
+    return Response(stream_with_context(stream_llm_events(messages, route='content', items=count_headings(outline))),
+                    mimetype='text/event-stream')
+
+@app.route('/api/generate_content_ppt', methods=['POST'])
+def generate_content_ppt():
+    """边生成正文边渲染PPT
+
+    除了和 /api/generate_content 相同的 content 事件外，每渲染完一个一级、二级标题段落
+    推送一次 {'slide': 幻灯片数, 'title': 标题} 事件；正文生成完毕后推送
+    {'deck_id': ..., 'url': 下载地址}，通过 GET /api/decks/<deck_id> 下载PPT。
+    """
+    data = request.json
+    outline = data.get('outline')
+    requirement = data.get('requirement', '内容专业、通俗易懂')
+    template_id = data.get('template_id')
+    messages = [{"role": "user", "content": build_content_prompt(outline, requirement)}]
+    from md2ppt import MarkdownToPPT
     
     def generate():
         try:
-            for line in call_llm_api([{"role": "user", "content": prompt}], stream=True):
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        try:
-                            data = json.loads(line[6:])
-                            if 'choices' in data and len(data['choices']) > 0:
-                                content = data['choices'][0].get('delta', {}).get('content', '')
-                                if content:
-                                    yield f"data: {json.dumps({'content': content})}\n\n"
-                        except json.JSONDecodeError:
-                            continue
+            presentation = None
+            if template_id:
+                presentation = template_cache.get(template_id)
+                if presentation is None:
+                    raise ValueError('模板不存在，请重新上传模板')
+            converter = MarkdownToPPT(presentation=presentation)
+            converter.set_image_dir(UPLOAD_FOLDER)
+            converter.set_image_store(image_store)
+            
+            def render(section):
+                # 每段渲染都占用渲染名额，和其他渲染接口一样受 RENDER_CONCURRENCY 限制
+                with render_slots:
+                    converter.process_markdown(section)
+                title = section.split('\n', 1)[0].strip('# ') if section.startswith('#') else ''
+                return f"data: {json.dumps({'slide': len(converter.prs.slides), 'title': title})}\n\n"
+            
+            buffer = SectionBuffer()
+            for content in call_llm_api(messages, stream=True, route='content', items=count_headings(outline)):
+                yield f"data: {json.dumps({'content': content})}\n\n"
+                for section in buffer.feed(content):
+                    yield render(section)
+            rest = buffer.flush()
+            if rest.strip():
+                yield render(rest)
+            
+            output = io.BytesIO()
+            with render_slots:
+                converter.save(output)
+            deck_id = uuid.uuid4().hex
+            deck_store.set(deck_id, output.getvalue())
+            yield f"data: {json.dumps({'deck_id': deck_id, 'url': f'/api/decks/{deck_id}'})}\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
         finally:
@@ -164,63 +477,400 @@ def generate_content():
     
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
+@app.route('/api/decks/<deck_id>', methods=['GET'])
+def download_deck(deck_id):
+    """下载 /api/generate_content_ppt 生成的PPT"""
+    data = deck_store.get(deck_id)
+    if data is None:
+        return jsonify({'error': 'PPT不存在或已过期'}), 404
+    return send_file(
+        io.BytesIO(data),
+        mimetype='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        as_attachment=True,
+        download_name='output.pptx'
+    )
+
+def referenced_images(deck):
+    """文档引用的图片和内容哈希，用于生成结果的缓存键；不在上传索引中的图片按文件大小和修改时间"""
+    images = []
+    for slide in deck.slides:
+        for kind, payload in slide.elements:
+            if kind != IMAGE:
+                continue
+            found = image_store.resolve(payload)
+            if found is not None:
+                images.append([payload, found[1]])
+                continue
+            try:
+                stat = os.stat(os.path.join(UPLOAD_FOLDER, os.path.basename(payload)))
+                images.append([payload, stat.st_size, stat.st_mtime_ns])
+            except OSError:
+                images.append([payload, None])
+    return images
+
+def render_deck(deck, template_id, tables, workers=1, session_id=None, low_memory=False):
+    """渲染PPT，返回 (转换器, 响应头)；需要在 render_slots 内调用"""
+    from md2ppt import MarkdownToPPT
+    
+    # 如果有模板，从模板缓存中取一份副本
+    presentation = None
+    if template_id:
+        presentation = template_cache.get(template_id)
+        if presentation is None:
+            raise ValueError('模板不存在，请重新上传模板')
+    
+    # 创建转换器实例
+    converter = MarkdownToPPT(presentation=presentation, low_memory=low_memory)
+    
+    # 设置图片目录
+    converter.set_image_dir(UPLOAD_FOLDER)
+    converter.set_image_store(image_store)
+    
+    # 处理Markdown内容，workers大于1时多进程并行渲染；
+    # 带会话ID时复用该会话上次渲染的未修改段落
+    headers = {}
+    if session_id and workers <= 1 and not low_memory:
+        sections, reused = converter.render_incremental(
+            deck, section_cache.get(session_id), key=template_id or '')
+        section_cache.set(session_id, sections)
+        headers['X-Sections-Reused'] = f'{reused}/{len(deck)}'
+    else:
+        converter.render_ir(deck, workers=max(workers, 1))
+    
+    # 已上传的Excel工作表作为原生表格追加在内容之后，每个工作表从新的一页开始
+    for sheet, df in tables:
+        converter.add_dataframe(df, title=sheet)
+    return converter, headers
+
 @app.route('/api/generate_ppt', methods=['POST'])
 def generate_ppt():
+    from md2ppt import RENDER_VERSION
     try:
         # 获取上传的内容和模板
         content = request.form.get('content')
+        ir_id = request.form.get('ir_id')
         template = request.files.get('template')
+        template_id = request.form.get('template_id')
         
-        if not content:
+        # 可以用 /api/preview 返回的ir_id代替内容，直接使用已解析的IR
+        if content:
+            ir_id, deck = parse_content(content)
+        elif ir_id:
+            deck = ir_cache.get(ir_id)
+            if deck is None:
+                return jsonify({'error': '预览已过期，请重新提交内容'}), 404
+        else:
             return jsonify({'error': '请先生成内容'}), 400
         
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False, encoding='utf-8') as md_file:
-            md_file.write(content)
-            md_path = md_file.name
-        
-        # 创建输出文件路径
-        output_path = os.path.join(tempfile.gettempdir(), 'output.pptx')
-        
-        # 创建转换器实例
-        converter = MarkdownToPPT()
-        
-        # 如果有模板，使用模板
+        # 上传的模板会顺便注册到模板缓存
         if template:
-            template_path = os.path.join(tempfile.gettempdir(), 'template.pptx')
-            template.save(template_path)
-            converter = MarkdownToPPT(template_path)
+            template_id = template_cache.register(template.stream)
+        if template_id and template_id not in template_cache:
+            return jsonify({'error': '模板不存在，请重新上传模板'}), 404
         
-        # 设置图片目录
-        converter.set_image_dir(UPLOAD_FOLDER)
+        excel_ids = request.form.getlist('excel_id')
+        tables = []
+        for excel_id in excel_ids:
+            table = excel_cache.get(excel_id)
+            if table is None:
+                return jsonify({'error': '表格不存在，请重新上传Excel'}), 404
+            tables.append(table)
         
-        # 处理Markdown内容
-        converter.process_markdown(content)
+        workers = min(request.form.get('workers', 1, type=int), config.RENDER_MAX_WORKERS)
+        session_id = request.form.get('session_id') or request.headers.get('X-Session-Id')
+        # 页数多的文档使用低内存模式
+        low_memory = bool(config.LOW_MEMORY_MIN_SLIDES) and len(deck) >= config.LOW_MEMORY_MIN_SLIDES
         
-        # 保存PPT
-        converter.save(output_path)
+        if result_cache is None:
+            with ExitStack() as slot:
+                slot.enter_context(render_slots)
+                converter, headers = render_deck(deck, template_id, tables, workers, session_id, low_memory)
+                # 低内存模式下渲染完成后边保存边发送，保存在发送响应时进行，
+                # 发送完成（或连接关闭）后才释放渲染槽
+                if low_memory:
+                    headers['Content-Disposition'] = 'attachment; filename=output.pptx'
+                    response = Response(converter.stream(), headers=headers,
+                                        mimetype='application/vnd.openxmlformats-officedocument.presentationml.presentation')
+                    response.call_on_close(slot.pop_all().close)
+                    return response
+                
+                # 保存PPT到内存，超过阈值时才写入临时文件，响应结束后自动关闭
+                output = tempfile.SpooledTemporaryFile(max_size=config.OUTPUT_SPOOL_SIZE)
+                converter.save(output)
+                output.seek(0)
+            key = None
+        else:
+            # 输入的内容哈希作为缓存键和ETag；相同的请求同时只渲染一次，其余请求等待后直接读取缓存
+            key = result_key(RENDER_VERSION, ir_id, template_id or '', referenced_images(deck), excel_ids)
+            # werkzeug 只对 GET/HEAD 返回304，POST 请求在这里比较，客户端已有相同结果时不再渲染
+            if key in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(key)
+                return response
+            with ExitStack() as flight:
+                flight.enter_context(result_flights.hold(key))
+                output = result_cache.open(key)
+                headers = {'X-Cache': 'HIT'}
+                if output is None:
+                    tmp_path = result_cache.tmp_path()
+                    try:
+                        with ExitStack() as slot:
+                            slot.enter_context(render_slots)
+                            converter, headers = render_deck(deck, template_id, tables, workers, session_id,
+                                                             low_memory)
+                            headers['X-Cache'] = 'MISS'
+                            # 低内存模式下边保存边发送，同时写入缓存；发送完成（或连接关闭）后
+                            # 才释放渲染槽和相同请求的锁，等待的请求随后命中缓存
+                            if low_memory:
+                                headers['Content-Disposition'] = 'attachment; filename=output.pptx'
+                                response = Response(
+                                    result_cache.write_through(key, converter.stream()), headers=headers,
+                                    mimetype='application/vnd.openxmlformats-officedocument.presentationml.presentation')
+                                response.set_etag(key)
+                                flight.enter_context(slot.pop_all())
+                                response.call_on_close(flight.pop_all().close)
+                                return response
+                            converter.save(tmp_path)
+                        output = open(result_cache.add(key, tmp_path), 'rb')
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
         
-        # 发送文件
-        return send_file(
-            output_path,
+        # 发送文件，缓存键作为ETag
+        response = send_file(
+            output,
             mimetype='application/vnd.openxmlformats-officedocument.presentationml.presentation',
             as_attachment=True,
-            download_name='output.pptx'
+            download_name='output.pptx',
+            etag=key or True
         )
+        response.headers.update(headers)
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        # 清理临时文件
+
+@app.route('/api/preview', methods=['POST'])
+def preview():
+    """解析内容并返回幻灯片结构，不渲染PPT
+
+    返回 {'ir_id': ..., 'slides': [{'level', 'title', 'elements'}]}，ir_id可传给
+    /api/generate_ppt 代替内容；format=ir 时返回序列化的IR（format=msgpack 需要安装msgpack）。
+    """
+    data = request.get_json(silent=True) or request.form
+    content = data.get('content')
+    if not content:
+        return jsonify({'error': '请先生成内容'}), 400
+    ir_id, deck = parse_content(content)
+    
+    output_format = request.args.get('format')
+    if output_format == 'ir':
+        return Response(dump_ir(deck), mimetype='application/json', headers={'X-IR-Id': ir_id})
+    if output_format == 'msgpack':
         try:
-            if 'md_path' in locals():
-                os.unlink(md_path)
-            if 'template_path' in locals():
-                os.unlink(template_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
-        except Exception as e:
-            print(f"清理临时文件失败: {str(e)}")
+            return Response(dump_ir(deck, 'msgpack'), mimetype='application/msgpack', headers={'X-IR-Id': ir_id})
+        except ImportError:
+            return jsonify({'error': '服务端未安装msgpack'}), 400
+    return jsonify({'ir_id': ir_id, 'slides': deck.preview()})
+
+@app.route('/api/generate_ppt_batch', methods=['POST'])
+def generate_ppt_batch():
+    """批量生成PPT，返回zip流
+
+    文档可以用多个files字段上传Markdown文件，也可以用JSON提交
+    {"documents": [{"name": ..., "content": ...}], "template_id": ...}。
+    zip中每个文档对应一个同名的.pptx，最后附带 report.json 记录每个文档的耗时和错误。
+    """
+    from batch import iter_zip, render_document
+
+    documents = []
+    if request.is_json:
+        data = request.json
+        template_id = data.get('template_id')
+        for i, document in enumerate(data.get('documents', [])):
+            documents.append((document.get('name') or f'document{i + 1}', document.get('content', '')))
+    else:
+        template_id = request.form.get('template_id')
+        template = request.files.get('template')
+        if template:
+            template_id = template_cache.register(template.stream)
+        for file in request.files.getlist('files'):
+            documents.append((file.filename, file.read().decode('utf-8')))
+    
+    if not documents:
+        return jsonify({'error': '请先上传Markdown文件'}), 400
+    if len(documents) > config.BATCH_MAX_DOCUMENTS:
+        return jsonify({'error': f'一次最多转换{config.BATCH_MAX_DOCUMENTS}个文档'}), 400
+    
+    template = None
+    if template_id:
+        template = template_cache.get_data(template_id)
+        if template is None:
+            return jsonify({'error': '模板不存在，请重新上传模板'}), 404
+    
+    def decks():
+        report = []
+        names = set()
+        for name, content in documents:
+            # 文件名去掉扩展名，重名时加序号
+            base = secure_filename(os.path.splitext(name)[0]) or 'document'
+            filename = f'{base}.pptx'
+            index = 1
+            while filename in names:
+                index += 1
+                filename = f'{base}_{index}.pptx'
+            names.add(filename)
+            
+            start = time.perf_counter()
+            try:
+                with render_slots:
+                    converter = render_document(content, template, UPLOAD_FOLDER, image_store=image_store)
+                    output = io.BytesIO()
+                    converter.save(output)
+            except Exception as e:
+                report.append({'input': name, 'status': 'error', 'error': str(e),
+                               'seconds': round(time.perf_counter() - start, 4)})
+                continue
+            report.append({'input': name, 'output': filename, 'status': 'ok',
+                           'slides': len(converter.prs.slides),
+                           'seconds': round(time.perf_counter() - start, 4)})
+            yield filename, output.getvalue()
+        yield 'report.json', json.dumps(report, ensure_ascii=False, indent=2).encode('utf-8')
+    
+    return Response(
+        stream_with_context(iter_zip(decks())),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=decks.zip'}
+    )
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """提交后台渲染任务，参数同 /api/generate_ppt，立即返回任务ID"""
+    content = request.form.get('content')
+    template = request.files.get('template')
+    template_id = request.form.get('template_id')
+    
+    if not content:
+        return jsonify({'error': '请先生成内容'}), 400
+    
+    if template:
+        template_id = template_cache.register(template.stream)
+    template_data = None
+    if template_id:
+        template_data = template_cache.get_data(template_id)
+        if template_data is None:
+            return jsonify({'error': '模板不存在，请重新上传模板'}), 404
+    
+    # 小文档进入优先通道；客户端可用X-Client-Id区分，默认按来源地址
+    small = len(content) <= config.JOB_SMALL_DECK_CHARS
+    client = request.headers.get('X-Client-Id') or request.remote_addr or ''
+    try:
+        job_id = job_queue.submit({'content': content}, template_data, client,
+                                  PRIORITY_SMALL if small else PRIORITY_LARGE)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    job_runner.start()
+    
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'result_url': f'/api/jobs/{job_id}/result',
+        'priority': 'small' if small else 'large',
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务状态和进度"""
+    start_shared_job_runner()
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    if status['status'] == DONE:
+        status['result_url'] = f'/api/jobs/{job_id}/result'
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """下载后台任务生成的PPT"""
+    start_shared_job_runner()
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    if status['status'] != DONE:
+        return jsonify({'error': '任务尚未完成', 'status': status['status']}), 409
+    data = job_queue.result(job_id)
+    if data is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    return send_file(
+        io.BytesIO(data),
+        mimetype='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        as_attachment=True,
+        download_name='output.pptx'
+    )
+
+@app.route('/api/templates', methods=['POST'])
+def register_template():
+    """预先注册模板，返回模板ID（模板文件的SHA-256），之后生成PPT时只需传template_id"""
+    try:
+        if 'template' not in request.files:
+            return jsonify({'error': '没有上传文件'}), 400
+            
+        file = request.files['template']
+        if file.filename == '':
+            return jsonify({'error': '没有选择文件'}), 400
+            
+        if not allowed_file(file.filename, {'pptx'}):
+            return jsonify({'error': '不支持的文件类型'}), 400
+            
+        template_id = template_cache.register(file.stream)
+        return jsonify({'template_id': template_id})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/templates/<template_id>', methods=['GET'])
+def get_template(template_id):
+    """查询模板是否已注册，客户端可先用本地计算的哈希查询，避免重复上传"""
+    if template_id not in template_cache:
+        return jsonify({'error': '模板不存在'}), 404
+    return jsonify({'template_id': template_id})
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """返回LLM连接和模板缓存的运行指标"""
+    return jsonify({
+        'llm': llm_client.stats(),
+        'llm_cache': llm_cache.stats() if llm_cache is not None else None,
+        'llm_tokens': token_budget.stats(),
+        'template_cache': template_cache.stats(),
+        'ir_cache': ir_cache.stats(),
+        'result_cache': result_cache.stats() if result_cache is not None else None,
+        'result_coalesced': result_flights.waited,
+        'uploads': image_store.stats(),
+        'section_cache': section_cache.stats(),
+        'jobs': job_queue.stats(),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """以Prometheus文本格式输出各阶段耗时直方图和当前运行状态"""
+    gauges = {}
+    llm_stats = llm_client.stats()
+    sources = [('llm', llm_stats), ('template_cache', template_cache.stats()), ('ir_cache', ir_cache.stats()),
+               ('section_cache', section_cache.stats()), ('uploads', image_store.stats()),
+               ('jobs', job_queue.stats())]
+    # 各LLM后端的状态单独输出
+    for index, backend in enumerate(llm_stats.get('backends', ())):
+        sources.append((f'llm_backend{index}', backend))
+    if llm_cache is not None:
+        sources.append(('llm_cache', llm_cache.stats()))
+    if result_cache is not None:
+        sources.append(('result_cache', dict(result_cache.stats(), coalesced=result_flights.waited)))
+    for prefix, values in sources:
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f'pptgenius_{prefix}_{key}'] = (f"{prefix} {key.replace('_', ' ')}", value)
+    return Response(REGISTRY.render(gauges), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/upload_image', methods=['POST'])
 def upload_image():
@@ -235,13 +885,14 @@ def upload_image():
         if not allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
             return jsonify({'error': '不支持的文件类型'}), 400
             
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # 分块保存原图并生成缩小后的版本，文件名为内容哈希，内容相同的图片返回已有的文件名
+        original_name = secure_filename(file.filename)
+        filename = image_store.ingest(file.stream, original_name)
+        collect_uploads()
         
         # 返回相对URL和markdown格式
         url = f'/uploads/{filename}'
-        markdown = f'![{filename}]({url})'
+        markdown = f'![{original_name}]({url})'
         return jsonify({'url': url, 'markdown': markdown})
         
     except Exception as e:
@@ -249,6 +900,7 @@ def upload_image():
 
 @app.route('/api/upload_excel', methods=['POST'])
 def upload_excel():
+    from excel_table import dataframe_to_markdown, read_sheet, sheet_id
     try:
         if 'excel' not in request.files:
             return jsonify({'error': '没有上传文件'}), 400
@@ -260,17 +912,23 @@ def upload_excel():
         if not allowed_file(file.filename, ALLOWED_EXCEL_EXTENSIONS):
             return jsonify({'error': '不支持的文件类型'}), 400
             
-        # 读取Excel文件
-        df = pd.read_excel(file)
+        # 只读取选中的工作表，设置了EXCEL_MAX_ROWS时最多读取该行数
+        data = file.read()
+        sheet, df, sheet_names, truncated = read_sheet(
+            io.BytesIO(data), request.form.get('sheet'), config.EXCEL_MAX_ROWS)
         
-        # 生成Markdown表格
-        markdown_table = "| " + " | ".join(df.columns) + " |\n"
-        markdown_table += "| " + " | ".join(["---" for _ in df.columns]) + " |\n"
+        # 缓存解析结果，生成PPT时可以通过excel_id直接添加为原生表格
+        excel_id = sheet_id(data, sheet)
+        excel_cache.set(excel_id, (sheet, df))
         
-        for _, row in df.iterrows():
-            markdown_table += "| " + " | ".join(str(cell) for cell in row) + " |\n"
-            
-        return jsonify({'markdown': markdown_table})
+        return jsonify({
+            'markdown': dataframe_to_markdown(df),
+            'excel_id': excel_id,
+            'sheet': sheet,
+            'sheets': sheet_names,
+            'rows': len(df),
+            'truncated': truncated,
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -278,13 +936,58 @@ def upload_excel():
 # 添加静态文件服务
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    """上传的图片，支持条件请求和Range请求
+
+    文件名为内容哈希的图片内容不会变化，可以被浏览器和代理长期缓存。
+    """
+    found = image_store.resolve(filename)
+    if found is None:
+        return send_from_directory(UPLOAD_FOLDER, filename)
+    path, digest = found
+    immutable = os.path.splitext(filename)[0] == digest
+    response = send_file(path, conditional=True, etag=digest,
+                         max_age=config.UPLOAD_CACHE_MAX_AGE if immutable else None)
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+def warmup():
+    """预热：导入渲染依赖，渲染一份小文档以加载默认模板和XML解析相关代码，
+    并注册 WARMUP_TEMPLATES 中的模板。可在工作进程启动后、接收请求前调用"""
+    start = time.perf_counter()
+    import pandas  # noqa: F401
+    from md2ppt import MarkdownToPPT, iter_html_elements
+
+    converter = MarkdownToPPT()
+    converter.process_markdown('# warmup\n\n## warmup\n\n- warmup\n\n| a |\n|---|\n| 1 |\n')
+    converter.save(io.BytesIO())
+    list(iter_html_elements('# warmup'))
+    for path in config.WARMUP_TEMPLATES:
+        with open(path, 'rb') as f:
+            template_cache.register(f)
+    logger.info('Warmup finished in %.2fs', time.perf_counter() - start)
 
 if __name__ == '__main__':
     # app.run(debug=True) 
     parser = argparse.ArgumentParser(description="Run the Flask app with custom host and port.")
     
+    parser.add_argument('mode', nargs='?', choices=('dev', 'serve'), default='dev',
+                        help='dev: Flask debug server with reloader (default); serve: production gunicorn server')
     parser.add_argument('--host', type=str, default='127.0.0.1', help='The host to bind the server to (default: 127.0.0.1)')
     parser.add_argument('--port', type=int, default=5000, help='The port to bind the server to (default: 5000)')
+    parser.add_argument('--workers', type=int, help='serve: number of worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, help=f'serve: threads per worker (default: {config.SERVE_THREADS})')
+    parser.add_argument('--timeout', type=int, help=f'serve: worker heartbeat timeout in seconds (default: {config.SERVE_TIMEOUT})')
+    parser.add_argument('--graceful-timeout', type=int,
+                        help=f'serve: seconds to drain in-flight requests on shutdown (default: {config.SERVE_GRACEFUL_TIMEOUT})')
     args = parser.parse_args()
-    app.run(host=args.host, port=args.port, debug=True)
\ No newline at end of file
+    
+    if args.mode == 'serve':
+        from server import serve
+        serve(host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+              timeout=args.timeout, graceful_timeout=args.graceful_timeout)
+    else:
+        # 开发服务器的重载器会启动子进程运行应用，只在子进程中预热
+        if config.WARMUP_ON_START and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            threading.Thread(target=warmup, daemon=True, name='warmup').start()
+        app.run(host=args.host, port=args.port, debug=True, threaded=True)
\ No newline at end of file
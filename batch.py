@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量转换：一次调用把多个Markdown文件转换为多个PPT
+
+输入可以是目录（递归查找 *.md）、glob模式、文件，或者JSONL清单（每行
+{"input": ..., "output": ..., "template": ...}）。转换在进程池中进行，每个进程
+对每个模板只加载一次。输入内容、模板内容和引用的图片都没有变化的文件直接跳过（哈希记录在
+输出PPT的 dc:identifier 中），每个文件的耗时和错误写入JSONL报告。
+
+用法:
+    python batch.py docs/ --output-dir decks/ --template t.pptx --workers 4
+    python batch.py --manifest jobs.jsonl --report report.jsonl
+"""
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from pptx import Presentation
+
+from md2ppt import MarkdownToPPT, find_image, remove_all_slides
+from md_stream import IMAGE
+from slide_ir import parse_document
+
+# 转换结果的格式版本，排版逻辑变化时修改，使已有输出全部重新生成
+BATCH_VERSION = '1'
+
+_IDENTIFIER_RE = re.compile(rb'<dc:identifier>([0-9a-f]{64})</dc:identifier>')
+
+
+@lru_cache(maxsize=32)
+def _load_template(path, mtime):
+    """读取模板并去除幻灯片，返回 (去除幻灯片后的PPT字节, 模板内容哈希)，每个进程每个模板只加载一次"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    output = io.BytesIO()
+    remove_all_slides(Presentation(io.BytesIO(data))).save(output)
+    return output.getvalue(), hashlib.sha256(data).hexdigest()
+
+
+def load_template(path):
+    """读取模板，path为None时返回 (None, '')"""
+    if not path:
+        return None, ''
+    return _load_template(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+
+def image_hashes(md_content, image_dir=None):
+    """文档引用的图片和图片内容的哈希，按渲染时的规则查找图片，找不到的图片哈希为None"""
+    images = []
+    for slide in parse_document(md_content).slides:
+        for kind, payload in slide.elements:
+            if kind != IMAGE:
+                continue
+            digest = None
+            try:
+                with open(find_image(payload, image_dir), 'rb') as f:
+                    digest = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(64 * 1024), b''):
+                        digest.update(chunk)
+                    digest = digest.hexdigest()
+            except OSError:
+                pass
+            images.append([payload, digest])
+    return images
+
+
+def content_hash(md_content, template_hash, images=()):
+    """计算输入内容哈希，用于判断输出是否需要重新生成，images为 image_hashes 的结果"""
+    digest = hashlib.sha256(f'{BATCH_VERSION}\0{template_hash}\0'.encode('utf-8'))
+    digest.update(md_content.encode('utf-8'))
+    # 没有图片的文档哈希不变，已有输出不需要重新生成
+    if images:
+        digest.update(json.dumps(images, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def output_hash(path):
+    """读取已有输出PPT中记录的内容哈希，文件不存在或无法读取时返回None"""
+    try:
+        with zipfile.ZipFile(path) as deck:
+            match = _IDENTIFIER_RE.search(deck.read('docProps/core.xml'))
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+    return match.group(1).decode('ascii') if match else None
+
+
+def render_document(md_content, template=None, image_dir=None, identifier=None, image_store=None,
+                    progress=None):
+    """把Markdown内容渲染为PPT，template为去除幻灯片后的模板字节，返回MarkdownToPPT"""
+    presentation = Presentation(io.BytesIO(template)) if template else None
+    converter = MarkdownToPPT(presentation=presentation)
+    if image_dir:
+        converter.set_image_dir(image_dir)
+    converter.set_image_store(image_store)
+    converter.process_markdown(md_content, progress=progress)
+    if identifier:
+        converter.prs.core_properties.identifier = identifier
+    return converter
+
+
+def convert_job(job):
+    """转换单个文件，返回报告记录"""
+    start = time.perf_counter()
+    record = {'input': job['input'], 'output': job['output']}
+    try:
+        with open(job['input'], 'r', encoding='utf-8') as f:
+            md_content = f.read()
+        template, template_hash = load_template(job.get('template'))
+        digest = content_hash(md_content, template_hash, image_hashes(md_content, job.get('image_dir')))
+        if not job.get('force') and output_hash(job['output']) == digest:
+            record['status'] = 'skipped'
+        else:
+            converter = render_document(md_content, template, job.get('image_dir'), digest)
+            directory = os.path.dirname(job['output'])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            converter.save(job['output'])
+            record['status'] = 'ok'
+            record['slides'] = len(converter.prs.slides)
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def collect_jobs(inputs, output_dir=None, template=None, image_dir=None, manifest=None, force=False):
+    """根据输入参数生成任务列表"""
+    jobs = []
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                output = entry.get('output') or os.path.splitext(entry['input'])[0] + '.pptx'
+                jobs.append({
+                    'input': entry['input'],
+                    'output': output,
+                    'template': entry.get('template', template),
+                    'image_dir': entry.get('image_dir', image_dir),
+                    'force': force,
+                })
+
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            base = pattern
+            paths = sorted(glob.glob(os.path.join(pattern, '**', '*.md'), recursive=True))
+        else:
+            base = None
+            paths = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in paths:
+            name = os.path.splitext(os.path.relpath(path, base) if base else os.path.basename(path))[0] + '.pptx'
+            output = os.path.join(output_dir, name) if output_dir else os.path.splitext(path)[0] + '.pptx'
+            jobs.append({
+                'input': path,
+                'output': output,
+                'template': template,
+                'image_dir': image_dir,
+                'force': force,
+            })
+    return jobs
+
+
+def run_jobs(jobs, workers=1):
+    """执行任务，按任务顺序逐个返回报告记录"""
+    if workers <= 1:
+        for job in jobs:
+            yield convert_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(convert_job, jobs, chunksize=max(1, len(jobs) // (workers * 8)))
+
+
+class _ZipBuffer:
+    """只能追加写入的缓冲区，zipfile检测到不能seek时使用数据描述符，可以边写边发送"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(files):
+    """把 (文件名, 字节) 逐个写入zip，边写边返回zip数据块"""
+    buffer = _ZipBuffer()
+    # PPT本身已经压缩，不再重复压缩
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert many Markdown files to PowerPoint in one run')
+    parser.add_argument('inputs', nargs='*', help='Markdown files, directories or glob patterns')
+    parser.add_argument('--manifest', help='JSONL manifest with input/output/template per line')
+    parser.add_argument('--output-dir', help='Directory for output files (default: next to each input)')
+    parser.add_argument('--template', help='PowerPoint template file')
+    parser.add_argument('--image-dir', help='Directory containing images')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--report', help='Write a JSONL timing/error report to this file')
+    parser.add_argument('--force', action='store_true', help='Rebuild outputs even if inputs are unchanged')
+    args = parser.parse_args(argv)
+
+    if not args.inputs and not args.manifest:
+        parser.error('no inputs given')
+
+    jobs = collect_jobs(args.inputs, args.output_dir, args.template, args.image_dir, args.manifest, args.force)
+    counts = {'ok': 0, 'skipped': 0, 'error': 0}
+    start = time.perf_counter()
+    report = open(args.report, 'w', encoding='utf-8') if args.report else None
+    try:
+        for record in run_jobs(jobs, args.workers):
+            counts[record['status']] += 1
+            if report:
+                report.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if record['status'] == 'error':
+                print(f"Failed to convert {record['input']}: {record['error']}", file=sys.stderr)
+    finally:
+        if report:
+            report.close()
+
+    print(f"Converted {counts['ok']}, skipped {counts['skipped']}, failed {counts['error']} "
+          f"of {len(jobs)} files in {time.perf_counter() - start:.2f}s")
+    return 1 if counts['error'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片处理基准测试
+
+生成若干张手机照片大小（默认4000x3000）的JPEG，分别用原图和上传索引中的
+缩小版本生成PPT，比较PPT大小和渲染耗时。
+
+用法: python benchmarks/image_pipeline.py [--images 10] [--width 4000] [--height 3000]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_store import ImageStore  # noqa: E402
+from md2ppt import MarkdownToPPT  # noqa: E402
+
+
+def render(markdown_text, image_dir, image_store=None):
+    """渲染PPT，返回 (PPT字节数, 耗时秒数)"""
+    start = time.perf_counter()
+    converter = MarkdownToPPT()
+    converter.set_image_dir(image_dir)
+    converter.set_image_store(image_store)
+    with redirect_stdout(io.StringIO()):
+        converter.process_markdown(markdown_text)
+    output = io.BytesIO()
+    converter.save(output)
+    return len(output.getvalue()), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片处理基准测试')
+    parser.add_argument('--images', type=int, default=10, help='图片数量')
+    parser.add_argument('--width', type=int, default=4000, help='图片宽度')
+    parser.add_argument('--height', type=int, default=3000, help='图片高度')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as original_dir, tempfile.TemporaryDirectory() as store_dir:
+        store = ImageStore(store_dir)
+        lines = []
+        stored_lines = []
+        ingest_time = 0
+        for i in range(args.images):
+            data = io.BytesIO()
+            Image.effect_noise((args.width, args.height), 32).convert('RGB').save(data, 'JPEG', quality=92)
+            data = data.getvalue()
+            name = f'photo{i}.jpg'
+            with open(os.path.join(original_dir, name), 'wb') as f:
+                f.write(data)
+            start = time.perf_counter()
+            stored = store.ingest(data, name)
+            ingest_time += time.perf_counter() - start
+            lines.append(f'## 图片{i}\n![照片](/uploads/{name})\n')
+            stored_lines.append(f'## 图片{i}\n![照片](/uploads/{stored})\n')
+
+        before_size, before_time = render('\n'.join(lines), original_dir)
+        after_size, after_time = render('\n'.join(stored_lines), store_dir, store)
+
+    print(f'图片: {args.images} 张 {args.width}x{args.height}')
+    print(f'原图:     PPT {before_size / 1024 / 1024:.1f} MB, 渲染 {before_time:.3f} s')
+    print(f'缩小版本: PPT {after_size / 1024 / 1024:.1f} MB, 渲染 {after_time:.3f} s'
+          f'（上传时处理共 {ingest_time:.2f} s）')
+
+
+if __name__ == '__main__':
+    main()
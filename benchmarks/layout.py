@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排版基准测试
+
+生成包含若干元素（段落、列表项、代码块、表格）的文档，分别统计排版估算
+（折行和高度计算）的耗时和整体渲染的耗时，排版估算应保持在每个元素1毫秒以内。
+
+用法: python benchmarks/layout.py [--elements 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import layout  # noqa: E402
+from md2ppt import MarkdownToPPT  # noqa: E402
+
+SENTENCES = [
+    '人工智能是研究、开发用于模拟、延伸和扩展人的智能的理论、方法及应用系统的一门技术科学。',
+    'Machine learning lets computers learn from data without being explicitly programmed.',
+    '深度学习基于多层神经网络，在图像识别和自然语言处理（NLP）领域取得了突破。',
+    '2024年全球AI市场规模超过5000亿美元，同比增长约20%。',
+]
+
+
+def make_document(count, seed=0):
+    """生成包含count个元素的Markdown文档"""
+    r = random.Random(seed)
+    blocks = []
+    for i in range(count):
+        if i % 20 == 0:
+            blocks.append(f'## 第{i // 20 + 1}章')
+        choice = r.random()
+        text = ''.join(r.choice(SENTENCES) for _ in range(r.randint(1, 6)))
+        if choice < 0.6:
+            blocks.append(f'<p>{text}</p>')
+        elif choice < 0.85:
+            blocks.append(f'- {text}')
+        elif choice < 0.95:
+            blocks.append('```\n' + '\n'.join(f'value_{j} = compute({j})' for j in range(r.randint(2, 30))) + '\n```')
+        else:
+            rows = '\n'.join(f'| {j} | {r.choice(SENTENCES)} |' for j in range(r.randint(2, 25)))
+            blocks.append('| 序号 | 内容 |\n|---|---|\n' + rows)
+    return '\n\n'.join(blocks) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='排版基准测试')
+    parser.add_argument('--elements', type=int, default=1000, help='元素数量')
+    args = parser.parse_args()
+
+    document = make_document(args.elements)
+
+    # 统计折行估算的耗时（冷缓存）
+    calls = [0, 0.0]
+    wrap_lines = layout.wrap_lines
+
+    def timed_wrap_lines(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return wrap_lines(*a, **kw)
+        finally:
+            calls[0] += 1
+            calls[1] += time.perf_counter() - start
+
+    import md2ppt
+    md2ppt.wrap_lines = timed_wrap_lines
+    wrap_lines.cache_clear()
+    layout.char_width.cache_clear()
+
+    start = time.perf_counter()
+    converter = MarkdownToPPT()
+    converter.process_markdown(document)
+    total = time.perf_counter() - start
+    md2ppt.wrap_lines = wrap_lines
+
+    print(f'元素: {args.elements}，幻灯片: {len(converter.prs.slides)}')
+    print(f'排版估算: {calls[0]} 次，共 {calls[1] * 1000:.1f} ms，'
+          f'每个元素 {calls[1] * 1000 / args.elements:.3f} ms')
+    print(f'整体渲染: {total:.2f} s，每个元素 {total * 1000 / args.elements:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
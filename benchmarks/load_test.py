@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务压力测试
+
+分别启动开发服务器（python app.py）和生产服务（python app.py serve），用多个并发
+客户端在固定时间内持续请求，比较每秒请求数和延迟。默认请求 /api/generate_ppt
+（CPU密集型的渲染），--target stats 请求轻量的 /api/stats。
+
+用法:
+    python benchmarks/load_test.py --concurrency 16 --duration 20
+    python benchmarks/load_test.py --servers serve --workers 4 --threads 16
+"""
+
+import argparse
+import itertools
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.suite import make_document  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers=None, threads=None):
+    """启动服务器子进程，等待可以接收请求后返回"""
+    command = [sys.executable, 'app.py', mode, '--host', '127.0.0.1', '--port', str(port)]
+    if mode == 'serve':
+        if workers:
+            command += ['--workers', str(workers)]
+        if threads:
+            command += ['--threads', str(threads)]
+    # 开发服务器的重载器会再启动一个子进程，放在单独的进程组中一起结束
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/stats', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def run_load(url, target, concurrency, duration, document):
+    """并发请求duration秒，返回 (成功请求的延迟列表, 失败数)
+
+    每个请求在文档末尾加上序号，不会命中生成结果缓存。
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if target == 'generate_ppt':
+                    content = f'{document}\n请求 {next(counter)}\n'
+                    response = session.post(f'{url}/api/generate_ppt', data={'content': content}, timeout=60)
+                else:
+                    response = session.get(f'{url}/api/stats', timeout=60)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare requests/sec of the dev server and the serve mode')
+    parser.add_argument('--servers', default='dev,serve', help='Comma-separated modes to test (default: dev,serve)')
+    parser.add_argument('--target', choices=('generate_ppt', 'stats'), default='generate_ppt',
+                        help='Endpoint to load (default: generate_ppt)')
+    parser.add_argument('--slides', type=int, default=10, help='Slides per generated deck (default: 10)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default: 16)')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds of load per server (default: 15)')
+    parser.add_argument('--workers', type=int, help='serve: worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, help='serve: threads per worker')
+    args = parser.parse_args()
+
+    document = make_document('paragraphs', args.slides)
+    for mode in args.servers.split(','):
+        port = free_port()
+        process = start_server(mode, port, args.workers, args.threads)
+        try:
+            url = f'http://127.0.0.1:{port}'
+            # 预热一次，导入和模板加载不计入
+            run_load(url, args.target, 1, 0.01, document)
+            latencies, errors = run_load(url, args.target, args.concurrency, args.duration, document)
+        finally:
+            stop_server(process)
+        if not latencies:
+            print(f'{mode:<6} all {errors} requests failed')
+            continue
+        print(f'{mode:<6} {len(latencies) / args.duration:8.1f} req/s  '
+              f'p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms  '
+              f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f} ms  errors {errors}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动基准测试
+
+在全新的子进程中分别测量：导入app的耗时、不预热时第一个 /api/generate_ppt
+请求的耗时、预热（warmup）的耗时和预热后第一个请求的耗时，以及稳定后的请求耗时。
+每项重复若干次取中位数。
+
+用法: python benchmarks/startup.py [--repeat 5] [--json startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DOCUMENT = '# 启动测试\n\n## 第一章\n\n正文内容\n\n- 要点一\n- 要点二\n\n## 第二章\n\n正文内容\n'
+
+# 在子进程中运行，最后一行输出JSON
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+result = {'import_seconds': time.perf_counter() - start}
+# 两次请求的文档相同，关闭生成结果缓存，第二次请求测量的是预热后的渲染
+app.result_cache = None
+client = app.app.test_client()
+if WARMUP:
+    start = time.perf_counter()
+    app.warmup()
+    result['warmup_seconds'] = time.perf_counter() - start
+for key in ('first_request_seconds', 'second_request_seconds'):
+    start = time.perf_counter()
+    response = client.post('/api/generate_ppt', data={'content': DOCUMENT})
+    assert response.status_code == 200, response.status_code
+    result[key] = time.perf_counter() - start
+print(json.dumps(result))
+'''
+
+
+def probe(warmup):
+    code = f'WARMUP = {warmup!r}\nDOCUMENT = {DOCUMENT!r}\n' + PROBE
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def median_of(runs):
+    return {key: round(statistics.median(run[key] for run in runs), 4) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app import time and cold request latency')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh processes per scenario (default: 5)')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    results = {
+        'cold': median_of([probe(False) for _ in range(args.repeat)]),
+        'warmup': median_of([probe(True) for _ in range(args.repeat)]),
+    }
+    for scenario, values in results.items():
+        print(f'{scenario:<8}' + '  '.join(f'{key} {value:.3f}' for key, value in values.items()))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
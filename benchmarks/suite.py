@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+md2ppt 基准测试套件
+
+用固定随机种子生成几类合成文档（只有标题的大纲、LLM风格的长段落、100行表格、
+大量图片、中日韩文字），分别在 10/100/1000 页规模下测量 process_markdown + save
+的耗时、峰值内存（RSS）和输出大小；另外用 Flask 测试客户端测量 /api/generate_ppt
+的吞吐量。每个用例在独立的子进程中运行，峰值内存互不影响。
+
+结果写入JSON；--compare 与之前的结果比较，任一指标变差超过 --threshold 时
+以退出码1结束，可以直接用在CI中。
+
+用法:
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --compare baseline.json --threshold 0.2
+    python benchmarks/suite.py --corpus paragraphs,cjk --sizes 10,100 --repeat 5
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = (10, 100, 1000)
+
+LATIN_SENTENCES = [
+    'Large language models generate fluent text by predicting the next token from context.',
+    'The quarterly report shows revenue growth of 18% driven by the cloud segment.',
+    'Retrieval augmented generation combines a search index with a generative model.',
+    'Each team should review the rollout plan and confirm owners before Friday.',
+]
+
+CJK_SENTENCES = [
+    '人工智能是研究、开发用于模拟、延伸和扩展人的智能的理论、方法及应用系统的一门技术科学。',
+    '深度学习基于多层神经网络，在图像识别和自然语言处理领域取得了突破性进展。',
+    '数字化转型要求企业重新设计业务流程，并以数据驱动决策。',
+    '自然言語処理の研究は、機械翻訳や質問応答などの応用につながっている。',
+    '인공지능 기술은 의료, 금융, 제조 등 다양한 산업에서 활용되고 있다.',
+]
+
+IMAGE_COUNT = 8
+
+
+def make_outline(slides, r):
+    """只有标题的大纲：一级标题加若干二级、三级标题"""
+    blocks = ['# 年度技术规划']
+    for i in range(slides - 1):
+        blocks.append(f'## 第{i + 1}部分 {r.choice(LATIN_SENTENCES)[:30]}')
+        blocks.extend(f'### 要点{j + 1}' for j in range(r.randint(2, 4)))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def make_paragraphs(slides, r):
+    """LLM生成风格的正文：每页一个二级标题、几段长文字和列表"""
+    sentences = LATIN_SENTENCES + CJK_SENTENCES[:3]
+    blocks = ['# 行业分析报告']
+    for i in range(slides - 1):
+        blocks.append(f'## 第{i + 1}章')
+        for _ in range(r.randint(1, 3)):
+            blocks.append(''.join(r.choice(sentences) for _ in range(r.randint(2, 4))))
+        blocks.append('\n'.join(f'- **要点{j + 1}**：{r.choice(sentences)}' for j in range(r.randint(2, 4))))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def make_tables(slides, r):
+    """每页一个100行的表格，超出一页的行分到续页"""
+    blocks = ['# 数据附录']
+    # 100行的表格大约占10页
+    for i in range(max(1, (slides - 1) // 10)):
+        rows = '\n'.join(f'| {j + 1} | 指标{r.randint(1, 999)} | {r.uniform(0, 1e6):.2f} | {r.choice(["上升", "下降", "持平"])} |'
+                         for j in range(100))
+        blocks.append(f'## 表{i + 1}\n\n| 序号 | 名称 | 数值 | 趋势 |\n|---|---|---|---|\n{rows}')
+    return '\n\n'.join(blocks) + '\n'
+
+
+def make_images(slides, r):
+    """每页一张图片，图片在 IMAGE_COUNT 张中循环使用"""
+    blocks = ['# 产品图集']
+    for i in range(slides - 1):
+        blocks.append(f'## 图{i + 1}\n\n![图{i + 1}](image{r.randrange(IMAGE_COUNT)}.jpg)')
+    return '\n\n'.join(blocks) + '\n'
+
+
+def make_cjk(slides, r):
+    """中日韩文字为主的正文，折行按字计算"""
+    blocks = ['# 中日韩文本']
+    for i in range(slides - 1):
+        blocks.append(f'## 第{i + 1}节')
+        blocks.append(''.join(r.choice(CJK_SENTENCES) for _ in range(r.randint(3, 6))))
+        blocks.append('\n'.join(f'- {r.choice(CJK_SENTENCES)}' for _ in range(3)))
+    return '\n\n'.join(blocks) + '\n'
+
+
+CORPORA = {
+    'outline': make_outline,
+    'paragraphs': make_paragraphs,
+    'tables': make_tables,
+    'images': make_images,
+    'cjk': make_cjk,
+}
+
+
+def make_document(corpus, slides, seed=0):
+    """生成指定类型、约slides页的Markdown文档，相同参数生成的文档完全相同"""
+    return CORPORA[corpus](slides, random.Random(f'{corpus}-{slides}-{seed}'))
+
+
+def make_images_dir(directory):
+    """生成 IMAGE_COUNT 张1600x1200的JPEG，供图片用例引用"""
+    from PIL import Image
+    for i in range(IMAGE_COUNT):
+        path = os.path.join(directory, f'image{i}.jpg')
+        if not os.path.exists(path):
+            Image.effect_noise((1600, 1200), 20 + i).convert('RGB').save(path, 'JPEG', quality=85)
+    return directory
+
+
+def peak_rss_mb():
+    """本进程的峰值内存（MB）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def run_case(corpus, slides, repeat, image_dir, low_memory=False):
+    """在当前进程中运行一个用例，返回结果记录
+
+    low_memory为True时使用低内存模式，边保存边丢弃输出的数据块，只统计大小。
+    """
+    from md2ppt import MarkdownToPPT
+
+    document = make_document(corpus, slides)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        converter = MarkdownToPPT(low_memory=low_memory)
+        converter.set_image_dir(image_dir)
+        converter.process_markdown(document)
+        if low_memory:
+            output_bytes = sum(len(chunk) for chunk in converter.stream())
+        else:
+            output = io.BytesIO()
+            converter.save(output)
+            output_bytes = len(output.getvalue())
+        times.append(time.perf_counter() - start)
+    return {
+        'name': f'{corpus}-{slides}' + ('-lowmem' if low_memory else ''),
+        'corpus': corpus,
+        'size': slides,
+        'slides': len(converter.prs.slides._sldIdLst),
+        'input_chars': len(document),
+        'seconds': round(statistics.median(times), 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': output_bytes,
+    }
+
+
+def run_case_subprocess(corpus, slides, repeat, image_dir, low_memory=False):
+    """在子进程中运行用例，峰值内存只包含这一个用例"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-case', f'{corpus}-{slides}',
+         '--repeat', str(repeat), '--image-dir', image_dir] + (['--low-memory'] if low_memory else []),
+        check=True, stdout=subprocess.PIPE, cwd=ROOT,
+    )
+    return json.loads(result.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def run_throughput(requests_count, concurrency, slides=10):
+    """用Flask测试客户端并发请求 /api/generate_ppt，返回吞吐量和延迟
+
+    每次请求的文档相同，关闭生成结果缓存，测量的是渲染的吞吐量。
+    """
+    import app as app_module
+    app_module.result_cache = None
+
+    document = make_document('paragraphs', slides)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests_count))
+
+    def worker():
+        client = app_module.app.test_client()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            response = client.post('/api/generate_ppt', data={'content': document})
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+    # 预热：导入、模板加载等只发生一次的开销不计入
+    app_module.app.test_client().post('/api/generate_ppt', data={'content': document})
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(f'/api/generate_ppt failed {len(errors)} times, status {errors[0]}')
+    latencies.sort()
+    return {
+        'name': f'generate_ppt-c{concurrency}',
+        'requests': requests_count,
+        'concurrency': concurrency,
+        'requests_per_second': round(requests_count / total, 2),
+        'p50_seconds': round(latencies[len(latencies) // 2], 4),
+        'p95_seconds': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+    }
+
+
+# 比较时各指标的方向：越小越好为1，越大越好为-1
+COMPARED_METRICS = {
+    'seconds': 1,
+    'peak_rss_mb': 1,
+    'output_bytes': 1,
+    'requests_per_second': -1,
+    'p95_seconds': 1,
+}
+
+
+def compare(baseline, current, threshold):
+    """比较两次结果，返回 (比较行, 回归列表)，变差超过threshold（比例）的指标算作回归"""
+    base = {entry['name']: entry for entry in baseline['results'] + baseline.get('throughput', [])}
+    rows = []
+    regressions = []
+    for entry in current['results'] + current.get('throughput', []):
+        old = base.get(entry['name'])
+        if old is None:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            if metric not in entry or not old.get(metric):
+                continue
+            change = (entry[metric] - old[metric]) / old[metric]
+            regressed = change * direction > threshold
+            rows.append((entry['name'], metric, old[metric], entry[metric], change, regressed))
+            if regressed:
+                regressions.append(f'{entry["name"]} {metric}: {old[metric]} -> {entry[metric]} ({change:+.1%})')
+    return rows, regressions
+
+
+def environment():
+    import pptx
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'python_pptx': pptx.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark md2ppt across document sizes and element mixes')
+    parser.add_argument('--corpus', default=','.join(CORPORA),
+                        help=f'Comma-separated corpora to run (default: {",".join(CORPORA)})')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='Comma-separated target slide counts (default: 10,100,1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the median time is reported')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='Requests for the /api/generate_ppt throughput run (0 to skip)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients for the throughput run')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative regression before failing (default: 0.2 = 20%%)')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='Render in low-memory mode and stream the output (cases are suffixed -lowmem)')
+    parser.add_argument('--image-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        corpus, size = args.run_case.rsplit('-', 1)
+        print(json.dumps(run_case(corpus, int(size), args.repeat, args.image_dir, args.low_memory)))
+        return 0
+
+    corpora = [name for name in args.corpus.split(',') if name]
+    unknown = set(corpora) - set(CORPORA)
+    if unknown:
+        parser.error(f'unknown corpus: {", ".join(sorted(unknown))}')
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    current = {'environment': environment(), 'results': [], 'throughput': []}
+    with tempfile.TemporaryDirectory() as image_dir:
+        make_images_dir(image_dir)
+        for corpus in corpora:
+            for size in sizes:
+                entry = run_case_subprocess(corpus, size, args.repeat, image_dir, args.low_memory)
+                current['results'].append(entry)
+                print(f"{entry['name']:<18} {entry['slides']:>5} slides  {entry['seconds']:>8.3f} s  "
+                      f"{entry['peak_rss_mb']:>7.1f} MB RSS  {entry['output_bytes'] / 1024:>9.1f} KB")
+    if args.requests:
+        entry = run_throughput(args.requests, args.concurrency)
+        current['throughput'].append(entry)
+        print(f"{entry['name']:<18} {entry['requests_per_second']:>8.2f} req/s  "
+              f"p50 {entry['p50_seconds']:.3f} s  p95 {entry['p95_seconds']:.3f} s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, current, args.threshold)
+        print()
+        for name, metric, old, new, change, regressed in rows:
+            print(f"{name:<18} {metric:<20} {old:>12} -> {new:>12}  {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) above {args.threshold:.0%}:', file=sys.stderr)
+            for line in regressions:
+                print(f'  {line}', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
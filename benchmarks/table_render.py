@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表格渲染基准测试
+
+生成一张 列数 x 行数 的表格（默认10列1000行），分别用批量生成XML的方式
+（MarkdownToPPT.add_table）和 python-pptx 逐个单元格设置文本、字号的方式渲染，
+比较耗时。两种方式分页相同，都在每页重复表头。
+
+用法: python benchmarks/table_render.py [--cols 10] [--rows 1000] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pptx.util import Inches, Pt  # noqa: E402
+
+from md2ppt import MarkdownToPPT  # noqa: E402
+
+
+class PerCellConverter(MarkdownToPPT):
+    """逐个单元格设置文本和字号的旧实现，作为对照"""
+
+    def _add_table_shape(self, rows, left, width):
+        height = sum(row_height for _, row_height in rows)
+        table = self.current_slide.shapes.add_table(
+            len(rows), len(rows[0][0]), left, self.current_content_top, width, height).table
+        for i, (row, row_height) in enumerate(rows):
+            table.rows[i].height = row_height
+            for j, cell_text in enumerate(row):
+                cell = table.cell(i, j)
+                cell.text = cell_text
+                cell.text_frame.paragraphs[0].font.size = Pt(14)
+        self.current_content_top += height + Inches(0.5)
+
+
+def render(converter_class, rows):
+    """渲染并保存，返回 (耗时秒数, 幻灯片数)"""
+    start = time.perf_counter()
+    converter = converter_class()
+    converter.add_table(rows)
+    converter.save(io.BytesIO())
+    return time.perf_counter() - start, len(converter.prs.slides)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare bulk table XML with per-cell python-pptx writes')
+    parser.add_argument('--cols', type=int, default=10, help='Columns (default: 10)')
+    parser.add_argument('--rows', type=int, default=1000, help='Body rows (default: 1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per method, median is reported (default: 3)')
+    args = parser.parse_args()
+
+    rows = [[f'列{j}' for j in range(args.cols)]]
+    rows += [[f'第{i}行 数据{j}' for j in range(args.cols)] for i in range(args.rows)]
+    print(f'表格: {args.cols} 列 x {args.rows} 行')
+    results = {}
+    for name, converter_class in (('逐个单元格', PerCellConverter), ('批量XML', MarkdownToPPT)):
+        runs = [render(converter_class, rows) for _ in range(args.repeat)]
+        results[name] = statistics.median(seconds for seconds, _ in runs)
+        print(f'{name}: {results[name]:.3f} s, {runs[0][1]} 页')
+    print(f'加速: {results["逐个单元格"] / results["批量XML"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
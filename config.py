@@ -8,5 +8,120 @@ LLM_MODEL = "Qwen2.5-32B-Instruct-AWQ"
 # LLM请求配置
 LLM_REQUEST_CONFIG = {
     "temperature": 0.7,
-    "max_tokens": 2000,
 }
+
+# LLM token预算（max_tokens 按路由和提示词长度计算，见 token_budget.py）
+LLM_CONTEXT_WINDOW = 32768          # 模型上下文长度（提示词加输出）
+LLM_TOKENIZER = None                # 本地分词器：tokenizer.json 路径或 transformers 模型名，None时按字符数估算
+LLM_MAX_CONTINUATIONS = 2           # 回复因长度截断后自动续写的最大次数
+
+# 正文分章节并行生成配置（/api/generate_content 的 fanout 参数）
+CONTENT_FANOUT = False              # 默认是否按二级标题拆分大纲并行生成
+CONTENT_FANOUT_PARALLELISM = 4      # 每个请求同时生成的章节数
+CONTENT_FANOUT_MAX_TOKENS = 1000    # 每个章节的max_tokens
+CONTENT_FANOUT_RETRIES = 2          # 章节失败后的重试次数
+CONTENT_FANOUT_RETRY_DELAY = 1.0    # 重试等待时间（秒），第n次重试等待n倍
+
+# 各路由的输出预算：(基础token数, 每项token数, 上限)，项为子主题数或大纲标题数
+LLM_TOKEN_BUDGETS = {
+    "topics": (64, 40, 1024),                           # 每个子主题标题
+    "outline": (1024, 0, 2000),
+    "content": (256, 150, 8000),                        # 大纲的每个标题
+    "chapter": (128, 150, CONTENT_FANOUT_MAX_TOKENS),   # 分章节生成时章节的每个标题
+    "default": (2000, 0, 2000),
+}
+
+# 模板缓存配置（按内容哈希缓存已解析的模板，LRU淘汰）
+TEMPLATE_CACHE_SIZE = 16
+
+# 并行渲染配置（/api/generate_ppt 的 workers 参数上限）
+RENDER_MAX_WORKERS = 4
+
+# LLM连接配置
+LLM_POOL_SIZE = 32          # 连接池保持的最大keep-alive连接数
+LLM_MAX_INFLIGHT = 16       # 同时进行的最大LLM请求数（含流式请求），超出的请求排队
+LLM_QUEUE_TIMEOUT = 30      # 排队等待的最长时间（秒），超时返回503或SSE错误事件
+LLM_CONNECT_TIMEOUT = 5     # 建立连接超时（秒）
+LLM_READ_TIMEOUT = 120      # 两次读取之间的超时（秒）
+
+# LLM多后端配置（OpenAI兼容的 chat/completions 地址，按未完成请求数最少分配；上面的连接配置对每个后端分别生效）
+LLM_BACKENDS = [LLM_API_URL]
+LLM_ROUTER_RETRIES = 1              # 收到第一个token之前失败时换后端重试的次数
+LLM_CIRCUIT_FAILURES = 3            # 后端连续失败多少次后暂停使用（熔断）
+LLM_CIRCUIT_OPEN_SECONDS = 30       # 熔断时长（秒），之后放行一个试探请求
+LLM_HEALTH_CHECK_INTERVAL = 10      # 主动健康检查（GET /v1/models）间隔（秒），0关闭
+LLM_HEDGE_DELAY = 0.5               # 生成标题等短请求多少秒内没有返回时在另一个后端再发一次，None关闭
+
+# LLM响应缓存配置（生成标题和大纲时，相同的提示词直接返回缓存结果）
+LLM_CACHE_BACKEND = "memory"  # "memory"、"sqlite"，设为None关闭缓存
+LLM_CACHE_SIZE = 256          # 最多缓存的条目数
+LLM_CACHE_TTL = 3600          # 过期时间（秒）
+LLM_CACHE_PATH = "cache/llm_cache.sqlite3"  # sqlite后端的数据库文件
+
+# 边生成边渲染的PPT暂存配置（/api/generate_content_ppt 生成的PPT保存在内存中等待下载）
+DECK_STORE_SIZE = 32   # 最多暂存的PPT数量
+DECK_STORE_TTL = 600   # 暂存时间（秒）
+
+# 上传图片配置（按内容哈希保存，上传图片时按间隔顺便清理）
+UPLOAD_CACHE_MAX_AGE = 365 * 24 * 3600  # /uploads/ 图片的浏览器缓存时间（秒），内容寻址的文件名内容不会变化
+UPLOAD_GC_MAX_BYTES = None              # 上传图片总大小上限（字节），超出时从最早上传的开始删除，None为不限
+UPLOAD_GC_MAX_AGE = None                # 删除多少秒之前上传的图片，None为不删除
+UPLOAD_GC_INTERVAL = 600                # 两次清理的最短间隔（秒）
+
+# 低内存渲染配置（不少于该页数的文档在 /api/generate_ppt 中使用低内存模式：
+# 完成的幻灯片序列化后释放，图片保存时才读取，PPT边保存边发送；None为不使用）
+LOW_MEMORY_MIN_SLIDES = 200
+
+# 生成结果缓存配置（相同的内容、模板、图片和表格直接返回磁盘上已生成的PPT）
+RESULT_CACHE_DIR = "cache/results"           # 缓存目录
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024   # 缓存目录中文件的总大小上限（字节，所有进程共享），超出时淘汰最久没有使用的，None关闭缓存
+
+# PPT输出配置（生成的PPT先保存在内存中，超过该大小才写入临时文件）
+OUTPUT_SPOOL_SIZE = 16 * 1024 * 1024
+
+# Excel配置
+EXCEL_MAX_ROWS = None     # 每个工作表最多读取的数据行数，超出部分截断（页面上会提示），None不限制
+EXCEL_CACHE_SIZE = 32     # 最多缓存的已解析工作表数量（生成PPT时通过excel_id取用）
+EXCEL_CACHE_TTL = 3600    # 已解析工作表的缓存时间（秒）
+
+# 批量生成配置（/api/generate_ppt_batch 一次最多转换的文档数）
+BATCH_MAX_DOCUMENTS = 100
+
+# 后台渲染任务配置（POST /api/jobs 提交，GET /api/jobs/<job_id> 查询进度）
+JOB_QUEUE_BACKEND = "memory"          # "memory"（进程内）或 "sqlite"（多个进程共享）
+JOB_QUEUE_PATH = "cache/jobs.sqlite3" # sqlite后端的数据库文件
+JOB_WORKERS = 2                       # 渲染线程数，多于一个时第一个线程只处理小文档
+JOB_SMALL_DECK_CHARS = 20000          # 不超过该字符数的文档进入优先通道
+JOB_MAX_RUNNING_PER_CLIENT = 2        # 每个客户端同时运行的任务数上限
+JOB_MAX_QUEUED_PER_CLIENT = 20        # 每个客户端排队的任务数上限，超出返回429
+JOB_RETENTION = 3600                  # 结果保留时间（秒）
+JOB_RESULT_MAX_BYTES = 512 * 1024 * 1024  # 所有结果的总大小上限，超出时先淘汰最早完成的任务
+JOB_LEASE = 60                        # sqlite后端：运行中任务的租约（秒），领取的进程退出后超时重新排队
+JOB_MAX_ATTEMPTS = 2                  # sqlite后端：每个任务最多领取的次数，用完后标记为失败
+
+# 日志和性能分析配置
+LOG_LEVEL = "INFO"            # 日志级别，设为"DEBUG"时输出图片处理等调试日志
+PROFILE_ENABLED = False       # 为True时，带 X-Profile: 1 请求头或 profile=1 参数的请求用cProfile分析
+PROFILE_DIR = "profiles"      # cProfile结果（.prof）保存目录，文件名见响应头 X-Profile-File
+
+# 启动预热配置
+WARMUP_ON_START = True        # 服务启动时预热（导入渲染依赖、加载默认模板），首个生成PPT的请求不再变慢
+WARMUP_TEMPLATES = []         # 预热时注册的模板文件路径，之后可直接用其SHA-256作为template_id
+
+# 生产环境服务配置（python app.py serve，gunicorn gthread工作进程）
+SERVE_WORKERS = None          # 工作进程数，None为CPU核数（渲染是CPU密集型，靠多进程扩展）
+SERVE_THREADS = 32            # 每个进程的线程数，每个SSE流式请求占用一个线程
+SERVE_TIMEOUT = 120           # 工作进程心跳超时（秒），超时的进程被重启
+SERVE_GRACEFUL_TIMEOUT = 120  # 收到SIGTERM后等待进行中的请求（包括SSE流）完成的最长时间（秒）
+SERVE_KEEPALIVE = 5           # HTTP keep-alive连接的空闲超时（秒）
+SERVE_ACCESS_LOG = False      # 是否输出访问日志
+RENDER_CONCURRENCY = 2        # 每个进程同时进行的渲染数，多余的渲染排队等待
+
+# 幻灯片IR缓存配置（POST /api/preview 解析的结果，生成PPT时可用ir_id直接使用）
+IR_CACHE_SIZE = 128           # 最多缓存的文档数
+IR_CACHE_TTL = 1800           # 过期时间（秒）
+
+# 增量渲染缓存配置（生成PPT时带session_id，只重新渲染内容有变化的一级/二级标题段）
+SECTION_CACHE_SIZE = 64       # 最多缓存的会话数
+SECTION_CACHE_TTL = 1800      # 过期时间（秒）
+SECTION_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 所有会话缓存的幻灯片XML和图片的总大小上限（字节），None时只按会话数限制
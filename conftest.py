@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+测试公共夹具：本地模拟的OpenAI兼容LLM服务（单个或多个后端），每个测试使用空的生成结果缓存和上传目录
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """模拟 /v1/chat/completions，支持流式（分块传输）和非流式，保持keep-alive连接"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _FakeLLMHandler)
+        self.reply = '你好，世界'
+        self.reply_for = None       # 按请求返回回复内容的函数，设置后代替reply
+        self.delay = 0              # 每个请求（流式为每个分片）前的延迟（秒）
+        self.failures = 0           # 接下来返回500错误的请求数
+        self.truncated = 0          # 接下来按长度截断（finish_reason为length）的请求数
+        self.healthy = True         # 健康检查（GET /v1/models）是否返回200
+        self.health_checks = 0
+        self.lock = threading.Lock()
+        self.requests = []
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.spans = []             # 每个POST请求的（开始，结束）时间
+
+    def reply_text(self, body):
+        return self.reply_for(body) if self.reply_for else self.reply
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1/chat/completions'
+
+
+class _FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.health_checks += 1
+        data = json.dumps({'data': [{'id': 'test-model'}]}).encode() if server.healthy else b''
+        self.send_response(200 if server.healthy else 503)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        start = time.monotonic()
+        with server.lock:
+            server.requests.append(body)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            fail = server.failures > 0
+            server.failures -= fail
+            truncated = not fail and server.truncated > 0
+            server.truncated -= truncated
+        finish_reason = 'length' if truncated else 'stop'
+        try:
+            if fail:
+                time.sleep(server.delay)
+                self.send_response(500)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            elif body.get('stream'):
+                self._stream(server, body, finish_reason)
+            else:
+                time.sleep(server.delay)
+                choice = {'message': {'content': server.reply_text(body)}, 'finish_reason': finish_reason}
+                data = json.dumps({'choices': [choice]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            with server.lock:
+                server.active -= 1
+                server.spans.append((start, time.monotonic()))
+
+    def _stream(self, server, body, finish_reason):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        events = [{'choices': [{'delta': {'content': char}}]} for char in server.reply_text(body)]
+        events.append({'choices': [{'delta': {}, 'finish_reason': finish_reason}]})
+        lines = [f'data: {json.dumps(event)}\n\n' for event in events] + ['data: [DONE]\n\n']
+        for line in lines:
+            time.sleep(server.delay)
+            data = line.encode()
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def _start_fake_llm_servers(count):
+    servers = [FakeLLMServer() for _ in range(count)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return servers
+
+
+def _stop_fake_llm_servers(servers):
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fake_llm_server():
+    servers = _start_fake_llm_servers(1)
+    yield servers[0]
+    _stop_fake_llm_servers(servers)
+
+
+@pytest.fixture
+def fake_llm_servers():
+    """三个模拟的LLM后端，用于多后端路由测试"""
+    servers = _start_fake_llm_servers(3)
+    yield servers
+    _stop_fake_llm_servers(servers)
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache(tmp_path, monkeypatch):
+    """生成结果缓存放在临时目录中，测试之间、多次运行之间互不影响"""
+    import app as app_module
+    from result_cache import DiskCache, KeyedLocks
+    monkeypatch.setattr(app_module, 'result_cache', DiskCache(str(tmp_path / 'results'), 64 * 1024 * 1024))
+    monkeypatch.setattr(app_module, 'result_flights', KeyedLocks())
+
+
+@pytest.fixture(autouse=True)
+def empty_uploads(tmp_path, monkeypatch):
+    """上传目录和图片索引放在临时目录中，测试不会写入仓库中的 uploads/"""
+    import app as app_module
+    from image_store import ImageStore
+    upload_folder = str(tmp_path / 'uploads')
+    os.makedirs(upload_folder)
+    monkeypatch.setattr(app_module, 'UPLOAD_FOLDER', upload_folder)
+    monkeypatch.setattr(app_module, 'image_store', ImageStore(upload_folder))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel表格读取和转换
+
+只读取选中的工作表，并且最多读取 max_rows 行（pandas 以 openpyxl 只读模式
+逐行读取，读够行数就停止），大工作簿不会整个载入内存。
+转换为Markdown时按列做字符串运算，最后一次性拼接，不再逐行拼接字符串。
+pandas 在第一次使用时才导入，不处理表格的进程不需要加载。
+"""
+
+import hashlib
+
+
+def read_sheet(data, sheet=None, max_rows=None):
+    """读取工作表，返回 (工作表名, DataFrame, 所有工作表名, 是否截断)
+
+    sheet可以是工作表名或序号（包括数字字符串），默认第一个工作表。
+    """
+    import pandas as pd
+
+    with pd.ExcelFile(data) as excel:
+        sheet_names = excel.sheet_names
+        if sheet is None or sheet == '':
+            sheet = 0
+        elif isinstance(sheet, str) and sheet not in sheet_names and sheet.isdigit():
+            sheet = int(sheet)
+        if isinstance(sheet, int):
+            if sheet >= len(sheet_names):
+                raise ValueError(f'工作表不存在: {sheet}')
+            sheet = sheet_names[sheet]
+        elif sheet not in sheet_names:
+            raise ValueError(f'工作表不存在: {sheet}')
+
+        # 多读一行用来判断是否截断
+        df = excel.parse(sheet, nrows=max_rows + 1 if max_rows else None)
+
+    truncated = max_rows is not None and len(df) > max_rows
+    if truncated:
+        df = df.iloc[:max_rows]
+    return sheet, df, sheet_names, truncated
+
+
+def sheet_id(data, sheet):
+    """按文件内容和工作表名计算ID，用于缓存解析结果"""
+    digest = hashlib.sha256(data)
+    digest.update(b'\0' + sheet.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _escape(column):
+    """转义单元格中的竖线，换行替换为空格，避免破坏表格结构"""
+    return column.str.replace('|', '\\|', regex=False).str.replace('\n', ' ', regex=False)
+
+
+def dataframe_to_markdown(df):
+    """把DataFrame转换为Markdown表格"""
+    import pandas as pd
+
+    header = _escape(pd.Series([str(column) for column in df.columns], dtype=object))
+    lines = [
+        '| ' + ' | '.join(header) + ' |',
+        '| ' + ' | '.join('---' for _ in df.columns) + ' |',
+    ]
+    if len(df) and len(df.columns):
+        row = '| ' + _escape(df.iloc[:, 0].astype(str))
+        for i in range(1, len(df.columns)):
+            row = row + ' | ' + _escape(df.iloc[:, i].astype(str))
+        lines.extend((row + ' |').tolist())
+    return '\n'.join(lines) + '\n'
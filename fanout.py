@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+正文分章节并行生成
+
+大纲按二级标题（##）拆成章节，每个章节单独请求LLM生成正文，最多同时进行
+parallelism 个请求。各章节的增量内容按章节顺序合并为一个流：排在最前面的未完成
+章节实时输出，后面的章节先缓冲，轮到时再输出。失败的章节单独重试，不影响其他章节。
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def split_outline(outline):
+    """拆分大纲，返回 (第一个二级标题之前的部分, [各章节的大纲])"""
+    preamble = []
+    chapters = []
+    for line in outline.splitlines(keepends=True):
+        if line.startswith('## '):
+            chapters.append([line])
+        elif chapters:
+            chapters[-1].append(line)
+        else:
+            preamble.append(line)
+    return ''.join(preamble), [''.join(lines).strip() for lines in chapters]
+
+
+def fan_out(chapters, stream, parallelism=4, retries=2, retry_delay=1.0):
+    """并行生成各章节，按章节顺序返回 (章节序号, 事件, 值)
+
+    stream(序号, 章节) 返回该章节增量内容的迭代器。事件为：
+    content（值为增量内容）、retry（本次失败的错误信息，之后该章节从头重新生成，
+    已输出的内容应丢弃）、error（重试用完后的错误信息）、done（章节完成）。
+    每个章节以error或done结束。生成器被关闭时取消还没开始的章节，正在生成的章节
+    在下一个增量到达时停止。
+    """
+    events = [queue.Queue() for _ in chapters]
+    cancelled = threading.Event()
+
+    def run(index):
+        for attempt in range(retries + 1):
+            if cancelled.is_set():
+                return
+            chunks = None
+            try:
+                chunks = iter(stream(index, chapters[index]))
+                for content in chunks:
+                    if cancelled.is_set():
+                        return
+                    events[index].put(('content', content))
+                events[index].put(('done', None))
+                return
+            except Exception as e:
+                if attempt == retries:
+                    events[index].put(('error', str(e)))
+                    return
+                events[index].put(('retry', str(e)))
+            finally:
+                # 关闭流式响应，释放LLM请求名额
+                close = getattr(chunks, 'close', None)
+                if close:
+                    close()
+            time.sleep(retry_delay * (attempt + 1))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(chapters) or 1)))
+    try:
+        for index in range(len(chapters)):
+            executor.submit(run, index)
+        for index, chapter_events in enumerate(events):
+            while True:
+                event, value = chapter_events.get()
+                yield index, event, value
+                if event in ('done', 'error'):
+                    break
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
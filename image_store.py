@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传图片存储和索引
+
+上传的图片按内容寻址保存：文件名为内容的SHA-256加扩展名，原图保存在
+objects/<哈希前两位>/ 目录下，相同内容的图片只保存一份，不同图片也不会因为
+文件名相同而互相覆盖。上传时分块写入临时文件并计算哈希，不在内存中保留整个文件。
+
+上传时一次性完成图片解码：记录尺寸，生成适合幻灯片的缩小版本
+（最长边不超过 IMAGE_MAX_SIDE 像素并重新编码，保存在 assets/<哈希前两位>/ 目录，
+不需要缩小的图片直接使用原图）。生成PPT时 add_image 按文件名直接查索引，嵌入缩小后的图片，
+不再逐个探测候选路径，也不再打开原图读取尺寸。
+
+索引保存在图片目录下的 images.json 中，多个进程共享同一个目录时按文件的inode和修改时间
+重新读取；读取、修改、写回索引时持有 images.lock 文件锁（fcntl.flock），不会丢失其他进程的更新。
+索引中没有的内容寻址文件名（例如索引损坏）按 objects/<哈希前两位>/ 找回原图并补回索引。
+collect_garbage 按上传时间和总大小清理图片。
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有文件锁，只在进程内加锁
+    fcntl = None
+
+INDEX_FILE = 'images.json'
+LOCK_FILE = 'images.lock'
+OBJECT_DIR = 'objects'
+ASSET_DIR = 'assets'
+TMP_DIR = 'tmp'
+IMAGE_MAX_SIDE = 2000
+JPEG_QUALITY = 85
+ORIENTATION_TAG = 0x0112
+CHUNK_SIZE = 64 * 1024
+# 超过这个时间的临时文件是中断的上传，清理时删除（秒）
+TMP_MAX_AGE = 3600
+# 内容寻址的文件名：SHA-256加扩展名
+_CONTENT_NAME = re.compile(r'^([0-9a-f]{64})\.(\w+)$')
+
+
+def make_derivative(source, max_side=IMAGE_MAX_SIDE):
+    """生成幻灯片用的图片，source为文件路径或字节，返回 (字节, 扩展名, 宽, 高)
+
+    尺寸不超过上限的JPEG和PNG、动图直接使用原图，此时字节为None；
+    其余图片按EXIF方向旋转、缩小后重新编码：有透明通道的保存为PNG，否则保存为JPEG。
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    if getattr(img, 'n_frames', 1) > 1:
+        return None, img.format.lower(), img.width, img.height
+
+    # 需要按EXIF旋转的图片一律重新编码
+    rotated = img.getexif().get(ORIENTATION_TAG, 1) != 1
+    if not rotated and max(img.size) <= max_side and img.format in ('JPEG', 'PNG'):
+        return None, 'jpg' if img.format == 'JPEG' else 'png', img.width, img.height
+
+    img = ImageOps.exif_transpose(img)
+
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    output = io.BytesIO()
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img.save(output, 'PNG', optimize=True)
+        ext = 'png'
+    else:
+        img.convert('RGB').save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        ext = 'jpg'
+    return output.getvalue(), ext, img.width, img.height
+
+
+class ImageStore:
+    def __init__(self, root):
+        """初始化索引，root为图片目录"""
+        self.root = root
+        self._lock = threading.Lock()
+        self._images = {}
+        self._hashes = {}
+        self._index_mtime = None
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    @contextmanager
+    def _locked(self):
+        """持有进程内的锁和索引文件锁，并读取最新的索引"""
+        with self._lock:
+            if fcntl is None:
+                self._load_index()
+                yield
+                return
+            with open(os.path.join(self.root, LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._load_index()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_index(self):
+        """索引文件被其他进程更新过时重新读取"""
+        index_path = os.path.join(self.root, INDEX_FILE)
+        try:
+            stat = os.stat(index_path)
+        except FileNotFoundError:
+            return
+        # 索引每次都替换为新文件，inode和修改时间都相同时才是同一个版本
+        mtime = (stat.st_ino, stat.st_mtime_ns)
+        if mtime == self._index_mtime:
+            return
+        with open(index_path, encoding='utf-8') as f:
+            images = json.load(f)
+        hashes = {}
+        for name, entry in images.items():
+            hashes.setdefault(entry['sha256'], name)
+        self._images, self._hashes, self._index_mtime = images, hashes, mtime
+
+    def ingest(self, data, filename):
+        """保存上传的图片，data为字节或文件对象，返回内容寻址的文件名
+
+        内容与已有图片相同时不再保存，直接返回已有图片的文件名，并更新上传时间。
+        """
+        if isinstance(data, bytes):
+            data = io.BytesIO(data)
+        os.makedirs(os.path.join(self.root, TMP_DIR), exist_ok=True)
+        tmp_path = os.path.join(self.root, TMP_DIR, f'{uuid.uuid4().hex}.upload')
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: data.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            digest = digest.hexdigest()
+            with self._locked():
+                existing = self._hashes.get(digest)
+                if existing is not None:
+                    self._images[existing]['uploaded'] = time.time()
+                    self._save_index()
+                    return existing
+
+            # 解码和缩放放在锁外
+            asset, asset_ext, width, height = make_derivative(tmp_path)
+            ext = os.path.splitext(filename)[1].lower().lstrip('.') or asset_ext
+            name = f'{digest}.{ext}'
+            object_name = f'{OBJECT_DIR}/{digest[:2]}/{name}'
+            object_path = os.path.join(self.root, object_name)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_path, object_path)
+            asset_name = object_name
+            if asset is not None:
+                asset_name = f'{ASSET_DIR}/{digest[:2]}/{digest}.{asset_ext}'
+                self._write(os.path.join(self.root, asset_name), asset)
+                size += len(asset)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._locked():
+            self._images[name] = {
+                'sha256': digest,
+                'width': width,
+                'height': height,
+                'path': object_name,
+                'asset': asset_name,
+                'size': size,
+                'uploaded': time.time(),
+            }
+            self._hashes.setdefault(digest, name)
+            self._save_index()
+        return name
+
+    def lookup(self, name):
+        """按文件名查找图片，返回 (缩小后图片路径, 宽, 高)，找不到时返回None"""
+        _, entry = self._entry(name)
+        if entry is None:
+            return None
+        return os.path.join(self.root, entry['asset']), entry['width'], entry['height']
+
+    def _entry(self, name):
+        name = os.path.basename(name)
+        entry = self._images.get(name)
+        if entry is None:
+            with self._locked():
+                entry = self._images.get(name) or self._recover(name)
+        return name, entry
+
+    def _recover(self, name):
+        """索引中没有、但 objects/ 下有原图的内容寻址文件名，补回索引，需要持有锁"""
+        match = _CONTENT_NAME.match(name)
+        if match is None:
+            return None
+        digest = match.group(1)
+        object_name = f'{OBJECT_DIR}/{digest[:2]}/{name}'
+        object_path = os.path.join(self.root, object_name)
+        if not os.path.exists(object_path):
+            return None
+        from PIL import Image
+
+        asset_name = object_name
+        asset_dir = os.path.join(self.root, ASSET_DIR, digest[:2])
+        for filename in (os.listdir(asset_dir) if os.path.isdir(asset_dir) else ()):
+            if filename.startswith(digest + '.'):
+                asset_name = f'{ASSET_DIR}/{digest[:2]}/{filename}'
+                break
+        try:
+            # 缩小后的图片已经按EXIF方向旋转，尺寸以它为准
+            with Image.open(os.path.join(self.root, asset_name)) as img:
+                width, height = img.size
+        except OSError:
+            return None
+        size = os.path.getsize(object_path)
+        if asset_name != object_name:
+            size += os.path.getsize(os.path.join(self.root, asset_name))
+        entry = self._images[name] = {
+            'sha256': digest,
+            'width': width,
+            'height': height,
+            'path': object_name,
+            'asset': asset_name,
+            'size': size,
+            'uploaded': os.path.getmtime(object_path),
+        }
+        self._hashes.setdefault(digest, name)
+        self._save_index()
+        return entry
+
+    def resolve(self, name):
+        """按文件名查找原图，返回 (原图路径, 内容哈希)，不在索引中时返回None"""
+        name, entry = self._entry(name)
+        if entry is None:
+            return None
+        # 内容寻址之前上传的图片直接保存在图片目录下
+        return os.path.join(self.root, entry.get('path', name)), entry['sha256']
+
+    def collect_garbage(self, max_bytes=None, max_age=None, now=None):
+        """清理图片，返回删除的图片数
+
+        删除上传时间早于max_age秒之前的图片；总大小仍超过max_bytes时，
+        从最早上传的图片开始删除。同时删除中断的上传留下的临时文件。
+        """
+        now = now or time.time()
+        with self._locked():
+            entries = sorted(self._images.items(), key=lambda item: item[1].get('uploaded', 0))
+            total = sum(self._entry_size(name, entry) for name, entry in entries)
+            removed = []
+            for name, entry in entries:
+                expired = max_age is not None and now - entry.get('uploaded', 0) > max_age
+                if not expired and (max_bytes is None or total <= max_bytes):
+                    # 按上传时间排序，后面的图片更新
+                    break
+                removed.append(name)
+                total -= self._entry_size(name, entry)
+            for name in removed:
+                entry = self._images.pop(name)
+                for path in {entry.get('path', name), entry['asset']}:
+                    try:
+                        os.remove(os.path.join(self.root, path))
+                    except FileNotFoundError:
+                        pass
+            if removed:
+                self._hashes = {}
+                for name, entry in self._images.items():
+                    self._hashes.setdefault(entry['sha256'], name)
+                self._save_index()
+
+        tmp_dir = os.path.join(self.root, TMP_DIR)
+        if os.path.isdir(tmp_dir):
+            for filename in os.listdir(tmp_dir):
+                path = os.path.join(tmp_dir, filename)
+                try:
+                    if now - os.stat(path).st_mtime > TMP_MAX_AGE:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return len(removed)
+
+    def stats(self):
+        """返回图片数和总大小"""
+        with self._locked():
+            return {
+                'images': len(self._images),
+                'bytes': sum(self._entry_size(name, entry) for name, entry in self._images.items()),
+            }
+
+    def _entry_size(self, name, entry):
+        """原图和缩小版本的总大小，内容寻址之前上传的图片按文件大小计算"""
+        if 'size' in entry:
+            return entry['size']
+        size = 0
+        for path in {name, entry['asset']}:
+            try:
+                size += os.path.getsize(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+        return size
+
+    def _write(self, path, data):
+        """写入唯一的临时文件后替换，多个进程同时写入同一个文件时不会互相覆盖临时文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.',
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _save_index(self):
+        """写回索引，需要持有 _locked"""
+        index_path = os.path.join(self.root, INDEX_FILE)
+        self._write(index_path, json.dumps(self._images, ensure_ascii=False).encode('utf-8'))
+        stat = os.stat(index_path)
+        self._index_mtime = (stat.st_ino, stat.st_mtime_ns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Remove old uploaded images')
+    parser.add_argument('root', help='Upload directory')
+    parser.add_argument('--max-bytes', type=int, help='Keep total size of images under this many bytes')
+    parser.add_argument('--max-age', type=float, help='Remove images uploaded more than this many seconds ago')
+    args = parser.parse_args()
+    removed = ImageStore(args.root).collect_garbage(args.max_bytes, args.max_age)
+    print(f'removed {removed} images')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台渲染任务队列
+
+提交任务立即返回任务ID，渲染在独立的工作线程池中进行，客户端轮询任务状态
+（queued / running / done / failed）和进度，完成后下载结果。
+
+- 优先通道：小文档进入优先通道（priority=0），总是先于大文档被领取；
+  工作线程多于一个时，第一个线程只处理优先通道，大文档不会占满所有线程。
+- 每个客户端同时运行的任务数和排队的任务数都有上限。
+- 结果保留 retention 秒，所有结果总大小超过 max_result_bytes 时先淘汰最早完成的任务。
+
+队列有两种实现，接口相同：MemoryJobQueue（进程内）和 SQLiteJobQueue（多个进程
+共享同一个数据库文件，任何进程提交的任务都可以由任何进程领取和查询，不需要额外的消息队列服务）。
+SQLiteJobQueue 领取任务时记录领取者和心跳时间（租约），JobRunner 定期续约；领取任务的进程
+崩溃后租约过期，任务重新排队，领取次数用完后标记为失败，不会一直占用客户端的运行名额。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+PRIORITY_SMALL = 0
+PRIORITY_LARGE = 1
+
+
+class JobQueueFull(Exception):
+    """客户端排队的任务数已达上限"""
+
+
+class MemoryJobQueue:
+    def __init__(self, max_running_per_client=2, max_queued_per_client=20,
+                 retention=3600, max_result_bytes=512 * 1024 * 1024):
+        """初始化队列
+
+        max_running_per_client / max_queued_per_client: 每个客户端同时运行 / 排队的任务数上限
+        retention: 结果保留时间（秒）
+        max_result_bytes: 所有结果的总大小上限（字节）
+        """
+        self.max_running_per_client = max_running_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.retention = retention
+        self.max_result_bytes = max_result_bytes
+        self._jobs = OrderedDict()
+        self._results = {}
+        self._cond = threading.Condition()
+
+    def submit(self, payload, template=None, client='', priority=PRIORITY_LARGE):
+        """提交任务，返回任务ID；客户端排队任务过多时抛出JobQueueFull"""
+        with self._cond:
+            self._evict()
+            queued = sum(1 for job in self._jobs.values() if job['client'] == client and job['status'] == QUEUED)
+            if queued >= self.max_queued_per_client:
+                raise JobQueueFull('排队的任务过多，请稍后再试')
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': QUEUED,
+                'client': client,
+                'priority': priority,
+                'payload': payload,
+                'template': template,
+                'progress': {},
+                'error': None,
+                'created': time.time(),
+                'started': None,
+                'finished': None,
+            }
+            self._cond.notify_all()
+            return job_id
+
+    def claim(self, lanes=(PRIORITY_SMALL, PRIORITY_LARGE), timeout=1.0):
+        """领取一个任务并标记为运行中，没有可领取的任务时等待，超时返回None"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._next_job(lanes)
+                if job is not None:
+                    job['status'] = RUNNING
+                    job['started'] = time.time()
+                    return {key: job[key] for key in ('id', 'payload', 'template', 'client')}
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _next_job(self, lanes):
+        running = {}
+        for job in self._jobs.values():
+            if job['status'] == RUNNING:
+                running[job['client']] = running.get(job['client'], 0) + 1
+        candidates = [
+            job for job in self._jobs.values()
+            if job['status'] == QUEUED and job['priority'] in lanes
+            and running.get(job['client'], 0) < self.max_running_per_client
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda job: (job['priority'], job['created']))
+
+    def renew(self, job_ids):
+        """续约，进程内的队列随进程一起退出，不需要租约"""
+
+    def progress(self, job_id, **progress):
+        """更新任务进度"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['progress'] = progress
+
+    def finish(self, job_id, data):
+        """任务完成，保存结果"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['status'] = DONE
+            job['finished'] = time.time()
+            job['payload'] = job['template'] = None
+            self._results[job_id] = data
+            self._evict()
+            # 同一客户端的其他任务可能在等待运行名额
+            self._cond.notify_all()
+
+    def fail(self, job_id, error):
+        """任务失败，记录错误信息"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['status'] = FAILED
+            job['finished'] = time.time()
+            job['payload'] = job['template'] = None
+            job['error'] = error
+            self._cond.notify_all()
+
+    def status(self, job_id):
+        """返回任务状态，任务不存在或已过期时返回None"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return _status(job, self._results.get(job_id))
+
+    def result(self, job_id):
+        """返回任务结果，任务未完成或已过期时返回None"""
+        with self._cond:
+            return self._results.get(job_id)
+
+    def _evict(self):
+        """淘汰过期的任务，以及超出总大小上限的最早完成的结果"""
+        expire = time.time() - self.retention
+        finished = sorted((job['finished'], job_id) for job_id, job in self._jobs.items() if job['finished'])
+        total = sum(len(data) for data in self._results.values())
+        for finished_at, job_id in finished:
+            if finished_at >= expire and total <= self.max_result_bytes:
+                break
+            total -= len(self._results.pop(job_id, b''))
+            del self._jobs[job_id]
+
+    def stats(self):
+        """返回各状态的任务数"""
+        with self._cond:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            counts['result_bytes'] = sum(len(data) for data in self._results.values())
+            return counts
+
+
+class SQLiteJobQueue:
+    def __init__(self, path, max_running_per_client=2, max_queued_per_client=20,
+                 retention=3600, max_result_bytes=512 * 1024 * 1024, poll_interval=0.2,
+                 lease=60, max_attempts=2):
+        """初始化队列，任务保存在path指定的SQLite文件中
+
+        lease: 租约时长（秒），运行中的任务超过这个时间没有续约时视为领取者已退出
+        max_attempts: 每个任务最多领取的次数，租约过期且次数用完时标记为失败
+        其余参数同MemoryJobQueue
+        """
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._owner_id = uuid.uuid4().hex
+        self.max_running_per_client = max_running_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.retention = retention
+        self.max_result_bytes = max_result_bytes
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        # 本进程内提交任务时唤醒等待的工作线程，其他进程提交的任务靠轮询发现
+        self._cond = threading.Condition()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.close()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, client TEXT NOT NULL, '
+                'priority INTEGER NOT NULL, payload TEXT, template BLOB, progress TEXT, '
+                'error TEXT, result BLOB, result_size INTEGER NOT NULL DEFAULT 0, '
+                'created REAL NOT NULL, started REAL, finished REAL)'
+            )
+            # 租约字段，旧版本创建的数据库需要补上
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, definition in (('owner', 'TEXT'), ('heartbeat', 'REAL'),
+                                       ('attempts', 'INTEGER NOT NULL DEFAULT 0')):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {definition}')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created)')
+
+    @property
+    def owner(self):
+        """领取者标识，fork出的工作进程各不相同"""
+        return f'{os.getpid()}:{self._owner_id}'
+
+    def _connect(self, immediate=True):
+        """每个线程使用自己的连接；只读查询用immediate=False，不占用写锁"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+        return _Transaction(conn, immediate)
+
+    def submit(self, payload, template=None, client='', priority=PRIORITY_LARGE):
+        """提交任务，返回任务ID；客户端排队任务过多时抛出JobQueueFull"""
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            self._evict(conn)
+            queued = conn.execute('SELECT COUNT(*) FROM jobs WHERE client = ? AND status = ?',
+                                  (client, QUEUED)).fetchone()[0]
+            if queued >= self.max_queued_per_client:
+                raise JobQueueFull('排队的任务过多，请稍后再试')
+            conn.execute(
+                'INSERT INTO jobs (id, status, client, priority, payload, template, progress, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, QUEUED, client, priority, json.dumps(payload, ensure_ascii=False),
+                 template, '{}', time.time()),
+            )
+        with self._cond:
+            self._cond.notify_all()
+        return job_id
+
+    def claim(self, lanes=(PRIORITY_SMALL, PRIORITY_LARGE), timeout=1.0):
+        """领取一个任务并标记为运行中，没有可领取的任务时等待，超时返回None"""
+        deadline = time.monotonic() + timeout
+        placeholders = ','.join('?' * len(lanes))
+        while True:
+            with self._connect() as conn:
+                self._reclaim(conn)
+                row = conn.execute(
+                    f'SELECT id, payload, template, client FROM jobs AS j '
+                    f'WHERE status = ? AND priority IN ({placeholders}) '
+                    f'AND (SELECT COUNT(*) FROM jobs WHERE client = j.client AND status = ?) < ? '
+                    f'ORDER BY priority, created LIMIT 1',
+                    (QUEUED, *lanes, RUNNING, self.max_running_per_client),
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    conn.execute('UPDATE jobs SET status = ?, started = ?, owner = ?, heartbeat = ?, '
+                                 'attempts = attempts + 1 WHERE id = ?',
+                                 (RUNNING, now, self.owner, now, row['id']))
+                    return {
+                        'id': row['id'],
+                        'payload': json.loads(row['payload']),
+                        'template': row['template'],
+                        'client': row['client'],
+                    }
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._cond:
+                self._cond.wait(min(remaining, self.poll_interval))
+
+    def _reclaim(self, conn):
+        """租约过期的运行中任务重新排队，领取次数用完的标记为失败"""
+        now = time.time()
+        expired = now - self.lease
+        conn.execute(
+            'UPDATE jobs SET status = ?, finished = ?, payload = NULL, template = NULL, owner = NULL, '
+            'error = ? WHERE status = ? AND heartbeat < ? AND attempts >= ?',
+            (FAILED, now, '任务执行中断（工作进程退出）', RUNNING, expired, self.max_attempts),
+        )
+        conn.execute(
+            'UPDATE jobs SET status = ?, started = NULL, owner = NULL, heartbeat = NULL '
+            'WHERE status = ? AND heartbeat < ?',
+            (QUEUED, RUNNING, expired),
+        )
+
+    def renew(self, job_ids):
+        """为本进程领取的运行中任务续约"""
+        if not job_ids:
+            return
+        placeholders = ','.join('?' * len(job_ids))
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET heartbeat = ? WHERE status = ? AND owner = ? '
+                         f'AND id IN ({placeholders})', (time.time(), RUNNING, self.owner, *job_ids))
+
+    def progress(self, job_id, **progress):
+        """更新任务进度，同时续约"""
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET progress = ?, heartbeat = ? WHERE id = ? AND owner = ?',
+                         (json.dumps(progress), time.time(), job_id, self.owner))
+
+    def finish(self, job_id, data):
+        """任务完成，保存结果；租约已过期、任务被重新领取时忽略"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished = ?, payload = NULL, template = NULL, '
+                'result = ?, result_size = ? WHERE id = ? AND owner = ?',
+                (DONE, time.time(), data, len(data), job_id, self.owner),
+            )
+            self._evict(conn)
+        with self._cond:
+            self._cond.notify_all()
+
+    def fail(self, job_id, error):
+        """任务失败，记录错误信息；租约已过期、任务被重新领取时忽略"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished = ?, payload = NULL, template = NULL, error = ? '
+                'WHERE id = ? AND owner = ?',
+                (FAILED, time.time(), error, job_id, self.owner),
+            )
+        with self._cond:
+            self._cond.notify_all()
+
+    def status(self, job_id):
+        """返回任务状态，任务不存在或已过期时返回None"""
+        with self._connect(immediate=False) as conn:
+            row = conn.execute(
+                'SELECT id, status, priority, progress, error, result_size, created, started, finished '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['progress'] = json.loads(job['progress'] or '{}')
+        return _status(job, None, job.pop('result_size'))
+
+    def result(self, job_id):
+        """返回任务结果，任务未完成或已过期时返回None"""
+        with self._connect(immediate=False) as conn:
+            row = conn.execute('SELECT result FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row['result'] if row is not None else None
+
+    def _evict(self, conn):
+        """淘汰过期的任务，以及超出总大小上限的最早完成的结果"""
+        conn.execute('DELETE FROM jobs WHERE finished < ?', (time.time() - self.retention,))
+        total = conn.execute('SELECT COALESCE(SUM(result_size), 0) FROM jobs').fetchone()[0]
+        if total <= self.max_result_bytes:
+            return
+        for row in conn.execute('SELECT id, result_size FROM jobs WHERE finished IS NOT NULL '
+                                'ORDER BY finished').fetchall():
+            conn.execute('DELETE FROM jobs WHERE id = ?', (row['id'],))
+            total -= row['result_size']
+            if total <= self.max_result_bytes:
+                break
+
+    def stats(self):
+        """返回各状态的任务数"""
+        with self._connect(immediate=False) as conn:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for row in conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+                counts[row[0]] = row[1]
+            counts['result_bytes'] = conn.execute(
+                'SELECT COALESCE(SUM(result_size), 0) FROM jobs').fetchone()[0]
+            return counts
+
+
+class _Transaction:
+    """写操作用BEGIN IMMEDIATE事务，领取任务时多个进程不会领到同一个任务；
+    只读查询用普通事务，WAL模式下不会等待写锁"""
+
+    def __init__(self, conn, immediate=True):
+        self.conn = conn
+        self.immediate = immediate
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE' if self.immediate else 'BEGIN')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def _status(job, result=None, result_size=None):
+    """任务状态的公开字段"""
+    status = {
+        'id': job['id'],
+        'status': job['status'],
+        'priority': job['priority'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created': job['created'],
+        'started': job['started'],
+        'finished': job['finished'],
+    }
+    if job['status'] == DONE:
+        status['size'] = len(result) if result is not None else result_size
+    return status
+
+
+def create_job_queue(backend, path=None, lease=60, max_attempts=2, **options):
+    """按配置创建任务队列，backend为memory或sqlite，lease和max_attempts只用于sqlite"""
+    if backend == 'memory':
+        return MemoryJobQueue(**options)
+    if backend == 'sqlite':
+        return SQLiteJobQueue(path, lease=lease, max_attempts=max_attempts, **options)
+    raise ValueError(f'不支持的任务队列后端: {backend}')
+
+
+class JobRunner:
+    def __init__(self, queue, render, workers=2):
+        """初始化工作线程池
+
+        render(job, progress) 渲染任务并返回结果字节，progress(**进度) 用于上报进度。
+        队列有租约（SQLiteJobQueue）时，另一个线程每隔租约的三分之一为运行中的任务续约。
+        """
+        self.queue = queue
+        self.render = render
+        self.workers = workers
+        self._threads = []
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动工作线程，重复调用无副作用"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                # 多于一个线程时，第一个线程只处理优先通道
+                lanes = (PRIORITY_SMALL,) if i == 0 and self.workers > 1 else (PRIORITY_SMALL, PRIORITY_LARGE)
+                thread = threading.Thread(target=self._run, args=(lanes,), daemon=True,
+                                          name=f'job-worker-{i}')
+                thread.start()
+                self._threads.append(thread)
+            lease = getattr(self.queue, 'lease', None)
+            if lease:
+                thread = threading.Thread(target=self._renew, args=(lease / 3,), daemon=True,
+                                          name='job-lease')
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """停止工作线程，正在渲染的任务完成后退出"""
+        self._stop.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def _run(self, lanes):
+        while not self._stop.is_set():
+            job = self.queue.claim(lanes, timeout=0.5)
+            if job is None:
+                continue
+            with self._running_lock:
+                self._running.add(job['id'])
+            try:
+                data = self.render(job, lambda **progress: self.queue.progress(job['id'], **progress))
+            except Exception as e:
+                self.queue.fail(job['id'], str(e))
+            else:
+                self.queue.finish(job['id'], data)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job['id'])
+
+    def _renew(self, interval):
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                job_ids = list(self._running)
+            self.queue.renew(job_ids)
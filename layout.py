@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文本排版估算
+
+按字宽估算文本在给定宽度的文本框中折行后的行数和高度，供 MarkdownToPPT
+判断内容是否超出幻灯片底部。字宽以字号为单位：中日韩文字和全角符号为1，
+拉丁字母、数字和标点按常见无衬线字体的平均字宽估算，等宽字体统一为0.6。
+单个字符的宽度和整段文本的折行结果都有缓存。
+
+所有长度单位都是EMU（python-pptx 的 Inches、Pt 返回的整数）。
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+from pptx.util import Inches
+
+LINE_SPACING = 1.2                  # 行高与字号之比
+TEXT_INSETS_X = Inches(0.2)         # 文本框左右内边距之和
+TEXT_INSETS_Y = Inches(0.1)         # 文本框上下内边距之和
+MONOSPACE_FONTS = {'Courier New', 'Consolas', 'Courier'}
+
+# 空白、连续的拉丁字符（按单词折行），其余字符（中日韩文字等）逐字折行
+_TOKEN_RE = re.compile(r'[^\S\n]+|[\x21-\x7e¡-ɏ]+|.', re.DOTALL)
+
+_NARROW = set("fijlrtI!',.:;|()[]{}`")
+_WIDE = set('mwMW@%')
+
+
+@lru_cache(maxsize=None)
+def char_width(char, monospace=False):
+    """单个字符的宽度（以字号为单位）"""
+    if unicodedata.combining(char):
+        return 0.0
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 1.0
+    if monospace:
+        return 0.6
+    if char == ' ':
+        return 0.25
+    if char in _NARROW:
+        return 0.3
+    if char in _WIDE:
+        return 0.85
+    if char.isupper():
+        return 0.65
+    if char.isdigit():
+        return 0.55
+    return 0.5
+
+
+def text_width(text, monospace=False):
+    """文本宽度（以字号为单位）"""
+    return sum(char_width(char, monospace) for char in text)
+
+
+@lru_cache(maxsize=4096)
+def wrap_lines(text, font_size, box_width, monospace=False):
+    """把文本按文本框宽度折行，返回行的元组
+
+    各行首尾相接等于原文本，换行符保留在所在行的末尾。
+    """
+    width = (box_width - TEXT_INSETS_X) / font_size
+    lines = []
+    line = ''
+    line_width = 0.0
+    for token in _TOKEN_RE.findall(text):
+        if token == '\n':
+            lines.append(line + token)
+            line = ''
+            line_width = 0.0
+            continue
+        token_width = text_width(token, monospace)
+        if line_width + token_width <= width or token.isspace():
+            line += token
+            line_width += token_width
+            continue
+        # 超过一行宽度的单词逐字折行
+        parts = [token] if token_width <= width else list(token)
+        for part in parts:
+            part_width = text_width(part, monospace)
+            if line and line_width + part_width > width:
+                lines.append(line)
+                line = ''
+                line_width = 0.0
+            line += part
+            line_width += part_width
+    lines.append(line)
+    return tuple(lines)
+
+
+def line_count(text, font_size, box_width, monospace=False):
+    """折行后的行数
+
+    字数乘以最大字宽都放得下的单行文本直接返回1，不逐字计算，
+    大表格中的短单元格不需要折行。
+    """
+    if len(text) <= (box_width - TEXT_INSETS_X) / font_size and '\n' not in text:
+        return 1
+    return len(wrap_lines(text, font_size, box_width, monospace))
+
+
+def line_height(font_size):
+    """单行高度"""
+    return int(font_size * LINE_SPACING)
+
+
+def text_height(line_count, font_size):
+    """若干行文本加上下内边距的高度"""
+    return line_count * line_height(font_size) + TEXT_INSETS_Y
+
+
+def lines_fitting(available, font_size):
+    """给定高度内能放下的行数"""
+    return max(int((available - TEXT_INSETS_Y) // line_height(font_size)), 0)
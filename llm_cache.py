@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存
+
+以规范化后的提示词（模型、消息、请求参数）的SHA-256为键，缓存非流式调用的
+完整回复，以及流式调用按顺序记录的增量内容，命中时直接回放。
+后端可选内存LRU（MemoryCache）或进程重启后仍保留的SQLite（SQLiteCache），
+两者都有TTL和条目数上限。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r'[ \t　]+')
+
+
+def normalize_text(text):
+    """去掉每行首尾空白和空行，行内连续空白合并为一个空格"""
+    lines = (_WHITESPACE_RE.sub(' ', line).strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def cache_key(kind, model, messages, options):
+    """计算缓存键，kind区分流式和非流式调用"""
+    normalized = [
+        {'role': message['role'], 'content': normalize_text(message['content'])}
+        for message in messages
+    ]
+    data = json.dumps([kind, model, normalized, options], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class MemoryCache:
+    def __init__(self, max_size=256, ttl=3600, max_bytes=None, sizeof=None):
+        """初始化缓存，max_size为最多缓存的条目数，ttl为过期时间（秒）
+
+        max_bytes: 所有条目的总大小上限（字节），按 sizeof(值) 计算，None时只按条目数淘汰
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """返回缓存的值，不存在或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                    self.bytes -= entry[2]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            # 单个条目超过总大小上限时不缓存
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (time.time() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_size or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self.bytes -= self._entries.popitem(last=False)[1][2]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        stats = {
+            'backend': 'memory',
+            'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+        if self.max_bytes is not None:
+            stats.update(bytes=self.bytes, max_bytes=self.max_bytes)
+        return stats
+
+
+class SQLiteCache:
+    def __init__(self, path, max_size=256, ttl=3600):
+        """初始化缓存，数据保存在path指定的SQLite文件中"""
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS llm_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+
+    def get(self, key):
+        """返回缓存的值，不存在或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    with self._conn:
+                        self._conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute('UPDATE llm_cache SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, data, now + self.ttl, now),
+            )
+            self._conn.execute('DELETE FROM llm_cache WHERE expires < ?', (now,))
+            self._conn.execute(
+                'DELETE FROM llm_cache WHERE key NOT IN '
+                '(SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT ?)',
+                (self.max_size,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+
+    def stats(self):
+        """返回缓存统计信息"""
+        return {
+            'backend': 'sqlite',
+            'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def create_cache(backend, max_size=256, ttl=3600, path=None):
+    """按配置创建缓存后端，backend为None时不启用缓存"""
+    if not backend:
+        return None
+    if backend == 'memory':
+        return MemoryCache(max_size, ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, max_size, ttl)
+    raise ValueError(f'不支持的缓存后端: {backend}')
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM API客户端
+
+所有请求共用一个带连接池的 requests.Session（HTTP/1.1 keep-alive），每个请求有
+连接超时和读超时；同时进行的请求数由信号量限制，超出的请求排队等待，
+排队超时返回 LLMBusyError。流式请求在整个流读完或被关闭前一直占用名额。
+每个请求的耗时、流式请求的首个token耗时和输出速度记录到 metrics 中。
+"""
+
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS, LLM_TOKENS, LLM_TOKENS_PER_SECOND
+
+
+class LLMError(Exception):
+    """LLM API调用失败"""
+
+
+class LLMBusyError(LLMError):
+    """同时进行的LLM请求已满，排队超时"""
+
+
+class LLMClient:
+    def __init__(self, api_url, model, pool_size=32, max_inflight=16,
+                 connect_timeout=5, read_timeout=120, queue_timeout=30):
+        """初始化客户端
+
+        pool_size: 连接池中保持的最大连接数
+        max_inflight: 同时进行的最大请求数
+        connect_timeout / read_timeout: 建立连接和两次读取之间的超时（秒）
+        queue_timeout: 等待空闲名额的最长时间（秒）
+        """
+        self.api_url = api_url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.queue_timeout = queue_timeout
+        self.max_inflight = max_inflight
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+
+        self._slots = threading.Semaphore(max_inflight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.requests_total = 0
+        self.errors_total = 0
+        self.rejected_total = 0
+        self.queue_wait_seconds = 0.0
+
+    def _acquire(self):
+        """等待空闲名额，记录排队指标"""
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        start = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.monotonic() - start
+        with self._lock:
+            self.waiting -= 1
+            self.queue_wait_seconds += waited
+            if not acquired:
+                self.rejected_total += 1
+                raise LLMBusyError('LLM请求排队超时，请稍后重试')
+            self.in_flight += 1
+            self.requests_total += 1
+
+    def _release(self, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors_total += 1
+        self._slots.release()
+
+    def _post(self, payload, stream):
+        try:
+            response = self.session.post(self.api_url, json=payload, stream=stream,
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            return response
+        except requests.RequestException as e:
+            raise LLMError(str(e)) from e
+
+    def _payload(self, messages, stream, options):
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+        }
+        payload.update(options)
+        return payload
+
+    def chat(self, messages, result=None, **options):
+        """非流式调用，返回完整的回复内容
+
+        result为字典时写入 finish_reason、prompt_tokens、completion_tokens（服务端没有返回时为None）。
+        """
+        self._acquire()
+        failed = True
+        start = time.perf_counter()
+        try:
+            response = self._post(self._payload(messages, False, options), stream=False)
+            try:
+                data = response.json()
+                content = data["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError) as e:
+                raise LLMError(f'无法解析LLM返回结果: {str(e)}') from e
+            usage = data.get('usage') or {}
+            tokens = usage.get('completion_tokens')
+            if tokens:
+                LLM_TOKENS.inc(tokens, 'chat')
+            if result is not None:
+                result.update(finish_reason=data["choices"][0].get("finish_reason"),
+                              prompt_tokens=usage.get('prompt_tokens'), completion_tokens=tokens)
+            failed = False
+            return content
+        finally:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, 'chat')
+            self._release(failed)
+
+    def stream_chat(self, messages, result=None, **options):
+        """流式调用，逐个返回增量内容
+
+        名额在生成器结束或被关闭时释放；连接读完后放回连接池复用。
+        返回结果中没有usage时，按增量块数估算token数。
+        result为字典时，流读完后写入 finish_reason、prompt_tokens、completion_tokens。
+        """
+        self._acquire()
+        failed = True
+        response = None
+        start = time.perf_counter()
+        first_token = None
+        chunks = 0
+        usage_tokens = None
+        prompt_tokens = None
+        finish_reason = None
+        try:
+            response = self._post(self._payload(messages, True, options), stream=True)
+            # 读到[DONE]后继续读完响应体，连接才能放回连接池
+            done = False
+            for line in response.iter_lines():
+                if done or not line:
+                    continue
+                line = line.decode('utf-8')
+                if not line.startswith('data: '):
+                    continue
+                if line[6:].strip() == '[DONE]':
+                    done = True
+                    continue
+                try:
+                    data = json.loads(line[6:])
+                except json.JSONDecodeError:
+                    continue
+                if data.get('usage'):
+                    usage_tokens = data['usage'].get('completion_tokens', usage_tokens)
+                    prompt_tokens = data['usage'].get('prompt_tokens', prompt_tokens)
+                if 'choices' in data and len(data['choices']) > 0:
+                    finish_reason = data['choices'][0].get('finish_reason') or finish_reason
+                    content = data['choices'][0].get('delta', {}).get('content', '')
+                    if content:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                            LLM_FIRST_TOKEN_SECONDS.observe(first_token - start)
+                        chunks += 1
+                        yield content
+            if result is not None:
+                result.update(finish_reason=finish_reason, prompt_tokens=prompt_tokens,
+                              completion_tokens=usage_tokens or chunks)
+            failed = False
+        except GeneratorExit:
+            # 调用方提前关闭（客户端断开、对冲请求取消）不算失败
+            failed = False
+            raise
+        except requests.RequestException as e:
+            raise LLMError(str(e)) from e
+        finally:
+            if response is not None:
+                response.close()
+            end = time.perf_counter()
+            LLM_REQUEST_SECONDS.observe(end - start, 'stream')
+            # 只统计服务端实际生成的token，失败的请求不计入
+            tokens = 0 if failed else usage_tokens or chunks
+            if tokens:
+                LLM_TOKENS.inc(tokens, 'stream')
+            if not failed and first_token is not None and tokens > 1 and end > first_token:
+                LLM_TOKENS_PER_SECOND.observe((tokens - 1) / (end - first_token))
+            self._release(failed)
+
+    def stats(self):
+        """返回连接和排队指标"""
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_inflight': self.max_inflight,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'requests_total': self.requests_total,
+                'errors_total': self.errors_total,
+                'rejected_total': self.rejected_total,
+                'queue_wait_seconds': round(self.queue_wait_seconds, 3),
+            }
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多后端LLM路由
+
+把请求分配到多个OpenAI兼容的后端（每个后端一个 LLMClient，各自的连接池和并发上限），
+接口与 LLMClient 相同：
+
+- 负载均衡：选择未完成请求数最少的可用后端，相同时轮流选择；
+- 被动健康检查和熔断：后端连续失败 failure_threshold 次后暂停使用 open_seconds 秒，
+  之后放行一个试探请求，成功则恢复，失败则继续暂停；
+- 主动健康检查：后台线程每隔 health_interval 秒请求各后端的 /v1/models，失败的后端暂停使用，
+  恢复后重新启用；所有后端都不可用时仍然尝试，避免健康检查误判时全部请求失败；
+- 重试：连接失败、超时、5xx、排队超时等错误在收到第一个token之前换一个后端重试，
+  流式请求已经返回内容后出错不再重试；
+- 对冲（hedged_chat）：短请求在 hedge_delay 秒内没有返回时，在另一个后端再发一次，
+  返回先完成的结果。
+"""
+
+import queue
+import threading
+import time
+
+import requests
+
+from llm_client import LLMBusyError, LLMClient, LLMError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def retryable(error):
+    """是否可以换一个后端重试：4xx（请求本身有问题）不重试"""
+    cause = error.__cause__
+    if isinstance(cause, requests.HTTPError) and cause.response is not None:
+        return cause.response.status_code >= 500 or cause.response.status_code == 429
+    return True
+
+
+def models_url(api_url):
+    """chat/completions 地址对应的 /v1/models 地址"""
+    base = api_url.rsplit('/chat/completions', 1)[0]
+    return base.rstrip('/') + '/models'
+
+
+class Backend:
+    """一个后端的客户端和健康状态"""
+
+    def __init__(self, client):
+        self.client = client
+        self.outstanding = 0
+        self.failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.healthy = True
+        self.requests_total = 0
+        self.errors_total = 0
+
+
+class LLMRouter:
+    def __init__(self, api_urls, model, retries=1, failure_threshold=3, open_seconds=30,
+                 health_interval=10, hedge_delay=0.5, **client_options):
+        """初始化路由
+
+        api_urls: 各后端的 chat/completions 地址
+        retries: 收到第一个token之前失败时换后端重试的次数
+        failure_threshold / open_seconds: 连续失败多少次后熔断，熔断的时长（秒）
+        health_interval: 主动健康检查的间隔（秒），0关闭
+        hedge_delay: 对冲请求的等待时间（秒），None关闭对冲
+        client_options: 传给每个后端 LLMClient 的参数（连接池、超时、并发上限）
+        """
+        if not api_urls:
+            raise ValueError('至少需要一个LLM后端')
+        self.backends = [Backend(LLMClient(url, model, **client_options)) for url in api_urls]
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.health_interval = health_interval
+        self.hedge_delay = hedge_delay
+        self._lock = threading.Lock()
+        self._next = 0
+        self._health_thread = None
+        self._stopped = threading.Event()
+        self.retries_total = 0
+        self.hedged_total = 0
+        self.circuit_opens_total = 0
+
+    def _available(self, backend, now):
+        """后端是否可用，熔断时长已过时转为半开，放行一个试探请求"""
+        if not backend.healthy:
+            return False
+        if backend.state == OPEN and now - backend.opened_at >= self.open_seconds:
+            backend.state = HALF_OPEN
+            return True
+        if backend.state == HALF_OPEN:
+            # 试探请求完成前不再放行
+            return backend.outstanding == 0
+        return backend.state == CLOSED
+
+    def _acquire(self, tried):
+        """选择未完成请求数最少的可用后端，所有后端都不可用时在没有尝试过的后端中选择"""
+        self._start_health_checks()
+        now = time.monotonic()
+        with self._lock:
+            count = len(self.backends)
+            # 从轮转位置开始遍历，未完成请求数相同时轮流选择
+            order = [self.backends[(self._next + i) % count] for i in range(count)]
+            candidates = [backend for backend in order if backend not in tried]
+            available = [backend for backend in candidates if self._available(backend, now)]
+            if not candidates:
+                return None
+            backend = min(available or candidates, key=lambda backend: backend.outstanding)
+            self._next = (self.backends.index(backend) + 1) % count
+            backend.outstanding += 1
+            backend.requests_total += 1
+            return backend
+
+    def _release(self, backend, error=None):
+        """请求结束，记录成功或失败；排队超时和4xx错误不计入后端的失败次数"""
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.failures = 0
+                backend.state = CLOSED
+                return
+            backend.errors_total += 1
+            if isinstance(error, LLMBusyError) or not retryable(error):
+                return
+            backend.failures += 1
+            if backend.state == HALF_OPEN or backend.failures >= self.failure_threshold:
+                if backend.state != OPEN:
+                    self.circuit_opens_total += 1
+                backend.state = OPEN
+                backend.opened_at = time.monotonic()
+
+    def _retry(self, error, attempt, tried):
+        """是否换一个后端重试"""
+        if attempt >= self.retries or not retryable(error) or len(tried) >= len(self.backends):
+            return False
+        with self._lock:
+            self.retries_total += 1
+        return True
+
+    def chat(self, messages, result=None, **options):
+        """非流式调用，失败时换一个后端重试"""
+        tried = set()
+        attempt = 0
+        while True:
+            backend = self._acquire(tried)
+            tried.add(backend)
+            try:
+                content = backend.client.chat(messages, result, **options)
+            except LLMError as e:
+                self._release(backend, e)
+                if not self._retry(e, attempt, tried):
+                    raise
+                attempt += 1
+                continue
+            self._release(backend)
+            return content
+
+    def stream_chat(self, messages, result=None, **options):
+        """流式调用，收到第一个增量内容之前失败时换一个后端重试"""
+        tried = set()
+        attempt = 0
+        while True:
+            backend = self._acquire(tried)
+            tried.add(backend)
+            chunks = backend.client.stream_chat(messages, result, **options)
+            started = False
+            error = None
+            try:
+                for content in chunks:
+                    started = True
+                    yield content
+            except LLMError as e:
+                error = e
+            finally:
+                chunks.close()
+                self._release(backend, error)
+            if error is None:
+                return
+            if started or not self._retry(error, attempt, tried):
+                raise error
+            attempt += 1
+
+    def hedged_chat(self, messages, result=None, **options):
+        """对冲调用：hedge_delay 秒内没有返回时在另一个后端再发一次，返回先完成的结果
+
+        较慢的请求不会被取消，完成后丢弃结果。只有一个后端或关闭对冲时等同于 chat。
+        """
+        if self.hedge_delay is None or len(self.backends) < 2:
+            return self.chat(messages, result, **options)
+        results = queue.Queue()
+        tried = set()
+
+        def run(backend):
+            backend_result = {}
+            try:
+                content = backend.client.chat(messages, backend_result, **options)
+            except LLMError as e:
+                self._release(backend, e)
+                results.put((None, backend_result, e))
+                return
+            self._release(backend)
+            results.put((content, backend_result, None))
+
+        def launch():
+            backend = self._acquire(tried)
+            if backend is None:
+                return False
+            tried.add(backend)
+            threading.Thread(target=run, args=(backend,), daemon=True, name='llm-hedge').start()
+            return True
+
+        launch()
+        pending = 1
+        hedged = False
+        error = None
+        while pending:
+            try:
+                content, backend_result, e = results.get(timeout=None if hedged else self.hedge_delay)
+            except queue.Empty:
+                hedged = True
+                if launch():
+                    pending += 1
+                    with self._lock:
+                        self.hedged_total += 1
+                continue
+            pending -= 1
+            if e is None:
+                if result is not None:
+                    result.update(backend_result)
+                return content
+            error = e
+            # 失败且没有其他进行中的请求时换一个后端重试
+            if not pending and self._retry(e, len(tried) - 1, tried) and launch():
+                pending += 1
+        raise error
+
+    def _start_health_checks(self):
+        """第一次请求时启动主动健康检查线程（在工作进程中启动，不会在fork前创建线程）"""
+        if not self.health_interval or self._health_thread is not None:
+            return
+        with self._lock:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(target=self._health_loop, daemon=True, name='llm-health')
+                self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
+
+    def check_health(self):
+        """请求各后端的 /v1/models，更新健康状态；恢复的后端结束熔断"""
+        for backend in self.backends:
+            client = backend.client
+            try:
+                response = client.session.get(models_url(client.api_url), timeout=client.timeout)
+                healthy = response.ok
+                response.close()
+            except requests.RequestException:
+                healthy = False
+            with self._lock:
+                if healthy and not backend.healthy:
+                    backend.failures = 0
+                    backend.state = CLOSED
+                backend.healthy = healthy
+
+    def close(self):
+        """停止健康检查线程"""
+        self._stopped.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+
+    def stats(self):
+        """返回各后端的状态和汇总的连接、排队指标"""
+        backends = []
+        now = time.monotonic()
+        for backend in self.backends:
+            client_stats = backend.client.stats()
+            with self._lock:
+                backends.append(dict(
+                    client_stats,
+                    url=backend.client.api_url,
+                    outstanding=backend.outstanding,
+                    state=backend.state,
+                    healthy=backend.healthy,
+                    available=int(backend.healthy and (backend.state != OPEN
+                                                       or now - backend.opened_at >= self.open_seconds)),
+                    failures=backend.failures,
+                    backend_requests_total=backend.requests_total,
+                    backend_errors_total=backend.errors_total,
+                ))
+        totals = {key: sum(backend[key] for backend in backends)
+                  for key in ('in_flight', 'max_inflight', 'waiting', 'max_waiting', 'requests_total',
+                              'errors_total', 'rejected_total', 'queue_wait_seconds')}
+        totals['queue_wait_seconds'] = round(totals['queue_wait_seconds'], 3)
+        with self._lock:
+            totals.update(
+                available_backends=sum(backend['available'] for backend in backends),
+                retries_total=self.retries_total,
+                hedged_total=self.hedged_total,
+                circuit_opens_total=self.circuit_opens_total,
+            )
+        totals['backends'] = backends
+        return totals
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+低内存渲染
+
+python-pptx 在保存之前把每张幻灯片的XML树和每张图片的内容都保存在内存中，
+图片多、页数多的PPT峰值内存随页数增长。低内存模式（MarkdownToPPT(low_memory=True)）：
+
+- 图片只记录磁盘路径（FileImagePart），保存PPT时才读取并写入压缩包；
+- 翻到下一页时，上一页的XML树序列化并压缩后释放（release_slide）；
+- stream_save 在后台线程中保存PPT，边写边返回压缩包的数据块，可以直接作为响应体，
+  不需要先把整个PPT写入内存或临时文件。
+
+释放后的幻灯片不能再通过 prs.slides 访问，低内存模式不支持增量渲染和多进程并行渲染。
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import zlib
+
+from pptx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from pptx.opc.package import Part
+from pptx.opc.packuri import PackURI
+from pptx.parts.image import ImagePart
+
+IMAGE_CONTENT_TYPES = {
+    'jpg': CT.JPEG,
+    'jpeg': CT.JPEG,
+    'png': CT.PNG,
+    'gif': CT.GIF,
+    'bmp': CT.BMP,
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class FileImagePart(ImagePart):
+    """内容在磁盘文件中的图片部件，保存PPT时才读取"""
+
+    def __init__(self, partname, content_type, package, path):
+        super().__init__(partname, content_type, package, None, os.path.basename(path))
+        self._path = path
+
+    @property
+    def blob(self):
+        with open(self._path, 'rb') as f:
+            return f.read()
+
+    @property
+    def sha1(self):
+        digest = hashlib.sha1()
+        with open(self._path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+class ReleasedSlidePart(Part):
+    """已经完成的幻灯片，只保留压缩后的XML和关系"""
+
+    def __init__(self, slide_part):
+        super().__init__(slide_part.partname, slide_part.content_type, slide_part.package)
+        self._compressed = zlib.compress(slide_part.blob, 1)
+        # 关系（版式、图片）原样保留，保存时照常写入
+        self.__dict__['_rels'] = slide_part.rels
+
+    @property
+    def blob(self):
+        return zlib.decompress(self._compressed)
+
+
+def release_slide(prs, slide):
+    """把幻灯片替换为 ReleasedSlidePart，释放XML树"""
+    slide_part = slide.part
+    for rel in prs.part.rels.values():
+        if rel._target is slide_part:
+            rel._target = ReleasedSlidePart(slide_part)
+            return
+
+
+class FileImages:
+    """低内存模式下添加图片：同一文件只添加一次，图片部件按序号命名"""
+
+    def __init__(self, package):
+        self.package = package
+        self.parts = {}
+        self.next_index = None
+
+    def add_picture(self, slide, path, left, top, width, height):
+        """在slide上添加图片，不读取图片内容；不支持的格式返回None，由调用方按普通方式添加"""
+        ext = os.path.splitext(path)[1].lower().lstrip('.')
+        content_type = IMAGE_CONTENT_TYPES.get(ext)
+        if content_type is None:
+            return None
+        path = os.path.abspath(path)
+        image_part = self.parts.get(path)
+        if image_part is None:
+            if self.next_index is None:
+                # 模板中已有的图片只需要遍历一次
+                self.next_index = self.package.next_image_partname('png').idx
+            partname = PackURI(f'/ppt/media/image{self.next_index}.{"jpg" if ext == "jpeg" else ext}')
+            self.next_index += 1
+            image_part = self.parts[path] = FileImagePart(partname, content_type, self.package, path)
+        rId = slide.part.relate_to(image_part, RT.IMAGE)
+        shapes = slide.shapes
+        pic = shapes._add_pic_from_image_part(image_part, rId, left, top, width, height)
+        shapes._recalculate_extents()
+        return shapes._shape_factory(pic)
+
+
+class _QueueWriter:
+    """把写入的数据按块放入队列，队列满时等待读取"""
+
+    def __init__(self, chunks, cancelled, chunk_size):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise IOError('stream closed')
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+def stream_save(save, chunk_size=CHUNK_SIZE, max_chunks=16):
+    """在后台线程中调用 save(文件对象)，返回写入数据块的生成器
+
+    ZIP写入不可定位的流时使用数据描述符，不需要回头修改已写出的数据。
+    最多缓存 max_chunks 个数据块，读取方跟不上时写入方等待；生成器被关闭时停止保存。
+    """
+    chunks = queue.Queue(maxsize=max_chunks)
+    cancelled = threading.Event()
+    done = object()
+    writer = _QueueWriter(chunks, cancelled, chunk_size)
+
+    def run():
+        try:
+            save(writer)
+            writer.flush()
+            writer.put(done)
+        except Exception as e:
+            try:
+                writer.put(e)
+            except IOError:
+                pass
+
+    # 开始读取时才启动保存线程，生成器没有被读取就丢弃时不会留下等待的线程
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        thread.join()
@@ -6,89 +6,477 @@ Date: 2024
 """
 
 import os
+import io
 import argparse
+import hashlib
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from pptx import Presentation
+from pptx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TARGET_MODE as RTM, RELATIONSHIP_TYPE as RT
+from pptx.opc.package import _Relationship
+from pptx.opc.packuri import PackURI
+from pptx.oxml.ns import qn
+from pptx.parts.slide import SlidePart
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
-import markdown
-from bs4 import BeautifulSoup
-from PIL import Image
+from md_stream import H1, H2, H3, PARAGRAPH, LIST_ITEM, CODE, IMAGE, TABLE
+from image_store import ImageStore
+from layout import MONOSPACE_FONTS, line_count, lines_fitting, text_height, wrap_lines
+from metrics import ELEMENT_SECONDS, STAGE_SECONDS
+from slide_ir import parse_document
+from table_xml import normalize_rows, table_xml
+from low_memory import FileImages, release_slide, stream_save
+
+logger = logging.getLogger(__name__)
+
+def remove_all_slides(prs):
+    """删除演示文稿中所有现有幻灯片，只保留母版和版式"""
+    for _ in range(len(prs.slides)):
+        rId = prs.slides._sldIdLst[0].rId
+        prs.part.drop_rel(rId)
+        del prs.slides._sldIdLst[0]
+    return prs
+
+def table_rows(table_element):
+    """从BeautifulSoup表格元素中取出单元格文本，第一行为表头"""
+    rows = []
+    for tr in table_element.find_all('tr'):
+        row = [td.get_text().strip() for td in tr.find_all(['td', 'th'])]
+        rows.append(row)
+    return rows
+
+def find_image(image_path, image_dir=None):
+    """Markdown中的图片路径对应的文件：指定了图片目录时在目录中按文件名查找，
+    否则依次尝试原路径、当前目录和本文件所在目录下的images目录；都不存在时返回原路径"""
+    if image_dir:
+        return os.path.join(image_dir, os.path.basename(image_path))
+    possible_paths = [
+        image_path,
+        os.path.join('images', os.path.basename(image_path)),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images', os.path.basename(image_path))
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    return image_path
+
+
+def iter_html_elements(md_text):
+    """通过 markdown → HTML → BeautifulSoup 解析，按文档顺序产出元素事件
+
+    与原来 process_markdown 的 find_all 遍历完全一致（pre和其中的code、行内code
+    都作为代码块），是流式解析器的一致性基准。
+    """
+    # 只有回退路径需要，第一次使用时才导入
+    import markdown
+    from bs4 import BeautifulSoup
+
+    # 配置Markdown解析器，启用表格和代码块扩展
+    md = markdown.Markdown(extensions=['tables', 'fenced_code'])
+    
+    # 转换为HTML
+    with STAGE_SECONDS.time('markdown_convert'):
+        html = md.convert(md_text)
+    
+    # 使用BeautifulSoup解析HTML
+    with STAGE_SECONDS.time('html_parse'):
+        soup = BeautifulSoup(html, 'html.parser')
+    
+    for element in soup.find_all(['h1', 'h2', 'h3', 'p', 'img', 'table', 'pre', 'code', 'ul', 'li']):
+        if element.name in ('h1', 'h2', 'h3'):
+            yield (element.name, element.get_text())
+        elif element.name == 'img':
+            src = element.get('src')
+            if src:
+                yield (IMAGE, src)
+        elif element.name == 'table':
+            yield (TABLE, table_rows(element))
+        elif element.name in ('pre', 'code'):
+            yield (CODE, element.get_text())
+        elif element.name == 'li':
+            yield (LIST_ITEM, element.get_text())
+        elif element.name == 'p' and not element.find_parent(['pre', 'code']):
+            yield (PARAGRAPH, element.get_text())
+
+def append_slides(prs, source):
+    """把source中的幻灯片按顺序移到prs末尾，两者需来自同一模板
+
+    直接把幻灯片部件挂到prs的包上：重新命名部件，版式关系指向prs中对应的版式，
+    图片按内容去重后放进prs的包。部件名、关系ID和幻灯片ID的分配方式与
+    Slides.add_slide相同，结果与直接在prs中渲染一致。返回追加的最后一张幻灯片。
+    """
+    slide = None
+    package = prs.part.package
+    pres_rels = prs.part.rels
+    sld_id_lst = prs.slides._sldIdLst
+    layouts = dict(zip((layout.part for layout in source.slide_layouts),
+                       (layout.part for layout in prs.slide_layouts)))
+    slide_count = len(sld_id_lst)
+    next_id = max([255] + [int(sld_id.id) for sld_id in sld_id_lst]) + 1
+    
+    for source_slide in source.slides:
+        slide_part = source_slide.part
+        slide_count += 1
+        slide_part.partname = PackURI('/ppt/slides/slide%d.xml' % slide_count)
+        slide_part._package = package
+        rels = slide_part.rels
+        for rel in sorted(rels.values(), key=lambda rel: int(rel.rId[3:])):
+            if rel.reltype == RT.SLIDE_LAYOUT:
+                target = layouts[rel.target_part]
+            elif rel.reltype == RT.IMAGE:
+                target = package.get_or_add_image_part(io.BytesIO(rel.target_part.blob))
+            else:
+                continue
+            # 关系对象会缓存目标部件，只能整个替换
+            rels._rels[rel.rId] = _Relationship(
+                rel._base_uri, rel.rId, rel.reltype, RTM.INTERNAL, target)
+        rels.__dict__.pop('_rels_by_reltype', None)
+        
+        rId = pres_rels._add_relationship(RT.SLIDE, slide_part)
+        sld_id_lst._add_sldId(id=next_id, rId=rId)
+        next_id += 1
+        slide = slide_part.slide
+    return slide
+
+# 排版逻辑变化时修改，使缓存的段落幻灯片失效
+RENDER_VERSION = '1'
+
+def snapshot_slides(prs, start, image_files=None):
+    """把prs中第start张之后的幻灯片序列化为 [(幻灯片XML, [(rId, 关系类型, 目标)])]
+
+    目标为版式序号、图片文件路径或图片字节：image_files为 {图片SHA-1: 文件路径}，
+    从文件添加的图片只记录路径（上传的图片即图片存储中的文件），不在缓存中保留图片内容。
+    幻灯片有版式和图片以外的关系时无法序列化，返回None。
+    """
+    layouts = {layout.part: i for i, layout in enumerate(prs.slide_layouts)}
+    image_files = image_files or {}
+    slides = []
+    for slide in list(prs.slides)[start:]:
+        rels = []
+        for rel in slide.part.rels.values():
+            if rel.reltype == RT.SLIDE_LAYOUT:
+                rels.append((rel.rId, rel.reltype, layouts[rel.target_part]))
+            elif rel.reltype == RT.IMAGE:
+                part = rel.target_part
+                rels.append((rel.rId, rel.reltype, image_files.get(part.sha1, part.blob)))
+            else:
+                return None
+        slides.append((slide.part.blob, rels))
+    return slides
+
+def restore_slides(prs, slides, image_parts=None):
+    """把snapshot_slides的结果追加到prs末尾，返回最后一张幻灯片
+
+    只解析幻灯片XML，不需要打开整个PPT。image_parts为 {图片路径或哈希: 图片部件}，
+    多次调用时传入同一个字典，相同的图片只查找一次。
+    """
+    slide = None
+    package = prs.part.package
+    pres_rels = prs.part.rels
+    sld_id_lst = prs.slides._sldIdLst
+    layouts = [layout.part for layout in prs.slide_layouts]
+    image_parts = {} if image_parts is None else image_parts
+    slide_count = len(sld_id_lst)
+    next_id = max([255] + [int(sld_id.id) for sld_id in sld_id_lst]) + 1
+    
+    for blob, rel_specs in slides:
+        slide_count += 1
+        slide_part = SlidePart.load(PackURI('/ppt/slides/slide%d.xml' % slide_count), CT.PML_SLIDE, package, blob)
+        rels = slide_part.rels
+        for rId, reltype, target in rel_specs:
+            if reltype == RT.SLIDE_LAYOUT:
+                target = layouts[target]
+            elif isinstance(target, str):
+                if target not in image_parts:
+                    image_parts[target] = package.get_or_add_image_part(target)
+                target = image_parts[target]
+            else:
+                digest = hashlib.sha1(target).digest()
+                if digest not in image_parts:
+                    image_parts[digest] = package.get_or_add_image_part(io.BytesIO(target))
+                target = image_parts[digest]
+            rels._rels[rId] = _Relationship(rels._base_uri, rId, reltype, RTM.INTERNAL, target)
+        
+        rId = pres_rels._add_relationship(RT.SLIDE, slide_part)
+        sld_id_lst._add_sldId(id=next_id, rId=rId)
+        next_id += 1
+        slide = slide_part.slide
+    return slide
+
+def snapshot_files(slides):
+    """snapshot_slides的结果中引用的图片文件路径"""
+    return [target for _, rels in slides for _, reltype, target in rels
+            if reltype == RT.IMAGE and isinstance(target, str)]
+
+def sections_size(sections):
+    """render_incremental返回的各段幻灯片占用的字节数（幻灯片XML和没有文件的图片）"""
+    size = 0
+    for slides, _ in sections.values():
+        for blob, rels in slides:
+            size += len(blob) + sum(len(target) for _, _, target in rels if isinstance(target, bytes))
+    return size
+
+def _render_elements(args):
+    """在工作进程中渲染一组元素事件，返回PPT字节和最后的排版状态"""
+    template, image_dir, image_root, elements = args
+    presentation = remove_all_slides(Presentation(io.BytesIO(template)))
+    converter = MarkdownToPPT(presentation=presentation)
+    converter.set_image_dir(image_dir)
+    if image_root:
+        converter.set_image_store(ImageStore(image_root))
+    for kind, payload in elements:
+        converter.add_element(kind, payload)
+    output = io.BytesIO()
+    converter.save(output)
+    return output.getvalue(), (converter.current_content_top, converter.content_start, converter.current_heading)
+
+_process_pools = {}
+
+def get_process_pool(workers):
+    """按进程数复用渲染进程池，避免每次转换都重新创建进程"""
+    pool = _process_pools.get(workers)
+    if pool is None:
+        pool = _process_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return pool
 
 class MarkdownToPPT:
-    def __init__(self, template_path=None):
-        """初始化转换器"""
-        if template_path:
-            # 如果提供了模板，先复制模板
-            self.prs = Presentation(template_path)
-            # 删除所有现有幻灯片
-            for _ in range(len(self.prs.slides)):
-                rId = self.prs.slides._sldIdLst[0].rId
-                self.prs.part.drop_rel(rId)
-                del self.prs.slides._sldIdLst[0]
+    def __init__(self, template_path=None, presentation=None, low_memory=False):
+        """初始化转换器
+
+        presentation: 已去除幻灯片的演示文稿（如模板缓存给出的副本），优先于template_path
+        low_memory: 低内存模式（见 low_memory 模块），图片保存时才从磁盘读取，完成的幻灯片
+        序列化后释放；不支持多进程并行渲染和增量渲染
+        """
+        if presentation is not None:
+            self.prs = presentation
+        elif template_path:
+            # 如果提供了模板，先复制模板，再删除所有现有幻灯片
+            self.prs = remove_all_slides(Presentation(template_path))
         else:
             self.prs = Presentation()
         self.current_slide = None
         self.image_dir = None
+        self.image_store = None
         self.current_content_top = Inches(2)  # 从2英寸开始，给标题留空间
+        self.content_start = self.current_content_top  # 当前页正文的起始位置，用于判断当前页是否还没有正文
+        self.current_heading = None  # 当前章节标题，续页标题为“标题（续）”
+        self.low_memory = low_memory
+        self.file_images = FileImages(self.prs.part.package) if low_memory else None
+        self.image_files = {}  # 从文件添加的图片 {SHA-1: 文件路径}，增量渲染的缓存只记录路径
 
     def set_image_dir(self, image_dir):
         """设置图片目录"""
         self.image_dir = image_dir
 
+    def set_image_store(self, image_store):
+        """设置上传图片索引，索引中的图片优先使用缩小后的版本"""
+        self.image_store = image_store
+
     def add_slide(self):
         """添加新幻灯片"""
+        # 低内存模式下释放已完成的上一页
+        if self.low_memory and self.current_slide is not None:
+            release_slide(self.prs, self.current_slide)
+        
         # 创建空白幻灯片
         blank_layout = self.prs.slide_layouts[6]  # 使用空白布局
         self.current_slide = self.prs.slides.add_slide(blank_layout)
         self.current_content_top = Inches(2)  # 从2英寸开始，给标题留空间
+        self.content_start = self.current_content_top
         return self.current_slide
 
-    def process_markdown(self, md_text):
-        """处理Markdown内容"""
-        # 配置Markdown解析器，启用表格和代码块扩展
-        md = markdown.Markdown(extensions=['tables', 'fenced_code'])
+    def content_bottom(self):
+        """正文区域的底部，底部留0.5英寸"""
+        return self.prs.slide_height - Inches(0.5)
+
+    def continue_slide(self):
+        """新建续页，有当前章节标题时添加“标题（续）”"""
+        self.add_slide()
+        if self.current_heading:
+            self.add_heading(f'{self.current_heading}（续）')
+
+    def ensure_space(self, height):
+        """当前页剩余空间放不下height高的内容时换到续页；当前页还没有正文时不换页"""
+        if (self.current_content_top + height > self.content_bottom()
+                and self.current_content_top > self.content_start):
+            self.continue_slide()
+
+    def add_text_block(self, text, left, width, font_size, font_name=None,
+                       min_height=Inches(0.5), spacing=0):
+        """按估算的折行高度添加文本框，当前页放不下时整段移到续页，一页放不下时按行拆分到多页
+
+        font_size为磅值，min_height为文本框最小高度，spacing为文本框之后的额外间距。
+        """
+        size = Pt(font_size)
+        lines = wrap_lines(text, size, width, font_name in MONOSPACE_FONTS)
+        while lines:
+            available = self.content_bottom() - self.current_content_top
+            fit = lines_fitting(available, size)
+            if fit < len(lines) and self.current_content_top > self.content_start:
+                self.continue_slide()
+                continue
+            chunk, lines = lines[:max(fit, 1)], lines[max(fit, 1):]
+            height = max(min_height, text_height(len(chunk), size))
+            
+            textbox = self.current_slide.shapes.add_textbox(left, self.current_content_top, width, height)
+            textbox.text_frame.word_wrap = True
+            textbox.text_frame.text = ''.join(chunk).rstrip('\n')
+            for paragraph in textbox.text_frame.paragraphs:
+                paragraph.font.size = size
+                if font_name:
+                    paragraph.font.name = font_name
+            self.current_content_top += height + spacing
+            
+            if lines:
+                self.continue_slide()
+
+    def process_markdown(self, md_text, workers=1, progress=None):
+        """处理Markdown内容
+
+        优先使用单遍流式解析器；遇到流式解析器无法保证结果一致的写法时，
+        整篇回退到 markdown → HTML → BeautifulSoup 的解析路径。
+        workers大于1时在一级、二级标题处切分，由多个进程并行渲染后按顺序拼接，
+        结果与串行渲染相同。
+        progress不为空时，串行渲染每完成一段调用 progress(已完成段数, 总段数, 幻灯片数)。
+        """
+        self.render_ir(parse_document(md_text), workers, progress)
+
+    def render_ir(self, deck, workers=1, progress=None):
+        """渲染已解析的 Deck（见 slide_ir），参数同 process_markdown"""
+        sections = deck.sections()
+        if not sections:
+            return
+        if workers > 1 and len(sections) > 1 and not self.low_memory:
+            with STAGE_SECONDS.time('render_parallel'):
+                self.render_parallel(sections, workers)
+            if progress:
+                progress(len(sections), len(sections), len(self.prs.slides))
+            return
         
-        # 转换为HTML
-        html = md.convert(md_text)
+        with STAGE_SECONDS.time('render'):
+            for i, section in enumerate(sections):
+                for kind, payload in section:
+                    self.add_element(kind, payload)
+                if progress:
+                    progress(i + 1, len(sections), len(self.prs.slides))
+
+    def render_incremental(self, deck, cache=None, key=''):
+        """按段渲染Deck，内容没有变化的段直接复用上次渲染得到的幻灯片
+
+        cache为上次调用返回的 {段哈希: 段的幻灯片}；段哈希包含key（如模板ID），
+        模板变化时不会复用。返回 (本次的 {段哈希: 段的幻灯片}, 复用的段数)，
+        结果与 render_ir 相同。
+        """
+        if self.low_memory:
+            raise ValueError('低内存模式不支持增量渲染')
+        cache = cache or {}
+        entries = {}
+        reused = 0
+        image_parts = {}
+        with STAGE_SECONDS.time('render_incremental'):
+            for section in deck.sections():
+                digest = self.section_hash(section, key)
+                entry = cache.get(digest)
+                # 没有标题的段会接着当前幻灯片排版，只有在最前面时才能复用
+                # 引用的图片文件已被清理时重新渲染
+                if entry is not None and (section[0][0] in (H1, H2) or self.current_slide is None) \
+                        and all(os.path.exists(path) for path in snapshot_files(entry[0])):
+                    slides, state = entry
+                    self.current_slide = restore_slides(self.prs, slides, image_parts) or self.current_slide
+                    self.current_content_top, self.content_start, self.current_heading = state
+                    reused += 1
+                else:
+                    start = len(self.prs.slides)
+                    for kind, payload in section:
+                        self.add_element(kind, payload)
+                    slides = snapshot_slides(self.prs, start, self.image_files)
+                    if slides is None:
+                        continue
+                    entry = (slides, (self.current_content_top, self.content_start, self.current_heading))
+                entries[digest] = entry
+        return entries, reused
+
+    def section_hash(self, section, key=''):
+        """段内容哈希，已上传的图片按图片内容计算"""
+        digest = hashlib.sha256(f'{RENDER_VERSION}\0{key}\0'.encode('utf-8'))
+        for kind, payload in section:
+            if kind == IMAGE and self.image_store:
+                payload = [payload, self.image_store.lookup(payload)]
+            digest.update(json.dumps([kind, payload], ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def render_parallel(self, sections, workers):
+        """把各段分批交给进程池渲染，再按顺序把幻灯片拼接到当前演示文稿"""
+        # 第一段没有标题时会接着当前幻灯片继续排版，只能在本进程渲染
+        if sections[0][0][0] not in (H1, H2) and self.current_slide is not None:
+            for kind, payload in sections[0]:
+                self.add_element(kind, payload)
+            sections = sections[1:]
+            if not sections:
+                return
         
-        # 使用BeautifulSoup解析HTML
-        soup = BeautifulSoup(html, 'html.parser')
+        template = io.BytesIO()
+        self.prs.save(template)
+        template = template.getvalue()
         
-        # 处理每个元素
-        current_slide = None
-        for element in soup.find_all(['h1', 'h2', 'h3', 'p', 'img', 'table', 'pre', 'code', 'ul', 'li']):
-            # 处理标题
-            if element.name == 'h1':
-                # 一级标题创建首页
-                self.add_slide()
-                self.add_title(element.get_text())
-                self.current_content_top = Inches(2)  # 重置内容位置
-            elif element.name == 'h2':
-                # 二级标题创建新页
-                self.add_slide()
-                self.add_heading(element.get_text())
-                self.current_content_top = Inches(1.5)  # 重置内容位置
-            elif element.name == 'h3':
-                # 三级标题作为子标题
-                self.add_subheading(element.get_text())
-            # 处理图片
-            elif element.name == 'img':
-                src = element.get('src')
-                if src:
-                    self.add_image(src)
-            # 处理表格
-            elif element.name == 'table':
-                self.add_table(element)
-            # 处理代码块
-            elif element.name in ['pre', 'code']:
-                self.add_code_block(element.get_text())
-            # 处理列表项
-            elif element.name == 'li':
-                self.add_list_item(element.get_text())
-            # 处理普通段落
-            elif element.name == 'p' and not element.find_parent(['pre', 'code']):
-                self.add_paragraph(element.get_text())
+        # 每个进程处理若干连续的段，减少每批打开和保存PPT的开销
+        batch_count = min(len(sections), workers * 4)
+        batch_size = -(-len(sections) // batch_count)
+        batches = []
+        image_root = self.image_store.root if self.image_store else None
+        for i in range(0, len(sections), batch_size):
+            elements = [element for section in sections[i:i + batch_size] for element in section]
+            batches.append((template, self.image_dir, image_root, elements))
+        
+        for data, state in get_process_pool(workers).map(_render_elements, batches):
+            slide = append_slides(self.prs, Presentation(io.BytesIO(data)))
+            if slide is not None:
+                self.current_slide = slide
+                self.current_content_top, self.content_start, self.current_heading = state
+
+    def process_markdown_html(self, md_text):
+        """通过HTML解析路径处理Markdown内容，作为流式解析器的参照实现"""
+        for kind, payload in iter_html_elements(md_text):
+            self.add_element(kind, payload)
+
+    def add_element(self, kind, payload):
+        """根据元素事件调用对应的add_*方法，耗时按元素类型记录"""
+        with ELEMENT_SECONDS.time(kind):
+            self._add_element(kind, payload)
+
+    def _add_element(self, kind, payload):
+        # 处理标题
+        if kind == H1:
+            # 一级标题创建首页
+            self.add_slide()
+            self.current_heading = payload
+            self.add_title(payload)
+            self.current_content_top = Inches(2)  # 重置内容位置
+        elif kind == H2:
+            # 二级标题创建新页
+            self.add_slide()
+            self.current_heading = payload
+            self.add_heading(payload)
+        elif kind == H3:
+            # 三级标题作为子标题
+            self.add_subheading(payload)
+        # 处理图片
+        elif kind == IMAGE:
+            self.add_image(payload)
+        # 处理表格
+        elif kind == TABLE:
+            self.add_table(payload)
+        # 处理代码块
+        elif kind == CODE:
+            self.add_code_block(payload)
+        # 处理列表项
+        elif kind == LIST_ITEM:
+            self.add_list_item(payload)
+        # 处理普通段落
+        elif kind == PARAGRAPH:
+            self.add_paragraph(payload)
 
     def add_title(self, text):
         """添加首页标题"""
@@ -120,13 +508,16 @@ class MarkdownToPPT:
         left = Inches(0.5)
         top = Inches(0.5)
         width = self.prs.slide_width - Inches(1)
-        height = Inches(0.75)
+        # 标题折成多行时正文相应下移
+        lines = wrap_lines(text, Pt(32), width)
+        height = max(Inches(0.75), text_height(len(lines), Pt(32)))
         
         title = self.current_slide.shapes.add_textbox(left, top, width, height)
+        title.text_frame.word_wrap = True
         title.text_frame.text = text
         paragraph = title.text_frame.paragraphs[0]
         paragraph.font.size = Pt(32)
-        self.current_content_top = Inches(1.5)
+        self.current_content_top = self.content_start = top + height + Inches(0.25)
 
     def add_subheading(self, text):
         """添加子标题"""
@@ -135,13 +526,7 @@ class MarkdownToPPT:
         
         left = Inches(0.5)
         width = self.prs.slide_width - Inches(1)
-        height = Inches(0.5)
-        
-        title = self.current_slide.shapes.add_textbox(left, self.current_content_top, width, height)
-        title.text_frame.text = text
-        paragraph = title.text_frame.paragraphs[0]
-        paragraph.font.size = Pt(24)
-        self.current_content_top += Inches(0.75)
+        self.add_text_block(text, left, width, 24, spacing=Inches(0.25))
 
     def add_paragraph(self, text):
         """添加段落"""
@@ -150,13 +535,7 @@ class MarkdownToPPT:
         
         left = Inches(0.5)
         width = self.prs.slide_width - Inches(1)
-        height = Inches(0.5)
-        
-        textbox = self.current_slide.shapes.add_textbox(left, self.current_content_top, width, height)
-        textbox.text_frame.text = text
-        paragraph = textbox.text_frame.paragraphs[0]
-        paragraph.font.size = Pt(18)
-        self.current_content_top += Inches(0.5)
+        self.add_text_block(text, left, width, 18)
 
     def add_list_item(self, text):
         """添加列表项"""
@@ -165,138 +544,176 @@ class MarkdownToPPT:
         
         left = Inches(1.0)  # 缩进
         width = self.prs.slide_width - Inches(1.5)
-        height = Inches(0.5)
-        
-        textbox = self.current_slide.shapes.add_textbox(left, self.current_content_top, width, height)
-        textbox.text_frame.text = f"• {text}"
-        paragraph = textbox.text_frame.paragraphs[0]
-        paragraph.font.size = Pt(18)
-        self.current_content_top += Inches(0.5)
+        self.add_text_block(f"• {text}", left, width, 18)
 
     def add_image(self, image_path):
         """添加图片"""
         if not self.current_slide:
             self.add_slide()
         
-        print(f"\nDebug: Processing image: {image_path}")
+        logger.debug('Processing image: %s', image_path)
         
-        # 处理图片路径
-        original_path = image_path
-        if self.image_dir:
-            image_path = os.path.join(self.image_dir, os.path.basename(image_path))
-            print(f"Debug: Using image dir path: {image_path}")
-        else:
-            # 如果未指定图片目录，尝试在当前目录和images目录下查找
-            possible_paths = [
-                original_path,
-                os.path.join('images', os.path.basename(original_path)),
-                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images', os.path.basename(original_path))
-            ]
-            
-            print("Debug: Trying possible paths:")
-            for path in possible_paths:
-                print(f"Debug: Checking path: {path}")
-                if os.path.exists(path):
-                    image_path = path
-                    print(f"Debug: Found image at: {image_path}")
-                    break
+        # 已上传的图片直接从索引取缩小后的图片和尺寸
+        indexed = self.image_store.lookup(image_path) if self.image_store else None
+        if indexed is not None:
+            image_path, img_width, img_height = indexed
+            logger.debug('Using indexed image: %s', image_path)
+            self.add_picture(image_path, img_width, img_height)
+            return
+        
+        image_path = find_image(image_path, self.image_dir)
+        logger.debug('Using image path: %s', image_path)
         
         if os.path.exists(image_path):
             try:
-                print(f"Debug: Opening image file: {image_path}")
-                # 获取幻灯片尺寸（转换为英寸）
-                slide_width = Inches(10)  # 标准PPT宽度约为10英寸
-                slide_height = Inches(7.5)  # 标准PPT高度约为7.5英寸
-                
                 # 计算图片尺寸
-                img = Image.open(image_path)
-                img_width, img_height = img.size
-                aspect_ratio = img_width / img_height
-                print(f"Debug: Original image dimensions: {img_width} x {img_height}")
-                
-                # 设置图片最大尺寸（英寸）
-                max_width = Inches(8)  # 最大宽度8英寸
-                max_height = Inches(5)  # 最大高度5英寸
-                
-                # 计算最终尺寸（保持纵横比）
-                if aspect_ratio > max_width/max_height:  # 宽图
-                    width = max_width
-                    height = width / aspect_ratio
-                else:  # 高图
-                    height = max_height
-                    width = height * aspect_ratio
-                
-                print(f"Debug: Final dimensions in inches: {width/Inches(1)} x {height/Inches(1)}")
-                
-                # 计算居中位置
-                left = (slide_width - width) / 2
-                top = self.current_content_top
-                print(f"Debug: Image position in inches: left={left/Inches(1)}, top={top/Inches(1)}")
-                
-                # 添加图片
-                try:
-                    shape = self.current_slide.shapes.add_picture(
-                        image_path,
-                        left, top,
-                        width=width,
-                        height=height
-                    )
-                    print(f"Debug: Successfully added image shape: {shape}")
-                    # 更新下一个内容的位置
-                    self.current_content_top += height + Inches(0.5)
-                except Exception as e:
-                    print(f"Error adding picture to slide: {str(e)}")
-                    import traceback
-                    print(traceback.format_exc())
-            except Exception as e:
-                print(f"Error processing image: {str(e)}")
-                import traceback
-                print(traceback.format_exc())
+                from PIL import Image
+                with STAGE_SECONDS.time('image_open'):
+                    with Image.open(image_path) as img:
+                        img_width, img_height = img.size
+                logger.debug('Original image dimensions: %d x %d', img_width, img_height)
+                self.add_picture(image_path, img_width, img_height)
+            except Exception:
+                logger.exception('Error processing image: %s', image_path)
         else:
-            print(f"Error: Image file not found: {image_path}")
-            print(f"Current working directory: {os.getcwd()}")
-            print(f"Image dir setting: {self.image_dir}")
-            print(f"Absolute path attempted: {os.path.abspath(image_path)}")
+            logger.warning('Image file not found: %s (image dir: %s, absolute path: %s)',
+                           image_path, self.image_dir, os.path.abspath(image_path))
 
-    def add_table(self, table_element):
-        """添加表格"""
+    def add_picture(self, image_path, img_width, img_height):
+        """按像素尺寸等比缩放后把图片居中放到当前位置"""
+        # 获取幻灯片尺寸（转换为英寸）
+        slide_width = Inches(10)  # 标准PPT宽度约为10英寸
+        slide_height = Inches(7.5)  # 标准PPT高度约为7.5英寸
+        
+        aspect_ratio = img_width / img_height
+        
+        # 设置图片最大尺寸（英寸）
+        max_width = Inches(8)  # 最大宽度8英寸
+        max_height = Inches(5)  # 最大高度5英寸
+        
+        # 计算最终尺寸（保持纵横比）
+        if aspect_ratio > max_width/max_height:  # 宽图
+            width = max_width
+            height = width / aspect_ratio
+        else:  # 高图
+            height = max_height
+            width = height * aspect_ratio
+        
+        logger.debug('Final dimensions in inches: %.2f x %.2f', width / Inches(1), height / Inches(1))
+        
+        # 当前页放不下时移到续页
+        self.ensure_space(height)
+        
+        # 计算居中位置
+        left = (slide_width - width) / 2
+        top = self.current_content_top
+        logger.debug('Image position in inches: left=%.2f, top=%.2f', left / Inches(1), top / Inches(1))
+        
+        # 添加图片，低内存模式下只记录图片路径，保存时才读取
+        try:
+            picture = None
+            if self.file_images is not None:
+                picture = self.file_images.add_picture(self.current_slide, image_path, int(left), top,
+                                                       int(width), int(height))
+            if picture is None:
+                picture = self.current_slide.shapes.add_picture(
+                    image_path,
+                    left, top,
+                    width=width,
+                    height=height
+                )
+                image_part = self.current_slide.part.related_part(picture._element.blip_rId)
+                self.image_files[image_part.sha1] = os.path.abspath(image_path)
+            # 更新下一个内容的位置
+            self.current_content_top += height + Inches(0.5)
+        except Exception:
+            logger.exception('Error adding picture to slide: %s', image_path)
+
+    def add_table(self, rows):
+        """添加表格，rows为单元格文本的行列表（第一行为表头），也兼容BeautifulSoup表格元素
+
+        行高按单元格文本折行估算（至少0.5英寸）。当前页放不下时整张表移到续页，
+        一页放不下的表格按行拆分到多页，每页重复表头。
+        """
         if not self.current_slide:
             self.add_slide()
         
         # 获取表格数据
-        rows = []
-        for tr in table_element.find_all('tr'):
-            row = [td.get_text().strip() for td in tr.find_all(['td', 'th'])]
-            rows.append(row)
+        if hasattr(rows, 'find_all'):
+            rows = table_rows(rows)
         
-        if not rows:
+        # 各行补齐到最长行的列数
+        rows, cols_count = normalize_rows(rows)
+        if not cols_count:
             return
         
-        # 创建表格
-        rows_count = len(rows)
-        cols_count = len(rows[0])
-        
         # 计算表格位置和大小
         left = Inches(0.5)
         width = self.prs.slide_width - Inches(1)
-        height = Inches(0.5 * rows_count)
+        column_width = width // cols_count
+        heights = [
+            max([Inches(0.5)] + [text_height(line_count(text, Pt(14), column_width), Pt(14)) for text in row])
+            for row in rows
+        ]
+        header, header_height = rows[0], heights[0]
+        body = list(zip(rows[1:], heights[1:]))
+        
+        while True:
+            available = self.content_bottom() - self.current_content_top - header_height
+            total = header_height + sum(height for _, height in body)
+            if total > self.content_bottom() - self.current_content_top and self.current_content_top > self.content_start:
+                self.continue_slide()
+                continue
+            
+            # 放得下的行数，至少放一行
+            count, used = 0, 0
+            for _, height in body:
+                if used + height > available and count:
+                    break
+                used += height
+                count += 1
+            chunk, body = body[:count], body[count:]
+            self._add_table_shape([(header, header_height)] + chunk, left, width)
+            if not body:
+                break
+            self.continue_slide()
+
+    def _add_table_shape(self, rows, left, width):
+        """在当前位置添加表格形状，rows为 (单元格文本列表, 行高) 的列表
+
+        先添加只有一行的空表格，再把整张表格的XML一次性替换进去，不逐个单元格设置。
+        """
+        height = sum(row_height for _, row_height in rows)
+        cols_count = len(rows[0][0])
         
         # 添加表格
-        table = self.current_slide.shapes.add_table(
-            rows_count, cols_count,
+        frame = self.current_slide.shapes.add_table(
+            1, cols_count,
             left, self.current_content_top,
             width, height
-        ).table
+        )
         
-        # 填充数据
-        for i, row in enumerate(rows):
-            for j, cell_text in enumerate(row):
-                cell = table.cell(i, j)
-                cell.text = cell_text
-                cell.text_frame.paragraphs[0].font.size = Pt(14)
+        # 列宽与python-pptx相同：平均分配，余数给最后一列
+        column_widths = [width // cols_count] * cols_count
+        column_widths[-1] += width - sum(column_widths)
+        tbl = table_xml([row for row, _ in rows], column_widths,
+                        [row_height for _, row_height in rows], Pt(14))
+        graphic_data = frame._element.graphic.graphicData
+        graphic_data.replace(graphic_data.find(qn('a:tbl')), tbl)
         
         self.current_content_top += height + Inches(0.5)
 
+    def add_dataframe(self, df, title=None):
+        """把DataFrame直接添加为原生表格
+
+        title不为空时先新建一页并添加标题，放不下的行分到续页，续页标题为“标题（续）”。
+        """
+        if title:
+            self.add_slide()
+            self.current_heading = title
+            self.add_heading(title)
+        self.add_table([[str(column) for column in df.columns]] + df.astype(str).values.tolist())
+
     def add_code_block(self, code):
         """添加代码块"""
         if not self.current_slide:
@@ -304,18 +721,16 @@ class MarkdownToPPT:
         
         left = Inches(0.5)
         width = self.prs.slide_width - Inches(1)
-        height = Inches(2)
-        
-        textbox = self.current_slide.shapes.add_textbox(left, self.current_content_top, width, height)
-        textbox.text_frame.text = code
-        paragraph = textbox.text_frame.paragraphs[0]
-        paragraph.font.name = 'Courier New'
-        paragraph.font.size = Pt(14)
-        self.current_content_top += Inches(2.5)
+        self.add_text_block(code, left, width, 14, font_name='Courier New', spacing=Inches(0.5))
+
+    def save(self, output):
+        """保存PPT，output可以是文件路径或可写的文件对象"""
+        with STAGE_SECONDS.time('save'):
+            self.prs.save(output)
 
-    def save(self, output_path):
-        """保存PPT文件"""
-        self.prs.save(output_path)
+    def stream(self, chunk_size=64 * 1024):
+        """边保存边返回PPT数据块的生成器，可以直接作为响应体"""
+        return stream_save(self.save, chunk_size)
 
 def main():
     parser = argparse.ArgumentParser(description='Convert Markdown to PowerPoint')
@@ -323,20 +738,27 @@ def main():
     parser.add_argument('output_file', help='Output PowerPoint file')
     parser.add_argument('--template', help='PowerPoint template file')
     parser.add_argument('--image-dir', help='Directory containing images')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes used to render slides (default: 1)')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='Release finished slides and read images from disk at save time (ignores --workers)')
+    parser.add_argument('--verbose', action='store_true', help='Print debug logs')
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(levelname)s %(name)s: %(message)s')
     
     # 读取Markdown文件
     with open(args.input_file, 'r', encoding='utf-8') as f:
         md_content = f.read()
     
     # 创建转换器实例
-    converter = MarkdownToPPT(args.template)
+    converter = MarkdownToPPT(args.template, low_memory=args.low_memory)
     if args.image_dir:
         converter.set_image_dir(args.image_dir)
     
     # 处理Markdown内容
-    converter.process_markdown(md_content)
+    converter.process_markdown(md_content, workers=args.workers)
     
     # 保存PPT
     converter.save(args.output_file)
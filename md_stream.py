@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单遍流式Markdown解析
+
+按块读取一次Markdown，按文档顺序直接产出幻灯片元素事件，替代原来
+markdown → HTML → BeautifulSoup → find_all 的两遍解析。
+
+事件是 (kind, payload) 元组：
+    ('h1' / 'h2' / 'h3', 标题文本)
+    ('p', 段落文本)
+    ('li', 列表项文本)
+    ('code', 代码块文本)
+    ('img', 图片地址)
+    ('table', 行列表，每行是单元格文本列表，第一行为表头)
+
+块和行内语法的识别规则与 Python-Markdown（tables、fenced_code 扩展）保持一致，
+得到的文本与 BeautifulSoup 的 get_text() 相同，事件与HTML解析路径（find_all）一致：
+代码块的 <pre> 和其中的 <code> 各产出一次，行内代码在所在元素之后单独产出代码事件。
+遇到无法保证结果一致的写法（嵌套列表、松散列表、引用式链接、非<p>的原始HTML块等）时抛出
+UnsupportedMarkdown，由调用方整体回退到HTML解析路径。
+"""
+
+import html
+import re
+from collections import deque
+
+H1 = 'h1'
+H2 = 'h2'
+H3 = 'h3'
+PARAGRAPH = 'p'
+LIST_ITEM = 'li'
+CODE = 'code'
+IMAGE = 'img'
+TABLE = 'table'
+
+HEADINGS = (H1, H2, H3)
+
+
+class UnsupportedMarkdown(ValueError):
+    """流式解析器无法保证与HTML解析路径结果一致的Markdown写法"""
+
+
+TAB_LENGTH = 4
+
+# 与 Python-Markdown 相同的块级HTML标签
+BLOCK_LEVEL_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'details', 'div', 'dl',
+    'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'header', 'hgroup', 'hr', 'main', 'menu', 'nav', 'ol',
+    'p', 'pre', 'section', 'table', 'ul', 'canvas', 'colgroup', 'dd', 'body',
+    'dt', 'group', 'html', 'iframe', 'li', 'legend', 'math', 'map', 'noscript',
+    'output', 'object', 'option', 'progress', 'script', 'style', 'summary',
+    'tbody', 'td', 'textarea', 'tfoot', 'th', 'thead', 'tr', 'video',
+}
+
+# 行内HTML中只去掉标签、保留文字的标签
+INLINE_TEXT_TAGS = {
+    'a', 'b', 'strong', 'i', 'em', 'u', 's', 'del', 'ins', 'mark', 'small',
+    'span', 'sub', 'sup', 'font', 'kbd', 'br',
+}
+
+STX = '\u0002'
+ETX = '\u0003'
+# 行内元素（标签）边界，BeautifulSoup 按标签把文字切成多个文本节点
+SEP = '\u0001'
+# 行内代码和图片在文字中的位置标记，用于按文档顺序输出它们的事件
+MARK = '\u0004'
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# 块级规则，正则与 Python-Markdown 对应处理器一致
+FENCED_BLOCK_RE = re.compile(
+    r'(?P<fence>^(?:~{3,}|`{3,}))[ ]*'
+    r'((\{(?P<attrs>[^\n]*)\})|'
+    r'(\.?(?P<lang>[\w#.+-]*)[ ]*)?'
+    r'(hl_lines=(?P<quot>"|\')(?P<hl_lines>.*?)(?P=quot)[ ]*)?)'
+    r'\n'
+    r'(?P<code>.*?)(?<=\n)'
+    r'(?P=fence)[ ]*$',
+    re.MULTILINE | re.DOTALL
+)
+HTML_LINE_START_RE = re.compile(r'^[ ]{0,3}<(/?)([a-zA-Z][a-zA-Z0-9]*)', re.MULTILINE)
+RAW_P_RE = re.compile(r'<p>(.*?)</p>', re.DOTALL)
+PLACEHOLDER_RE = re.compile(STX + r'(\d+)' + ETX)
+HASH_HEADER_RE = re.compile(r'(?:^|\n)(?P<level>#{1,6})(?P<header>(?:\\.|[^\\])*?)#*(?:\n|$)')
+SETEXT_HEADER_RE = re.compile(r'^.*?\n[=-]+[ ]*(\n|$)', re.MULTILINE)
+HR_RE = re.compile(
+    r'^[ ]{0,3}(?=(?P<atomicgroup>(-+[ ]{0,2}){3,}|(_+[ ]{0,2}){3,}|(\*+[ ]{0,2}){3,}))'
+    r'(?P=atomicgroup)[ ]*$',
+    re.MULTILINE
+)
+OLIST_RE = re.compile(r'^[ ]{0,3}\d+\.[ ]+(.*)')
+ULIST_RE = re.compile(r'^[ ]{0,3}[*+-][ ]+(.*)')
+LIST_CHILD_RE = re.compile(r'^[ ]{0,3}((\d+\.)|[*+-])[ ]+(.*)')
+LIST_INDENT_RE = re.compile(r'^[ ]{4,7}((\d+\.)|[*+-])[ ]+.*')
+QUOTE_RE = re.compile(r'(^|\n)[ ]{0,3}>[ ]?(.*)')
+REFERENCE_RE = re.compile(r'^[ ]{0,3}\[([^\[\]]*)\]:', re.MULTILINE)
+TABLE_END_BORDER_RE = re.compile(r'(?<!\\)(?:\\\\)*\|$')
+TABLE_PIPES_RE = re.compile(r'(\\\\)|(\\\|)|(\|)')
+
+# 行内规则
+MARK_RE = re.compile(MARK + r'(\d+)' + MARK)
+# 反斜杠转义，与 Python-Markdown（含 tables 扩展）的 ESCAPED_CHARS 一致
+ESCAPE_RE = re.compile(r'\\(.)')
+ESCAPED_CHARS = set('\\`*_{}[]()>#+-.!|')
+BACKTICK_RE = re.compile(r'(?:(?<!\\)((?:\\{2})+)(?=`+)|(?<!\\)(`+)(.+?)(?<!`)\2(?!`))', re.DOTALL)
+IMAGE_LINK_RE = re.compile(r'!\[([^\[\]]*)\]\(([^()\s<>"&]*)(?:[ ]+"[^"]*")?\)')
+LINK_RE = re.compile(r'(?<!!)\[([^\[\]]*)\]\(([^()\s]*)(?:[ ]+"[^"]*")?\)')
+AUTOLINK_RE = re.compile(r'<((?:[Ff]|[Hh][Tt])[Tt][Pp][Ss]?://[^<>]*)>')
+HTML_TAG_RE = re.compile(r'(<(\/?[a-zA-Z][^<>@ ]*( [^<>]*)?|!--(?:(?!<!--|-->).)*--)>)', re.DOTALL)
+ENTITY_RE = re.compile(r'(&(?:\#[0-9]+|\#x[0-9a-fA-F]+|[a-zA-Z0-9]+);)')
+STRONG_RE = re.compile(r'\*\*(?![\s*])([^*]+?)(?<![\s*])\*\*')
+EMPHASIS_RE = re.compile(r'\*(?![\s*])([^*]+?)(?<![\s*])\*')
+SMART_STRONG_RE = re.compile(r'(?<!\w)__(?![\s_])([^_*]+?)(?<![\s_])__(?!\w)')
+SMART_EMPHASIS_RE = re.compile(r'(?<!\w)_(?![\s_])([^_*]+?)(?<![\s_])_(?!\w)')
+INTRAWORD_UNDERSCORE_RE = re.compile(r'(?<=\w)_+(?=\w)')
+
+
+def _normalize(md_text):
+    """与 Python-Markdown 的 NormalizeWhitespace 预处理一致"""
+    source = md_text.replace(STX, '').replace(ETX, '')
+    source = source.replace('\r\n', '\n').replace('\r', '\n') + '\n\n'
+    source = source.expandtabs(TAB_LENGTH)
+    return re.sub(r'(?<=\n) +\n', '\n', source)
+
+
+def _collapse(text):
+    """按 BeautifulSoup 的规则，把只含空白的文本节点压缩成一个空格或换行"""
+    nodes = []
+    for node in text.split(SEP):
+        if node and not node.strip(ASCII_SPACES):
+            node = '\n' if '\n' in node else ' '
+        nodes.append(node)
+    return ''.join(nodes)
+
+
+def _inline_nodes(text, events):
+    """处理行内语法，返回用SEP分隔文本节点的文字
+
+    行内代码和图片的事件追加到events，文字中在它们的位置留下MARK标记。
+    """
+    stash = []
+
+    def store(value):
+        stash.append(value)
+        return '%s%d%s' % (STX, len(stash) - 1, ETX)
+
+    def mark(event):
+        events.append(event)
+        return '%s%d%s' % (MARK, len(events) - 1, MARK)
+
+    def code_span(m):
+        if m.group(1):
+            raise UnsupportedMarkdown('escaped backslashes before code span')
+        code = m.group(3).strip()
+        return store(SEP + mark((CODE, _collapse(code))) + code + SEP)
+
+    text = BACKTICK_RE.sub(code_span, text)
+
+    # 可转义的字符换成占位符，不再参与后面的规则；其他字符前的反斜杠原样保留
+    def escape(m):
+        return store(m.group(1)) if m.group(1) in ESCAPED_CHARS else m.group(0)
+
+    text = ESCAPE_RE.sub(escape, text)
+
+    def image(m):
+        if STX in m.group(2):
+            raise UnsupportedMarkdown('escape inside image url')
+        if m.group(2):
+            return store(SEP + mark((IMAGE, m.group(2))))
+        return store(SEP)
+
+    def link(m):
+        return store(SEP + _inline_nodes(m.group(1), events) + SEP)
+
+    text = IMAGE_LINK_RE.sub(image, text)
+    text = LINK_RE.sub(link, text)
+    if '[' in text or ']' in text:
+        raise UnsupportedMarkdown('reference link or unbalanced brackets')
+
+    text = AUTOLINK_RE.sub(lambda m: store(SEP + m.group(1) + SEP), text)
+
+    def html_tag(m):
+        tag = m.group(2).lstrip('/').split('/')[0].lower() if m.group(2) else ''
+        if tag not in INLINE_TEXT_TAGS:
+            raise UnsupportedMarkdown('inline html <%s>' % (tag or '!--'))
+        return store(SEP)
+
+    text = HTML_TAG_RE.sub(html_tag, text)
+    text = ENTITY_RE.sub(lambda m: store(html.unescape(m.group(1))), text)
+    text = text.replace('  \n', SEP + '\n')
+
+    for pattern in (STRONG_RE, SMART_STRONG_RE, EMPHASIS_RE, SMART_EMPHASIS_RE):
+        text = pattern.sub(SEP + r'\1' + SEP, text)
+    if '*' in text or ('_' in text and '_' in INTRAWORD_UNDERSCORE_RE.sub('', text)):
+        raise UnsupportedMarkdown('ambiguous emphasis')
+
+    # 占位符里可能还有占位符（如强调中的代码），反复替换直到没有
+    while STX in text:
+        text = PLACEHOLDER_RE.sub(lambda m: stash[int(m.group(1))], text)
+    return text
+
+
+def _inline(text):
+    """处理行内语法，返回 (get_text()得到的纯文本, 文中行内代码和图片按文档顺序的事件)"""
+    events = []
+    text = _inline_nodes(text, events)
+    ordered = [events[int(i)] for i in MARK_RE.findall(text)]
+    return _collapse(MARK_RE.sub('', text)), ordered
+
+
+class _Context:
+    """记录解析过程中同一父元素下的上一个兄弟块，部分规则依赖它"""
+
+    def __init__(self):
+        self.last = None
+        self.pending_code = None
+
+
+class _BlockParser:
+    def __init__(self, stash):
+        self.stash = stash
+
+    def parse_document(self, text):
+        context = _Context()
+        yield from self.parse_blocks(context, text.split('\n\n'))
+        yield from self._flush(context)
+
+    def _flush(self, context):
+        """输出缓存的缩进代码块，末尾空行与 Python-Markdown 一样只保留一个换行"""
+        if context.pending_code is not None:
+            code = context.pending_code
+            context.pending_code = None
+            yield from _code_block_events(code.rstrip() + '\n')
+
+    def _emit_inline(self, kind, text):
+        """输出带行内语法的元素，文中的行内代码和图片按文档顺序跟在元素后面"""
+        value, events = _inline(text)
+        if kind is not None:
+            yield (kind, value)
+        yield from events
+
+    def parse_blocks(self, context, blocks):
+        blocks = deque(blocks)
+        while blocks:
+            block = blocks.popleft()
+
+            # 空块：缩进代码块后的空块会补回换行
+            if not block or block.startswith('\n'):
+                filler = '\n'
+                if block:
+                    rest = block[1:]
+                    if rest:
+                        blocks.appendleft(rest)
+                else:
+                    filler = '\n\n'
+                if context.last == CODE and context.pending_code is not None:
+                    context.pending_code += filler
+                continue
+
+            indent = ' ' * TAB_LENGTH
+            if block.startswith(indent):
+                if context.last == 'list':
+                    raise UnsupportedMarkdown('indented list continuation')
+                yield from self._code_block(context, blocks, block)
+                continue
+
+            if self._is_table(block):
+                yield from self._flush(context)
+                yield from self._table(block)
+                context.last = TABLE
+                continue
+
+            m = HASH_HEADER_RE.search(block)
+            if m:
+                before = block[:m.start()]
+                after = block[m.end():]
+                if before:
+                    yield from self.parse_blocks(context, [before])
+                yield from self._flush(context)
+                level = 'h%d' % len(m.group('level'))
+                kind = level if level in HEADINGS else None
+                yield from self._emit_inline(kind, m.group('header').strip())
+                context.last = 'h'
+                if after:
+                    blocks.appendleft(after)
+                continue
+
+            m = SETEXT_HEADER_RE.match(block)
+            if m:
+                lines = block.split('\n')
+                kind = H1 if lines[1].startswith('=') else H2
+                yield from self._flush(context)
+                yield from self._emit_inline(kind, lines[0].strip())
+                context.last = 'h'
+                if len(lines) > 2:
+                    blocks.appendleft('\n'.join(lines[2:]))
+                continue
+
+            m = HR_RE.search(block)
+            if m:
+                before = block[:m.start()].rstrip('\n')
+                after = block[m.end():].lstrip('\n')
+                if before:
+                    yield from self.parse_blocks(context, [before])
+                yield from self._flush(context)
+                context.last = 'hr'
+                if after:
+                    blocks.appendleft(after)
+                continue
+
+            if OLIST_RE.match(block) or ULIST_RE.match(block):
+                if context.last == 'list':
+                    raise UnsupportedMarkdown('loose list')
+                yield from self._flush(context)
+                yield from self._list(context, block)
+                context.last = 'list'
+                continue
+
+            m = QUOTE_RE.search(block)
+            if m:
+                before = block[:m.start()]
+                if before:
+                    yield from self.parse_blocks(context, [before])
+                if context.last == 'quote':
+                    raise UnsupportedMarkdown('consecutive blockquotes')
+                yield from self._flush(context)
+                yield from self._quote(block[m.start():])
+                context.last = 'quote'
+                continue
+
+            if REFERENCE_RE.search(block):
+                raise UnsupportedMarkdown('reference definition')
+
+            yield from self._flush(context)
+            yield from self._paragraph(context, block)
+
+    def _code_block(self, context, blocks, block):
+        """缩进代码块，紧跟在缩进代码块后的缩进块会合并进去"""
+        lines = block.split('\n')
+        code_lines = []
+        rest = []
+        for i, line in enumerate(lines):
+            if line.startswith(' ' * TAB_LENGTH):
+                code_lines.append(line[TAB_LENGTH:])
+            elif not line.strip():
+                code_lines.append('')
+            else:
+                rest = lines[i:]
+                break
+        code = '\n'.join(code_lines).rstrip()
+        if context.last == CODE and context.pending_code is not None:
+            context.pending_code = '%s\n%s\n' % (context.pending_code, code)
+        else:
+            yield from self._flush(context)
+            context.pending_code = code + '\n'
+        context.last = CODE
+        if rest:
+            blocks.appendleft('\n'.join(rest))
+
+    @staticmethod
+    def _split_row(row, border):
+        """按没有转义的 | 拆分单元格，单元格中的 \\| 留给行内转义处理"""
+        if border:
+            if row.startswith('|'):
+                row = row[1:]
+            row = TABLE_END_BORDER_RE.sub('', row)
+        if '`' in row:
+            raise UnsupportedMarkdown('table cell with code span')
+        cells = []
+        start = 0
+        for m in TABLE_PIPES_RE.finditer(row):
+            if m.group(3):
+                cells.append(row[start:m.start()])
+                start = m.end()
+        cells.append(row[start:])
+        return cells
+
+    def _is_table(self, block):
+        rows = [row.strip(' ') for row in block.split('\n', 2)[:2]]
+        if len(rows) < 2:
+            return False
+        header = rows[0]
+        border = header.startswith('|') or TABLE_END_BORDER_RE.search(header) is not None
+        if '|' not in header:
+            return False
+        cells = self._split_row(header, border)
+        if len(cells) == 1:
+            if border:
+                raise UnsupportedMarkdown('single column table')
+            return False
+        if '`' in rows[1]:
+            raise UnsupportedMarkdown('table separator with code span')
+        separator = self._split_row(rows[1], border)
+        return len(separator) == len(cells) and set(''.join(separator)) <= set('|:- ')
+
+    def _table(self, block):
+        lines = [row.strip(' ') for row in block.split('\n')]
+        header = lines[0]
+        border = header.startswith('|') or TABLE_END_BORDER_RE.search(header) is not None
+        cols = len(self._split_row(header, border))
+        rows = []
+        events = []
+        body = lines[2:] if len(lines) >= 3 else []
+        source_rows = [header] + body
+        for row in source_rows:
+            cells = self._split_row(row, border)
+            values = []
+            for i in range(cols):
+                cell = cells[i].strip(' ') if i < len(cells) else ''
+                text, cell_events = _inline(cell)
+                values.append(text.strip())
+                events.extend(cell_events)
+            rows.append(values)
+        if not body:
+            rows.append([''] * cols)
+        yield (TABLE, rows)
+        yield from events
+
+    def _list(self, context, block):
+        items = []
+        for line in block.split('\n'):
+            m = LIST_CHILD_RE.match(line)
+            if m:
+                items.append([m.group(3)])
+            elif LIST_INDENT_RE.match(line):
+                raise UnsupportedMarkdown('nested list')
+            else:
+                items[-1].append(line)
+        for item in items:
+            first = item[0]
+            if (first.startswith(('#', '>', '<', '    ')) or first.startswith(STX)
+                    or LIST_CHILD_RE.match(first) or HR_RE.match(first)):
+                raise UnsupportedMarkdown('block syntax inside list item')
+            for line in item[1:]:
+                if (not line or line[0] in ' >|#<' or re.match(r'^[=-]+[ ]*$', line)
+                        or line.startswith(STX)):
+                    raise UnsupportedMarkdown('complex list item continuation')
+            if len(item) > 1 and '|' in first:
+                raise UnsupportedMarkdown('table inside list item')
+            yield from self._emit_inline(LIST_ITEM, '\n'.join(item).lstrip())
+
+    def _quote(self, block):
+        lines = []
+        for line in block.split('\n'):
+            m = QUOTE_RE.match(line)
+            if line.strip() == '>':
+                lines.append('')
+            elif m:
+                lines.append(m.group(2))
+            else:
+                lines.append(line)
+        inner = '\n'.join(lines)
+        if '\n\n' in inner:
+            raise UnsupportedMarkdown('blank line inside blockquote')
+        context = _Context()
+        yield from self.parse_blocks(context, [inner])
+        yield from self._flush(context)
+
+    def _paragraph(self, context, block):
+        if not block.strip():
+            return
+        context.last = PARAGRAPH
+        text = block.lstrip()
+        m = PLACEHOLDER_RE.fullmatch(text)
+        if m:
+            kind, value = self.stash[int(m.group(1))]
+            if kind == CODE:
+                yield from _code_block_events(value)
+            else:
+                yield (kind, value)
+            return
+        if STX in text:
+            raise UnsupportedMarkdown('raw block inside paragraph')
+        yield from self._emit_inline(PARAGRAPH, text)
+
+
+def _code_block_events(code):
+    """代码块的事件，HTML解析路径中 <pre> 和其中的 <code> 各产出一次"""
+    return [(CODE, code), (CODE, code)]
+
+
+def _extract_fenced_code(text, stash):
+    """把围栏代码块替换成占位符，与 fenced_code 扩展的预处理一致"""
+    out = []
+    pos = 0
+    for m in FENCED_BLOCK_RE.finditer(text):
+        if m.group('attrs') or m.group('hl_lines'):
+            raise UnsupportedMarkdown('fenced code attributes')
+        stash.append((CODE, m.group('code')))
+        out.append(text[pos:m.start()])
+        out.append('\n%s%d%s\n' % (STX, len(stash) - 1, ETX))
+        pos = m.end()
+    out.append(text[pos:])
+    text = ''.join(out)
+    if re.search(r'^(?:~{3,}|`{3,})', text, re.MULTILINE):
+        raise UnsupportedMarkdown('unclosed or unusual code fence')
+    return text
+
+
+def _extract_raw_paragraphs(text, stash):
+    """把行首的<p>...</p>原始HTML块替换成占位符，其他行首块级HTML不支持"""
+    pos = 0
+    out = []
+    for m in HTML_LINE_START_RE.finditer(text):
+        if m.start() < pos:
+            continue
+        closing, tag = m.group(1), m.group(2).lower()
+        if tag not in BLOCK_LEVEL_TAGS:
+            continue
+        if closing or tag != 'p' or text[m.start()] == ' ':
+            raise UnsupportedMarkdown('raw html block <%s%s>' % (closing, tag))
+        start = m.start()
+        raw = RAW_P_RE.match(text, start)
+        if not raw:
+            raise UnsupportedMarkdown('unterminated raw <p>')
+        content = raw.group(1)
+        if '<p' in content.lower():
+            raise UnsupportedMarkdown('nested <p>')
+        for tag_match in re.finditer(r'<[^>]*>?', content):
+            tag_text = tag_match.group()
+            name = re.match(r'</?([a-zA-Z][a-zA-Z0-9]*)[^<>]*>$', tag_text)
+            if not name or name.group(1).lower() not in INLINE_TEXT_TAGS:
+                raise UnsupportedMarkdown('raw html content %r' % tag_text)
+        end = raw.end()
+        tail_end = text.find('\n', end)
+        tail = text[end:tail_end if tail_end != -1 else len(text)]
+        if '<' in tail:
+            raise UnsupportedMarkdown('html after raw block')
+        value = _collapse(html.unescape(re.sub(r'<[^>]*>', SEP, content)))
+        stash.append((PARAGRAPH, value))
+        out.append(text[pos:start])
+        out.append('\n%s%d%s\n\n' % (STX, len(stash) - 1, ETX))
+        pos = end
+    out.append(text[pos:])
+    return ''.join(out)
+
+
+def iter_elements(md_text):
+    """按文档顺序产出幻灯片元素事件
+
+    不支持的写法可能在已经产出部分事件之后才抛出 UnsupportedMarkdown，
+    需要整篇回退的调用方应使用 parse_elements。
+    """
+    if SEP in md_text or MARK in md_text:
+        raise UnsupportedMarkdown('control character')
+    if not md_text.strip():
+        return iter(())
+    stash = []
+    text = _normalize(md_text)
+    text = _extract_fenced_code(text, stash)
+    text = _extract_raw_paragraphs(text, stash)
+    return _BlockParser(stash).parse_document(text)
+
+
+def parse_elements(md_text):
+    """解析为事件列表，不支持的写法抛出 UnsupportedMarkdown"""
+    return list(iter_elements(md_text))
+
+
+def split_sections(elements):
+    """在一级、二级标题处切分事件列表
+
+    每个标题都会新建幻灯片，所以各段可以各自渲染后按顺序拼接；
+    第一段可能是第一个标题之前的内容。
+    """
+    sections = []
+    for element in elements:
+        if element[0] in (H1, H2) or not sections:
+            sections.append([])
+        sections[-1].append(element)
+    return sections
+
+
+SECTION_HEADING_RE = re.compile(r'#{1,2}(?!#)')
+FENCE_LINE_RE = re.compile(r'[ ]{0,3}(`{3,}|~{3,})')
+
+
+class SectionBuffer:
+    """从逐段到达的Markdown文本中切出已完整的一级、二级标题段落
+
+    LLM流式输出时，每出现一个新的一级或二级标题行，之前的内容就不会再变化，
+    可以先交给 process_markdown 渲染。围栏代码块内的 # 行，以及紧跟在表格行
+    之后的标题行（Python-Markdown会把它当作表格的一行）不作为切分点。
+    """
+
+    def __init__(self):
+        self._lines = []
+        self._partial = ''
+        self._fence = None
+
+    def feed(self, text):
+        """追加文本，返回新完成的段落文本列表"""
+        self._partial += text
+        *lines, self._partial = self._partial.split('\n')
+        sections = []
+        for line in lines:
+            if self._is_split(line) and self._lines:
+                sections.append('\n'.join(self._lines) + '\n')
+                self._lines = []
+            self._lines.append(line)
+        return sections
+
+    def flush(self):
+        """返回剩余的全部文本，流结束时调用"""
+        text = '\n'.join(self._lines + [self._partial])
+        self._lines = []
+        self._partial = ''
+        return text
+
+    def _is_split(self, line):
+        fence = FENCE_LINE_RE.match(line)
+        if self._fence is not None:
+            if fence and fence.group(1)[0] == self._fence[0] and len(fence.group(1)) >= len(self._fence):
+                self._fence = None
+            return False
+        if fence:
+            self._fence = fence.group(1)
+            return False
+        if not SECTION_HEADING_RE.match(line):
+            return False
+        return not (self._lines and '|' in self._lines[-1])
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标
+
+在转换和LLM调用的各个阶段记录耗时，按直方图汇总，通过 /metrics 以
+Prometheus 文本格式输出。指标保存在本进程内存中；并行渲染和批量转换的
+工作进程中记录的指标不会汇总到主进程。
+
+用法:
+    with STAGE_SECONDS.time('save'):
+        prs.save(output)
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 秒级耗时的默认分桶
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """初始化直方图，labelnames为标签名，observe时按相同顺序传入标签值"""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labelvalues):
+        """记录一个观测值"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """记录with块的耗时（秒），块内抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def snapshot(self, *labelvalues):
+        """返回 (观测次数, 总和)，没有观测值时返回 (0, 0.0)"""
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return (series[1], series[2]) if series else (0, 0.0)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, (list(counts), count, total))
+                            for labels, (counts, count, total) in self._series.items())
+        for labels, (counts, count, total) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels, [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{label_text} {count}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        """初始化计数器"""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """按名称返回直方图，不存在时创建"""
+        return self._get(Histogram, name, help, labelnames, buckets)
+
+    def counter(self, name, help, labelnames=()):
+        """按名称返回计数器，不存在时创建"""
+        return self._get(Counter, name, help, labelnames)
+
+    def render(self, gauges=None):
+        """输出Prometheus文本格式，gauges为 {指标名: (说明, 值)}，用于输出当前状态类的指标"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for _, metric in metrics:
+            lines.extend(metric.collect())
+        for name, (help, value) in sorted((gauges or {}).items()):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# 转换各阶段：parse / markdown_convert / html_parse / render / render_parallel / save
+STAGE_SECONDS = REGISTRY.histogram(
+    'pptgenius_stage_seconds', 'Time spent in each conversion stage', ('stage',))
+# 每个 add_* 调用，element为元素类型（h1、paragraph、image、table等）
+ELEMENT_SECONDS = REGISTRY.histogram(
+    'pptgenius_element_seconds', 'Time spent adding one Markdown element to the deck', ('element',))
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    'pptgenius_llm_request_seconds', 'Total LLM request time', ('kind',))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    'pptgenius_llm_first_token_seconds', 'Time from sending a streaming LLM request to the first token')
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    'pptgenius_llm_tokens_per_second', 'Streaming LLM output rate after the first token',
+    buckets=(1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500))
+LLM_TOKENS = REGISTRY.counter(
+    'pptgenius_llm_tokens_total', 'Completion tokens received from the LLM', ('kind',))
+# 各路由的token用量，type为 prompt、completion、reserved（请求的max_tokens）
+LLM_ROUTE_TOKENS = REGISTRY.counter(
+    'pptgenius_llm_route_tokens_total', 'LLM tokens by route (prompt, completion, reserved max_tokens)',
+    ('route', 'type'))
+LLM_CONTINUATIONS = REGISTRY.counter(
+    'pptgenius_llm_continuations_total', 'LLM replies cut off by max_tokens and continued', ('route',))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'pptgenius_http_request_seconds', 'HTTP request handling time (streaming bodies excluded)',
+    ('endpoint', 'status'))
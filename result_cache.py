@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成结果缓存
+
+重试、重复点击、重新下载时，同样的内容和模板会一次次提交到 /api/generate_ppt。
+生成的PPT按输入（Markdown、模板、引用的图片和表格的哈希）保存在磁盘上，
+总大小超过上限时按最近使用时间淘汰（DiskCache）；相同的请求直接返回已生成的文件。
+同时到达的相同请求按键排队（KeyedLocks），只有第一个请求渲染，其余请求等它完成后命中缓存。
+
+缓存文件的修改时间即最近使用时间。多个进程共享同一目录，写入新文件时持有目录的文件锁
+（fcntl.flock）重新统计整个目录，按所有进程写入的文件总大小淘汰，而不是每个进程各自计数。
+低内存模式的PPT边保存边发送，同时写入缓存（write_through），发送完成后加入缓存。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有文件锁，只在进程内加锁
+    fcntl = None
+
+SUFFIX = '.pptx'
+TMP_DIR = 'tmp'
+LOCK_FILE = 'cache.lock'
+
+
+def result_key(*parts):
+    """按输入计算缓存键，parts需要能编码为JSON"""
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, root, max_bytes):
+        """初始化缓存，root为缓存目录，max_bytes为目录中缓存文件的总大小上限（多个进程共享）"""
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(root, TMP_DIR), exist_ok=True)
+        self._scan()
+
+    @contextmanager
+    def _locked(self):
+        """持有进程内的锁和缓存目录的文件锁，同时只有一个进程统计和淘汰"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root, LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """统计目录中的缓存文件（包括其他进程写入的），返回按修改时间排序的 (修改时间, 键, 大小)"""
+        entries = []
+        for directory, _, filenames in os.walk(self.root):
+            if os.path.basename(directory) == TMP_DIR:
+                continue
+            for filename in filenames:
+                if filename.endswith(SUFFIX):
+                    try:
+                        stat = os.stat(os.path.join(directory, filename))
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, filename[:-len(SUFFIX)], stat.st_size))
+        entries.sort()
+        self.bytes = sum(size for _, _, size in entries)
+        self.count = len(entries)
+        return entries
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + SUFFIX)
+
+    def open(self, key):
+        """打开缓存的文件，不存在时返回None"""
+        try:
+            f = open(self.path(key), 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+        return f
+
+    def tmp_path(self):
+        """写入中的文件路径，写完后交给 add"""
+        return os.path.join(self.root, TMP_DIR, uuid.uuid4().hex + SUFFIX)
+
+    def add(self, key, tmp_path):
+        """把写好的文件移入缓存，按整个目录的总大小淘汰最久没有使用的文件，返回缓存文件路径"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        with self._locked():
+            entries = self._scan()
+            for _, old_key, size in entries:
+                if self.bytes <= self.max_bytes:
+                    break
+                # 刚写入的文件即使超过上限也保留到下一次写入
+                if old_key == key:
+                    continue
+                try:
+                    os.remove(self.path(old_key))
+                except FileNotFoundError:
+                    pass
+                self.bytes -= size
+                self.count -= 1
+                self.evictions += 1
+        return path
+
+    def write_through(self, key, chunks):
+        """边返回数据块边写入缓存文件的生成器，全部返回后加入缓存；中途关闭时丢弃写了一半的文件"""
+        tmp_path = self.tmp_path()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            self.add(key, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __len__(self):
+        with self._lock:
+            return self.count
+
+    def stats(self):
+        """返回缓存统计信息，大小为最近一次写入时统计的整个目录"""
+        with self._lock:
+            return {
+                'size': self.count,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class KeyedLocks:
+    """按键加锁，同一个键同时只有一个持有者，用于合并同时到达的相同请求"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+        self.waited = 0
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        if not entry[0].acquire(blocking=False):
+            with self._lock:
+                self.waited += 1
+            entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
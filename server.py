@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生产环境服务
+
+用 gunicorn 的 gthread 工作进程运行应用（python app.py serve）：
+
+- 进程数默认等于CPU核数，渲染PPT是CPU密集型，靠多进程扩展；
+- 每个进程有多个线程，SSE流式接口大部分时间在等待LLM返回，每个流占用一个线程，
+  线程数决定了每个进程能同时保持的流数量；gthread的超时按进程心跳计算，
+  长时间的流不会被当成卡死的进程杀掉；
+- 每个进程同时进行的渲染数由 RENDER_CONCURRENCY 限制（见 app.render_slots），
+  多余的渲染排队等待，多个渲染不会同时争抢GIL让流式接口卡顿；
+- 收到SIGTERM后停止接收新连接，等待进行中的请求（包括SSE流）和后台渲染任务
+  完成后再退出，最多等待 graceful_timeout 秒。
+
+每个工作进程启动后、接收请求前先预热（WARMUP_ON_START），第一个请求不会变慢；
+使用SQLite任务队列时同时启动任务工作线程，领取其他进程提交或重新排队的任务。
+"""
+
+import os
+
+import config
+
+
+def gunicorn_options(host='0.0.0.0', port=5000, workers=None, threads=None,
+                     timeout=None, graceful_timeout=None):
+    """生成gunicorn配置，未指定的参数使用config中的默认值"""
+    graceful_timeout = graceful_timeout or config.SERVE_GRACEFUL_TIMEOUT
+
+    def post_worker_init(worker):
+        from app import start_shared_job_runner, warmup
+        # fork之后再启动任务工作线程
+        start_shared_job_runner()
+        if config.WARMUP_ON_START:
+            warmup()
+
+    def worker_exit(server, worker):
+        # 正在渲染的后台任务完成后再退出
+        from app import job_runner
+        job_runner.stop(timeout=graceful_timeout)
+
+    return {
+        'bind': f'{host}:{port}',
+        'workers': workers or config.SERVE_WORKERS or os.cpu_count() or 1,
+        'worker_class': 'gthread',
+        'threads': threads or config.SERVE_THREADS,
+        'timeout': timeout or config.SERVE_TIMEOUT,
+        'graceful_timeout': graceful_timeout,
+        'keepalive': config.SERVE_KEEPALIVE,
+        'accesslog': '-' if config.SERVE_ACCESS_LOG else None,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+def serve(**options):
+    """用gunicorn启动应用，参数见 gunicorn_options"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit('serve mode requires gunicorn: pip install gunicorn')
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options(**options).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # 在工作进程中导入，每个进程有自己的LLM连接池、缓存和任务队列
+            from app import app
+            return app
+
+    Application().run()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+幻灯片中间表示（IR）
+
+Markdown只解析一次得到 Deck，渲染（MarkdownToPPT.render_ir）、并行渲染的工作进程、
+预览接口都直接使用 Deck，不再重复解析，也可以按内容哈希缓存。
+
+Deck.slides 中每个 Slide 对应一个一级或二级标题段落（第一页之前可能有一个没有标题的
+段落，level为0），elements 为 (类型, 内容) 元组的元组，类型同 md_stream
+（h3、p、li、code、img、table），表格内容为行的元组，第一行为表头。
+IR记录的是逻辑页，排版时放不下的内容还会分到续页。
+
+序列化为紧凑的数组 [版本, [[级别, 标题, [[类型, 内容], ...]], ...]]，
+编码为JSON，或者安装了msgpack时编码为msgpack。
+"""
+
+import hashlib
+import json
+
+from md_stream import H1, H2, TABLE, UnsupportedMarkdown, parse_elements
+from metrics import STAGE_SECONDS
+
+IR_VERSION = 1
+
+_HEADING_LEVELS = {H1: 1, H2: 2}
+_LEVEL_HEADINGS = {1: H1, 2: H2}
+
+
+class Slide:
+    __slots__ = ('level', 'title', 'elements')
+
+    def __init__(self, level, title, elements=()):
+        """level为1（一级标题）、2（二级标题）或0（没有标题）"""
+        self.level = level
+        self.title = title
+        self.elements = tuple(elements)
+
+    def events(self):
+        """返回渲染用的元素事件列表，包括标题"""
+        if not self.level:
+            return list(self.elements)
+        return [(_LEVEL_HEADINGS[self.level], self.title)] + list(self.elements)
+
+    def preview(self):
+        """幻灯片结构的摘要，表格只给出表头和行数"""
+        elements = []
+        for kind, payload in self.elements:
+            if kind == TABLE:
+                elements.append({'type': kind, 'header': list(payload[0]) if payload else [],
+                                 'rows': max(len(payload) - 1, 0)})
+            else:
+                elements.append({'type': kind, 'text': payload})
+        return {'level': self.level, 'title': self.title, 'elements': elements}
+
+    def __eq__(self, other):
+        return isinstance(other, Slide) and (self.level, self.title, self.elements) == (
+            other.level, other.title, other.elements)
+
+    def __repr__(self):
+        return f'Slide({self.level!r}, {self.title!r}, {len(self.elements)} elements)'
+
+
+class Deck:
+    __slots__ = ('slides',)
+
+    def __init__(self, slides=()):
+        self.slides = list(slides)
+
+    def __len__(self):
+        return len(self.slides)
+
+    def __eq__(self, other):
+        return isinstance(other, Deck) and self.slides == other.slides
+
+    def sections(self):
+        """按幻灯片返回元素事件列表，用于渲染"""
+        return [slide.events() for slide in self.slides]
+
+    def preview(self):
+        return [slide.preview() for slide in self.slides]
+
+    def to_list(self):
+        return [IR_VERSION, [
+            [slide.level, slide.title, [[kind, payload] for kind, payload in slide.elements]]
+            for slide in self.slides
+        ]]
+
+    @classmethod
+    def from_list(cls, data):
+        version, slides = data
+        if version != IR_VERSION:
+            raise ValueError(f'不支持的IR版本: {version}')
+        return cls(
+            Slide(level, title, (_element(kind, payload) for kind, payload in elements))
+            for level, title, elements in slides
+        )
+
+
+def _element(kind, payload):
+    """表格转换为元组，IR可以在多个请求之间共享"""
+    if kind == TABLE:
+        payload = tuple(tuple(row) for row in payload)
+    return (kind, payload)
+
+
+def from_elements(elements):
+    """把元素事件列表按一级、二级标题分成幻灯片"""
+    slides = []
+    for kind, payload in elements:
+        level = _HEADING_LEVELS.get(kind)
+        if level:
+            slides.append((level, payload, []))
+        else:
+            if not slides:
+                slides.append((0, '', []))
+            slides[-1][2].append(_element(kind, payload))
+    return Deck(Slide(level, title, items) for level, title, items in slides)
+
+
+def parse_document(md_text):
+    """解析Markdown为Deck
+
+    优先使用单遍流式解析器，遇到无法保证结果一致的写法时整篇回退到HTML解析路径。
+    """
+    try:
+        with STAGE_SECONDS.time('parse'):
+            elements = parse_elements(md_text)
+    except UnsupportedMarkdown:
+        from md2ppt import iter_html_elements
+        elements = iter_html_elements(md_text)
+    return from_elements(elements)
+
+
+def content_id(md_text):
+    """Markdown内容哈希，用作IR缓存的键"""
+    return hashlib.sha256(md_text.encode('utf-8')).hexdigest()
+
+
+def dumps(deck, format='json'):
+    """把Deck序列化为字节，format为json或msgpack"""
+    data = deck.to_list()
+    if format == 'msgpack':
+        import msgpack
+        return msgpack.packb(data, use_bin_type=True)
+    if format == 'json':
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    raise ValueError(f'不支持的格式: {format}')
+
+
+def loads(data, format='json'):
+    """从dumps的结果还原Deck"""
+    if format == 'msgpack':
+        import msgpack
+        return Deck.from_list(msgpack.unpackb(data, raw=False))
+    if format == 'json':
+        return Deck.from_list(json.loads(data))
+    raise ValueError(f'不支持的格式: {format}')
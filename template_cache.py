@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PPT模板缓存
+
+按模板文件内容的SHA-256缓存已删除幻灯片的模板（只保留母版和版式），LRU淘汰。
+缓存的是去除幻灯片后重新打包的字节，每次请求从内存解析出一份独立副本，
+不再落盘，也不再重复删除幻灯片及其图片等关联部件。
+
+注意：python-pptx的对象不能用copy.deepcopy复制，lxml元素的深拷贝不共享memo，
+演示文稿和其部件会各自持有一份XML，新增的幻灯片会丢失。
+"""
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+
+def template_hash(data):
+    """计算模板内容哈希，客户端可用同样的方法在本地计算模板ID"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class TemplateCache:
+    def __init__(self, max_size=16):
+        """初始化缓存，max_size为最多缓存的模板数量"""
+        self.max_size = max_size
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, template_id):
+        with self._lock:
+            return template_id in self._templates
+
+    def __len__(self):
+        with self._lock:
+            return len(self._templates)
+
+    def register(self, data):
+        """注册模板，data为模板文件的字节内容或文件流，返回模板ID"""
+        if hasattr(data, 'read'):
+            data = data.read()
+        template_id = template_hash(data)
+        with self._lock:
+            if template_id in self._templates:
+                self._templates.move_to_end(template_id)
+                return template_id
+
+        # 解析放在锁外，避免大模板阻塞其他请求
+        from pptx import Presentation
+        from md2ppt import remove_all_slides
+
+        prs = remove_all_slides(Presentation(io.BytesIO(data)))
+        stripped = io.BytesIO()
+        prs.save(stripped)
+
+        with self._lock:
+            self._templates[template_id] = stripped.getvalue()
+            self._templates.move_to_end(template_id)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+        return template_id
+
+    def get(self, template_id):
+        """返回模板的独立副本，模板不存在时返回None"""
+        data = self.get_data(template_id)
+        if data is None:
+            return None
+        from pptx import Presentation
+
+        return Presentation(io.BytesIO(data))
+
+    def get_data(self, template_id):
+        """返回去除幻灯片后的模板字节，模板不存在时返回None"""
+        with self._lock:
+            data = self._templates.get(template_id)
+            if data is None:
+                self.misses += 1
+                return None
+            self._templates.move_to_end(template_id)
+            self.hits += 1
+        return data
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                'size': len(self._templates),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+批量转换测试：目录和清单输入、增量跳过、报告，以及批量接口返回的zip
+"""
+import io
+import json
+import os
+import zipfile
+
+from PIL import Image
+from pptx import Presentation
+
+import app as app_module
+import batch
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def _title(path_or_data):
+    if isinstance(path_or_data, bytes):
+        path_or_data = io.BytesIO(path_or_data)
+    return Presentation(path_or_data).slides[0].shapes[0].text_frame.text
+
+
+def _report(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_directory_batch_with_incremental_rebuild(tmp_path):
+    src, out, report = tmp_path / 'docs', tmp_path / 'decks', str(tmp_path / 'report.jsonl')
+    _write(str(src / 'a.md'), '# 甲')
+    _write(str(src / 'sub' / 'b.md'), '# 乙')
+    template = str(tmp_path / 'template.pptx')
+    Presentation().save(template)
+
+    args = [str(src), '--output-dir', str(out), '--template', template, '--report', report, '--workers', '2']
+    assert batch.main(args) == 0
+    statuses = {os.path.basename(r['input']): r['status'] for r in _report(report)}
+    assert statuses['a.md'] == statuses['b.md'] == 'ok'
+    assert _title(str(out / 'a.pptx')) == '甲' and _title(str(out / 'sub' / 'b.pptx')) == '乙'
+
+    # 内容没有变化的文件跳过，修改过的重新生成
+    _write(str(src / 'a.md'), '# 甲二')
+    batch.main(args)
+    statuses = {os.path.basename(r['input']): r['status'] for r in _report(report)}
+    assert (statuses['a.md'], statuses['b.md']) == ('ok', 'skipped')
+    assert _title(str(out / 'a.pptx')) == '甲二'
+    assert all('seconds' in r for r in _report(report))
+
+    # 模板变化时全部重新生成
+    prs = Presentation()
+    prs.slide_width = prs.slide_height
+    prs.save(template)
+    batch.main(args)
+    assert {r['status'] for r in _report(report)} == {'ok'}
+
+
+def test_changed_image_rebuilds(tmp_path):
+    src, out, images = tmp_path / 'docs', tmp_path / 'decks', tmp_path / 'images'
+    _write(str(src / 'a.md'), '# 甲\n\n![图](photo.png)')
+    _write(str(src / 'b.md'), '# 乙')
+    images.mkdir()
+    Image.new('RGB', (8, 8), 'red').save(str(images / 'photo.png'))
+    report = str(tmp_path / 'report.jsonl')
+    args = [str(src), '--output-dir', str(out), '--image-dir', str(images), '--report', report]
+    assert batch.main(args) == 0
+
+    # Markdown没有变化，但引用的图片变化时重新生成
+    Image.new('RGB', (8, 8), 'blue').save(str(images / 'photo.png'))
+    batch.main(args)
+    statuses = {os.path.basename(r['input']): r['status'] for r in _report(report)}
+    assert (statuses['a.md'], statuses['b.md']) == ('ok', 'skipped')
+    batch.main(args)
+    assert {r['status'] for r in _report(report)} == {'skipped'}
+
+    # 图片被删除也视为变化
+    os.remove(str(images / 'photo.png'))
+    batch.main(args)
+    statuses = {os.path.basename(r['input']): r['status'] for r in _report(report)}
+    assert statuses['a.md'] == 'ok'
+
+
+def test_manifest(tmp_path):
+    _write(str(tmp_path / 'a.md'), '# 清单')
+    manifest = tmp_path / 'jobs.jsonl'
+    manifest.write_text(json.dumps({'input': str(tmp_path / 'a.md'), 'output': str(tmp_path / 'x' / 'out.pptx')})
+                        + '\n' + json.dumps({'input': str(tmp_path / 'missing.md')}) + '\n')
+    assert batch.main(['--manifest', str(manifest), '--workers', '1']) == 1
+    assert _title(str(tmp_path / 'x' / 'out.pptx')) == '清单'
+
+
+def test_batch_endpoint():
+    client = app_module.app.test_client()
+    response = client.post('/api/generate_ppt_batch', json={'documents': [
+        {'name': '报告.md', 'content': '# 一'},
+        {'name': 'report.md', 'content': '# 二'},
+        {'name': 'report.md', 'content': '# 三'},
+    ]})
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    names = archive.namelist()
+    assert names == ['document.pptx', 'report.pptx', 'report_2.pptx', 'report.json']
+    assert [_title(archive.read(name)) for name in names[:3]] == ['一', '二', '三']
+    assert [r['status'] for r in json.loads(archive.read('report.json'))] == ['ok'] * 3
+
+    response = client.post('/api/generate_ppt_batch', data={
+        'files': [(io.BytesIO('# 文件'.encode('utf-8')), 'a.md')],
+    })
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert _title(archive.read('a.pptx')) == '文件'
+    assert client.post('/api/generate_ppt_batch', json={'documents': []}).status_code == 400
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+基准测试套件测试：合成文档可复现、用例结果字段完整，以及回归比较
+"""
+from benchmarks import suite
+
+
+def test_documents_are_reproducible():
+    for corpus in suite.CORPORA:
+        assert suite.make_document(corpus, 10) == suite.make_document(corpus, 10)
+        assert suite.make_document(corpus, 10) != suite.make_document(corpus, 20)
+
+
+def test_run_case(tmp_path):
+    entry = suite.run_case('cjk', 10, 1, suite.make_images_dir(str(tmp_path)))
+    assert entry['name'] == 'cjk-10'
+    assert entry['slides'] == 10
+    assert entry['seconds'] > 0 and entry['peak_rss_mb'] > 0 and entry['output_bytes'] > 0
+
+
+def test_compare_flags_regressions():
+    baseline = {
+        'results': [{'name': 'cjk-10', 'seconds': 1.0, 'peak_rss_mb': 50, 'output_bytes': 1000}],
+        'throughput': [{'name': 'generate_ppt-c4', 'requests_per_second': 20, 'p95_seconds': 0.2}],
+    }
+    current = {
+        'results': [{'name': 'cjk-10', 'seconds': 1.1, 'peak_rss_mb': 70, 'output_bytes': 900},
+                    {'name': 'cjk-100', 'seconds': 5.0}],
+        'throughput': [{'name': 'generate_ppt-c4', 'requests_per_second': 15, 'p95_seconds': 0.2}],
+    }
+    rows, regressions = suite.compare(baseline, current, 0.2)
+    assert len(rows) == 5
+    assert regressions == [
+        'cjk-10 peak_rss_mb: 50 -> 70 (+40.0%)',
+        'generate_ppt-c4 requests_per_second: 20 -> 15 (-25.0%)',
+    ]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Excel表格测试：Markdown转换、工作表选择和截断、原生表格分页
+"""
+import io
+
+import pandas as pd
+import pytest
+from pptx import Presentation
+
+import app as app_module
+from excel_table import dataframe_to_markdown, read_sheet
+from md2ppt import MarkdownToPPT, iter_html_elements
+
+
+def _workbook(**sheets):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return output.getvalue()
+
+
+def _iterrows_markdown(df):
+    """原来逐行拼接的实现，作为对照"""
+    markdown_table = "| " + " | ".join(df.columns) + " |\n"
+    markdown_table += "| " + " | ".join(["---" for _ in df.columns]) + " |\n"
+    for _, row in df.iterrows():
+        markdown_table += "| " + " | ".join(str(cell) for cell in row) + " |\n"
+    return markdown_table
+
+
+def test_markdown_matches_row_by_row_version():
+    df = pd.DataFrame({'名称': ['甲', '乙', None], '说明': ['a', 'b', 'c']})
+    assert dataframe_to_markdown(df) == _iterrows_markdown(df)
+    df = pd.DataFrame({'数值': [1.5, float('nan')], '比例': [0.25, 2.0]})
+    assert dataframe_to_markdown(df) == _iterrows_markdown(df)
+
+
+def test_markdown_escapes_cell_separators():
+    df = pd.DataFrame({'a|b': ['x|y'], 'c': ['第一行\n第二行']})
+    tables = [payload for kind, payload in iter_html_elements(dataframe_to_markdown(df)) if kind == 'table']
+    assert tables == [[['a|b', 'c'], ['x|y', '第一行 第二行']]]
+
+
+def test_read_sheet_selection_and_row_cap():
+    data = _workbook(汇总=pd.DataFrame({'x': [1, 2]}), 明细=pd.DataFrame({'y': range(100)}))
+    sheet, df, names, truncated = read_sheet(io.BytesIO(data))
+    assert (sheet, names, truncated, len(df)) == ('汇总', ['汇总', '明细'], False, 2)
+    for selector in ('明细', '1', 1):
+        sheet, df, _, truncated = read_sheet(io.BytesIO(data), selector, max_rows=10)
+        assert (sheet, truncated) == ('明细', True)
+        assert df['y'].tolist() == list(range(10))
+    with pytest.raises(ValueError):
+        read_sheet(io.BytesIO(data), '不存在')
+
+
+def test_dataframe_split_across_continuation_slides():
+    df = pd.DataFrame({'序号': range(25), '值': [f'v{i}' for i in range(25)]})
+    converter = MarkdownToPPT()
+    converter.add_dataframe(df, title='明细')
+
+    data_rows = []
+    for i, slide in enumerate(converter.prs.slides):
+        heading, table = slide.shapes[0].text_frame.text, slide.shapes[1].table
+        assert heading == ('明细' if i == 0 else '明细（续）')
+        rows = [[cell.text for cell in row.cells] for row in table.rows]
+        assert rows[0] == ['序号', '值']
+        assert converter.prs.slide_height - slide.shapes[1].top - slide.shapes[1].height >= 0
+        data_rows.extend(rows[1:])
+    assert len(converter.prs.slides) == 3
+    assert data_rows == df.astype(str).values.tolist()
+
+
+def test_generate_ppt_with_excel_id():
+    client = app_module.app.test_client()
+    data = _workbook(销量=pd.DataFrame({'月份': ['1月', '2月'], '销量': [10, 20]}))
+    result = client.post('/api/upload_excel', data={'excel': (io.BytesIO(data), 'a.xlsx')}).get_json()
+    assert result['markdown'].splitlines()[2] == '| 1月 | 10 |'
+    assert (result['sheet'], result['rows'], result['truncated']) == ('销量', 2, False)
+
+    response = client.post('/api/generate_ppt', data={'content': '# 报告', 'excel_id': result['excel_id']})
+    slides = Presentation(io.BytesIO(response.data)).slides
+    assert [cell.text for cell in slides[1].shapes[1].table.rows[2].cells] == ['2月', '20']
+
+    response = client.post('/api/generate_ppt', data={'content': '# 报告', 'excel_id': 'missing'})
+    assert response.status_code == 404
+
+
+def test_upload_excel_row_limit(monkeypatch):
+    client = app_module.app.test_client()
+    data = _workbook(明细=pd.DataFrame({'序号': range(6000)}))
+    # 默认不限制行数
+    result = client.post('/api/upload_excel', data={'excel': (io.BytesIO(data), 'a.xlsx')}).get_json()
+    assert (result['rows'], result['truncated']) == (6000, False)
+
+    monkeypatch.setattr(app_module.config, 'EXCEL_MAX_ROWS', 100)
+    result = client.post('/api/upload_excel', data={'excel': (io.BytesIO(data), 'a.xlsx')}).get_json()
+    assert (result['rows'], result['truncated']) == (100, True)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+正文分章节并行生成测试：大纲拆分、并行请求、按章节顺序合并和失败章节重试
+"""
+import json
+import re
+import time
+
+import app as app_module
+import config
+from fanout import fan_out, split_outline
+from llm_client import LLMClient
+
+OUTLINE = '# 年度总结\n\n## 第一章\n### 要点\n\n## 第二章\n\n## 第三章\n\n## 第四章\n'
+
+
+def chapter_reply(body):
+    """回复内容为提示词中的章节标题，便于检查顺序"""
+    return re.search(r'## (\S+)', body['messages'][0]['content']).group(1) * 3
+
+
+def sse_events(response):
+    return [json.loads(line[6:]) for line in response.get_data(as_text=True).split('\n\n')
+            if line.startswith('data: ') and line != 'data: [DONE]']
+
+
+def test_split_outline():
+    preamble, chapters = split_outline(OUTLINE)
+    assert preamble == '# 年度总结\n\n'
+    assert chapters == ['## 第一章\n### 要点', '## 第二章', '## 第三章', '## 第四章']
+    assert split_outline('# 标题\n### 要点') == ('# 标题\n### 要点', [])
+
+
+def test_fan_out_keeps_order_and_retries():
+    attempts = {}
+
+    def stream(index, chapter):
+        attempts[index] = attempts.get(index, 0) + 1
+        # 后面的章节先完成，第二章第一次失败
+        time.sleep(0.05 * (3 - index))
+        if index == 1 and attempts[index] == 1:
+            yield '不完整'
+            raise RuntimeError('连接断开')
+        yield from (chapter, '.')
+
+    chapters = ['a', 'b', 'c']
+    events = list(fan_out(chapters, stream, parallelism=3, retries=1, retry_delay=0))
+    assert events == [
+        (0, 'content', 'a'), (0, 'content', '.'), (0, 'done', None),
+        (1, 'content', '不完整'), (1, 'retry', '连接断开'),
+        (1, 'content', 'b'), (1, 'content', '.'), (1, 'done', None),
+        (2, 'content', 'c'), (2, 'content', '.'), (2, 'done', None),
+    ]
+
+
+def test_fan_out_gives_up_after_retries():
+    def stream(index, chapter):
+        if index == 0:
+            raise RuntimeError('失败')
+        return iter([chapter])
+
+    events = list(fan_out(['a', 'b'], stream, retries=1, retry_delay=0))
+    assert events == [(0, 'retry', '失败'), (0, 'error', '失败'), (1, 'content', 'b'), (1, 'done', None)]
+
+
+def test_generate_content_fanout(fake_llm_server, monkeypatch):
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    monkeypatch.setattr(config, 'CONTENT_FANOUT_RETRY_DELAY', 0)
+    fake_llm_server.reply_for = chapter_reply
+    fake_llm_server.delay = 0.05
+    fake_llm_server.failures = 1
+    client = app_module.app.test_client()
+
+    response = client.post('/api/generate_content', json={'outline': OUTLINE, 'fanout': True})
+    events = sse_events(response)
+
+    # 4个章节 + 1次重试，章节请求在模拟服务端的处理时间有重叠
+    assert len(fake_llm_server.requests) == 5
+    spans = sorted(fake_llm_server.spans)
+    assert any(start < end for (_, end), (start, _) in zip(spans, spans[1:]))
+    assert all(0 < request['max_tokens'] <= config.CONTENT_FANOUT_MAX_TOKENS for request in fake_llm_server.requests)
+    assert sum(1 for event in events if 'retry' in event) == 1
+
+    chapters = {}
+    for event in events[1:]:
+        if 'retry' in event:
+            chapters[event['chapter']] = ''
+        elif 'content' in event:
+            chapters[event['chapter']] = chapters.get(event['chapter'], '') + event['content']
+    assert events[0] == {'content': '# 年度总结\n\n'}
+    assert [event['chapter'] for event in events[1:]] == sorted(event['chapter'] for event in events[1:])
+    assert ''.join(chapters[i] for i in range(4)) == '第一章' * 3 + '\n\n' + '第二章' * 3 + '\n\n' + \
+        '第三章' * 3 + '\n\n' + '第四章' * 3 + '\n\n'
+
+
+def test_generate_content_without_fanout(fake_llm_server, monkeypatch):
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    client = app_module.app.test_client()
+    events = sse_events(client.post('/api/generate_content', json={'outline': OUTLINE}))
+    assert len(fake_llm_server.requests) == 1
+    assert ''.join(event['content'] for event in events) == '你好，世界'
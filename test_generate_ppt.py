@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+/api/generate_ppt 测试：并发请求各自得到自己的PPT，不在临时目录留下文件
+"""
+import io
+import os
+import tempfile
+import threading
+
+from pptx import Presentation
+
+import app as app_module
+
+
+def _title(data):
+    return Presentation(io.BytesIO(data)).slides[0].shapes[0].text_frame.text
+
+
+def test_concurrent_requests_get_their_own_deck():
+    before = set(os.listdir(tempfile.gettempdir()))
+    results = {}
+
+    def request(i):
+        client = app_module.app.test_client()
+        response = client.post('/api/generate_ppt', data={'content': f'# 演示{i}\n## 章节\n<p>正文{i}</p>'})
+        results[i] = (response.status_code, response.data)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i, (status, data) in results.items():
+        assert status == 200
+        assert _title(data) == f'演示{i}'
+    assert len(results) == 8
+    assert set(os.listdir(tempfile.gettempdir())) - before == set()
+
+
+def test_template_upload_stream():
+    template = io.BytesIO()
+    Presentation().save(template)
+    template.seek(0)
+    client = app_module.app.test_client()
+    response = client.post('/api/generate_ppt', data={
+        'content': '# 模板',
+        'template': (template, 'template.pptx'),
+    })
+    assert response.status_code == 200
+    assert _title(response.data) == '模板'
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+上传图片存储测试：内容寻址、缩小、去重、清理，图片服务的缓存和Range请求，以及生成PPT时使用缩小后的图片
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import app as app_module
+from image_store import IMAGE_MAX_SIDE, ImageStore
+from md2ppt import MarkdownToPPT
+
+
+def _image_bytes(size, mode='RGB', fmt='JPEG'):
+    output = io.BytesIO()
+    Image.effect_noise(size, 64).convert(mode).save(output, fmt)
+    return output.getvalue()
+
+
+def test_large_images_are_downscaled(tmp_path):
+    store = ImageStore(str(tmp_path))
+    data = _image_bytes((4000, 3000))
+    name = store.ingest(data, 'photo.jpg')
+    digest = hashlib.sha256(data).hexdigest()
+    assert name == f'{digest}.jpg'
+    assert (tmp_path / 'objects' / digest[:2] / name).exists()
+    asset_path, width, height = store.lookup(f'/uploads/{name}')
+    assert (width, height) == (IMAGE_MAX_SIDE, 1500)
+    assert Image.open(asset_path).size == (IMAGE_MAX_SIDE, 1500)
+    assert os.path.getsize(asset_path) < len(data)
+
+    name = store.ingest(_image_bytes((3000, 100), 'RGBA', 'PNG'), 'logo.png')
+    asset_path, width, height = store.lookup(name)
+    assert asset_path.endswith('.png') and (width, height) == (IMAGE_MAX_SIDE, 67)
+
+    # 不需要缩小的图片直接使用原图，不另存一份
+    small = _image_bytes((200, 100), fmt='PNG')
+    name = store.ingest(small, 'small.png')
+    assert store.lookup(name)[0] == store.resolve(name)[0]
+    with open(store.lookup(name)[0], 'rb') as f:
+        assert f.read() == small
+
+
+def test_identical_uploads_are_deduplicated(tmp_path):
+    store = ImageStore(str(tmp_path))
+    data = _image_bytes((300, 200))
+    name = store.ingest(data, 'a.jpg')
+    assert store.ingest(io.BytesIO(data), 'b.jpg') == name
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / 'objects')) == 1
+    assert os.listdir(tmp_path / 'tmp') == []
+    # 不同内容的同名图片不会互相覆盖
+    other = store.ingest(_image_bytes((300, 200)), 'a.jpg')
+    assert other != name and store.lookup(name) != store.lookup(other)
+    # 索引保存在磁盘上，重新打开后仍然可用
+    assert ImageStore(str(tmp_path)).lookup(name) == store.lookup(name)
+    assert store.lookup('missing.jpg') is None
+
+
+def test_garbage_collection(tmp_path):
+    store = ImageStore(str(tmp_path))
+    names = [store.ingest(_image_bytes((300, 200)), 'a.jpg') for _ in range(3)]
+    assert store.collect_garbage(max_bytes=store.stats()['bytes'] - 1) == 1
+    assert store.lookup(names[0]) is None and store.resolve(names[1]) is not None
+    assert not os.path.exists(os.path.join(str(tmp_path), 'objects', names[0][:2], names[0]))
+    assert store.collect_garbage(max_age=60, now=time.time() + 120) == 2
+    assert store.stats() == {'images': 0, 'bytes': 0}
+
+
+def _ingest_many(root, seed, count):
+    store = ImageStore(root)
+    for i in range(count):
+        store.ingest(_image_bytes((40 + seed, 30 + i)), 'a.png')
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要fork')
+def test_processes_share_index(tmp_path):
+    # 多个进程同时上传到同一个目录，索引不丢失其他进程的更新
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_ingest_many, args=(str(tmp_path), seed, 30)) for seed in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * 4
+    objects = sum(len(files) for _, _, files in os.walk(tmp_path / 'objects'))
+    assert ImageStore(str(tmp_path)).stats()['images'] == objects == 120
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_missing_index_entry_is_recovered(tmp_path):
+    store = ImageStore(str(tmp_path))
+    name = store.ingest(_image_bytes((4000, 3000)), 'photo.jpg')
+    expected = store.lookup(name)
+    os.remove(tmp_path / 'images.json')
+
+    # 内容寻址的文件名按目录结构找回，并补回索引
+    store = ImageStore(str(tmp_path))
+    assert store.lookup(name) == expected
+    assert store.resolve(name)[1] == name.split('.')[0]
+    assert ImageStore(str(tmp_path)).stats()['images'] == 1
+
+
+def test_deck_embeds_downscaled_asset(tmp_path):
+    store = ImageStore(str(tmp_path))
+    name = store.ingest(_image_bytes((4000, 3000)), 'photo.jpg')
+    converter = MarkdownToPPT()
+    converter.set_image_dir(str(tmp_path))
+    converter.set_image_store(store)
+    converter.process_markdown(f'## 图片\n![照片](/uploads/{name})')
+    picture = converter.prs.slides[0].shapes[-1]
+    with open(store.lookup(name)[0], 'rb') as f:
+        assert picture.image.blob == f.read()
+
+
+def test_upload_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'image_store', ImageStore(str(tmp_path)))
+    client = app_module.app.test_client()
+    data = _image_bytes((300, 200))
+    first = client.post('/api/upload_image', data={'image': (io.BytesIO(data), 'a.jpg')}).get_json()
+    second = client.post('/api/upload_image', data={'image': (io.BytesIO(data), 'b.jpg')}).get_json()
+    digest = hashlib.sha256(data).hexdigest()
+    assert first == {'url': f'/uploads/{digest}.jpg', 'markdown': f'![a.jpg](/uploads/{digest}.jpg)'}
+    assert second['url'] == first['url']
+
+    response = client.get(first['url'])
+    assert response.data == data
+    assert response.headers['ETag'] == f'"{digest}"'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Last-Modified' in response.headers
+    assert client.get(first['url'], headers={'If-None-Match': f'"{digest}"'}).status_code == 304
+    partial = client.get(first['url'], headers={'Range': 'bytes=0-99'})
+    assert partial.status_code == 206 and partial.data == data[:100]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+增量渲染测试：复用未修改段的结果与完整渲染一致，只重新渲染修改过的段
+"""
+import io
+import os
+import time
+
+from PIL import Image
+from pptx import Presentation
+
+import app as app_module
+from benchmarks.suite import make_document
+from llm_cache import MemoryCache
+from md2ppt import MarkdownToPPT, sections_size
+from slide_ir import parse_document
+
+
+def slide_texts(data):
+    return [[shape.text_frame.text for shape in slide.shapes if shape.has_text_frame]
+            for slide in Presentation(io.BytesIO(data)).slides]
+
+
+def render(deck, cache=None):
+    converter = MarkdownToPPT()
+    if cache is None:
+        converter.render_ir(deck)
+        result = None
+    else:
+        result = converter.render_incremental(deck, cache)
+    output = io.BytesIO()
+    converter.save(output)
+    return output.getvalue(), result
+
+
+def test_incremental_matches_full_render():
+    document = '开头没有标题的段落\n\n' + make_document('outline', 8)
+    edited = document.replace('## 第3部分', '## 第3部分\n\n新增的一段', 1)
+    _, (cache, reused) = render(parse_document(document), {})
+    assert reused == 0
+
+    deck = parse_document(edited)
+    data, (_, reused) = render(deck, cache)
+    assert reused == len(deck) - 1
+    assert slide_texts(data) == slide_texts(render(deck)[0])
+
+
+def test_incremental_is_faster():
+    document = make_document('paragraphs', 60)
+    _, (cache, _) = render(parse_document(document), {})
+    deck = parse_document(document.replace('## 第30章', '## 第30章\n\n新增的一段', 1))
+
+    start = time.perf_counter()
+    render(deck)
+    full = time.perf_counter() - start
+    start = time.perf_counter()
+    render(deck, cache)
+    incremental = time.perf_counter() - start
+    assert incremental < full
+
+
+def test_cache_keeps_image_paths(tmp_path):
+    path = str(tmp_path / 'photo.png')
+    Image.new('RGB', (40, 30), 'red').save(path)
+    deck = parse_document('# 标题\n\n## 图片\n\n![图](photo.png)')
+    converter = MarkdownToPPT()
+    converter.set_image_dir(str(tmp_path))
+    cache, _ = converter.render_incremental(deck, {})
+
+    # 缓存中只有图片路径，没有图片内容
+    targets = [target for slides, _ in cache.values() for _, rels in slides for _, _, target in rels]
+    assert path in targets and not any(isinstance(target, bytes) for target in targets)
+    assert sections_size(cache) == sum(len(blob) for slides, _ in cache.values() for blob, _ in slides)
+
+    data, (_, reused) = render(deck, cache)
+    assert reused == len(deck)
+    with open(path, 'rb') as f:
+        assert Presentation(io.BytesIO(data)).slides[-1].shapes[-1].image.blob == f.read()
+
+    # 图片文件被清理后重新渲染该段
+    os.remove(path)
+    assert render(deck, cache)[1][1] == len(deck) - 1
+
+
+def test_section_cache_bounded_by_bytes():
+    cache = MemoryCache(max_size=10, ttl=60, max_bytes=10, sizeof=len)
+    for key in 'abc':
+        cache.set(key, key * 4)
+    assert cache.get('a') is None and cache.get('c') == 'cccc'
+    assert cache.stats()['bytes'] == 8
+    cache.set('big', 'x' * 20)
+    assert cache.get('big') is None and len(cache) == 2
+
+
+def test_generate_ppt_with_session():
+    client = app_module.app.test_client()
+    data = {'content': '# 标题\n\n## 第一章\n\n内容一\n\n## 第二章\n\n内容二', 'session_id': 'test-session'}
+    response = client.post('/api/generate_ppt', data=data)
+    assert response.headers['X-Sections-Reused'] == '0/3'
+
+    data['content'] = data['content'].replace('内容二', '修改后的内容')
+    response = client.post('/api/generate_ppt', data=data)
+    assert response.headers['X-Sections-Reused'] == '2/3'
+    assert slide_texts(response.data)[-1][-1] == '修改后的内容'
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+后台渲染任务测试：两种队列后端的优先级、客户端限额和结果淘汰，SQLite队列的租约，以及任务接口的提交和轮询（包括其他进程提交到共享队列的任务）
+"""
+import io
+import sqlite3
+import time
+
+import pytest
+from pptx import Presentation
+
+import app as app_module
+from jobs import (DONE, FAILED, PRIORITY_LARGE, PRIORITY_SMALL, QUEUED, RUNNING,
+                  JobQueueFull, JobRunner, MemoryJobQueue, SQLiteJobQueue)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_queue(request, tmp_path):
+    def make(**options):
+        if request.param == 'memory':
+            return MemoryJobQueue(**options)
+        return SQLiteJobQueue(str(tmp_path / 'jobs' / 'jobs.sqlite3'), poll_interval=0.01, **options)
+    return make
+
+
+def test_priority_and_client_limits(make_queue):
+    queue = make_queue(max_running_per_client=1, max_queued_per_client=2)
+    large = queue.submit({'n': 1}, client='a', priority=PRIORITY_LARGE)
+    small = queue.submit({'n': 2}, client='a', priority=PRIORITY_SMALL)
+    with pytest.raises(JobQueueFull):
+        queue.submit({'n': 3}, client='a')
+    other = queue.submit({'n': 4}, b'tpl', client='b')
+
+    # 小文档先被领取；客户端a已有一个运行中的任务，接下来只能领到b的任务
+    assert queue.claim(timeout=0)['id'] == small
+    job = queue.claim(timeout=0)
+    assert (job['id'], job['payload'], job['template']) == (other, {'n': 4}, b'tpl')
+    assert queue.claim(timeout=0) is None
+    # 只处理优先通道的线程领不到大文档
+    queue.finish(small, b'deck')
+    assert queue.claim((PRIORITY_SMALL,), timeout=0) is None
+    assert queue.claim(timeout=0)['id'] == large
+    assert queue.status(large)['status'] == RUNNING
+
+    queue.progress(large, sections_done=1, sections=3)
+    assert queue.status(large)['progress'] == {'sections_done': 1, 'sections': 3}
+    queue.fail(other, 'boom')
+    assert (queue.status(other)['status'], queue.status(other)['error']) == (FAILED, 'boom')
+    status = queue.status(small)
+    assert (status['status'], status['size']) == (DONE, 4)
+    assert queue.result(small) == b'deck'
+    assert queue.stats()[RUNNING] == 1
+
+
+def test_result_eviction(make_queue):
+    queue = make_queue(max_result_bytes=10, retention=60)
+    ids = [queue.submit({}) for _ in range(3)]
+    for job_id in ids:
+        queue.claim(timeout=0)
+        queue.finish(job_id, b'x' * 4)
+        time.sleep(0.01)
+    # 超出总大小上限，最早完成的结果被淘汰
+    assert queue.status(ids[0]) is None and queue.result(ids[0]) is None
+    assert queue.result(ids[2]) == b'xxxx'
+
+    queue.retention = 0
+    queue.submit({})
+    assert queue.status(ids[2]) is None
+    assert queue.stats()[QUEUED] == 1
+
+
+def test_runner_reports_progress(make_queue):
+    queue = make_queue()
+
+    def render(job, progress):
+        progress(step=1)
+        if job['payload'].get('fail'):
+            raise ValueError('bad input')
+        return job['payload']['text'].encode('utf-8')
+
+    runner = JobRunner(queue, render, workers=2)
+    runner.start()
+    try:
+        ok = queue.submit({'text': '完成'}, priority=PRIORITY_SMALL)
+        bad = queue.submit({'fail': True})
+        deadline = time.time() + 10
+        while time.time() < deadline and queue.stats()[QUEUED] + queue.stats()[RUNNING]:
+            time.sleep(0.01)
+    finally:
+        runner.stop(timeout=5)
+    assert queue.result(ok) == '完成'.encode('utf-8')
+    assert queue.status(ok)['progress'] == {'step': 1}
+    assert queue.status(bad)['error'] == 'bad input'
+
+
+def test_abandoned_job_is_reclaimed(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    crashed = SQLiteJobQueue(path, poll_interval=0.01, lease=0.1, max_attempts=2, max_running_per_client=1)
+    job_id = crashed.submit({'n': 1}, client='a')
+    other = crashed.submit({'n': 2}, client='a')
+    assert crashed.claim(timeout=0)['id'] == job_id
+    # 领取任务的进程退出，不再续约；租约过期前客户端a的运行名额一直被占用
+    queue = SQLiteJobQueue(path, poll_interval=0.01, lease=0.1, max_attempts=2, max_running_per_client=1)
+    assert queue.claim(timeout=0) is None
+    time.sleep(0.15)
+    assert queue.claim(timeout=0)['id'] == job_id
+    # 已经退出的领取者迟到的结果被忽略
+    crashed.finish(job_id, b'stale')
+    assert queue.status(job_id)['status'] == RUNNING
+
+    # 第二次也中断，领取次数用完后标记为失败，释放运行名额
+    time.sleep(0.15)
+    assert queue.claim(timeout=0)['id'] == other
+    assert queue.status(job_id)['status'] == FAILED and queue.result(job_id) is None
+
+
+def test_reads_do_not_wait_for_writers(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / 'jobs.sqlite3'), poll_interval=0.01)
+    job_id = queue.submit({})
+    writer = sqlite3.connect(queue.path, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        # 其他进程持有写锁时，查询状态不用等待
+        assert queue.status(job_id)['status'] == QUEUED
+        assert queue.result(job_id) is None
+        assert queue.stats()[QUEUED] == 1
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()
+
+
+def test_runner_renews_lease(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / 'jobs.sqlite3'), poll_interval=0.01, lease=0.15)
+
+    def render(job, progress):
+        time.sleep(0.5)
+        return b'deck'
+
+    runner = JobRunner(queue, render, workers=1)
+    runner.start()
+    try:
+        job_id = queue.submit({})
+        deadline = time.time() + 5
+        while time.time() < deadline and queue.status(job_id)['status'] == QUEUED:
+            time.sleep(0.01)
+        while time.time() < deadline and queue.status(job_id)['status'] != DONE:
+            # 其他进程领取任务时检查租约，续约中的任务不会被重新排队
+            assert SQLiteJobQueue(queue.path, lease=0.15).claim(timeout=0) is None
+            time.sleep(0.02)
+    finally:
+        runner.stop(timeout=5)
+    assert queue.result(job_id) == b'deck'
+
+
+def test_job_endpoints():
+    client = app_module.app.test_client()
+    content = '# 标题\n\n## 第一章\n\n内容\n\n## 第二章\n\n内容'
+    response = client.post('/api/jobs', data={'content': content}, headers={'X-Client-Id': 'test'})
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['priority'] == 'small'
+
+    deadline = time.time() + 30
+    while True:
+        status = client.get(body['status_url']).get_json()
+        if status['status'] in (DONE, FAILED) or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert status['status'] == DONE
+    assert status['progress']['sections_done'] == status['progress']['sections']
+
+    response = client.get(status['result_url'])
+    assert response.status_code == 200
+    prs = Presentation(io.BytesIO(response.data))
+    assert prs.slides[0].shapes[0].text_frame.text == '标题'
+
+    assert client.get('/api/jobs/missing').status_code == 404
+    assert client.post('/api/jobs', data={}).status_code == 400
+
+
+def test_shared_queue_runner_starts_on_poll(tmp_path, monkeypatch):
+    path = str(tmp_path / 'jobs.sqlite3')
+    queue = SQLiteJobQueue(path, poll_interval=0.01)
+    runner = JobRunner(queue, app_module.render_job, workers=1)
+    monkeypatch.setattr(app_module.config, 'JOB_QUEUE_BACKEND', 'sqlite')
+    monkeypatch.setattr(app_module, 'job_queue', queue)
+    monkeypatch.setattr(app_module, 'job_runner', runner)
+    # 其他进程提交的任务，本进程没有提交过任务
+    job_id = SQLiteJobQueue(path).submit({'content': '# 标题\n\n## 第一章\n\n内容'})
+
+    client = app_module.app.test_client()
+    try:
+        deadline = time.time() + 30
+        while True:
+            status = client.get(f'/api/jobs/{job_id}').get_json()
+            if status['status'] in (DONE, FAILED) or time.time() > deadline:
+                break
+            time.sleep(0.05)
+    finally:
+        runner.stop(timeout=5)
+    assert status['status'] == DONE
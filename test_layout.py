@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+排版测试：折行估算，以及超出幻灯片底部的内容自动分到续页
+"""
+from pptx.util import Inches, Pt
+
+from layout import char_width, text_height, wrap_lines
+from md2ppt import MarkdownToPPT
+
+PARAGRAPH = '人工智能是研究、开发用于模拟、延伸和扩展人的智能的理论、方法及应用系统的一门技术科学。' * 3
+
+
+def _shapes(converter):
+    for slide in converter.prs.slides:
+        for shape in slide.shapes:
+            yield slide, shape
+
+
+def _assert_inside(converter):
+    bottom = converter.prs.slide_height
+    for _, shape in _shapes(converter):
+        assert shape.top + shape.height <= bottom, shape.text_frame.text if shape.has_text_frame else shape
+
+
+def test_wrap_lines():
+    assert char_width('中') == 1.0 and char_width('i') < char_width('a') < char_width('M') < 1.0
+    assert char_width('a', monospace=True) == 0.6
+
+    width = Inches(9)
+    lines = wrap_lines(PARAGRAPH, Pt(18), width)
+    assert ''.join(lines) == PARAGRAPH
+    # 9英寸宽的文本框去掉内边距，18磅中文每行约35个字
+    assert [len(line) for line in lines[:-1]] == [35] * (len(lines) - 1)
+
+    english = 'The quick brown fox jumps over the lazy dog. ' * 8
+    lines = wrap_lines(english, Pt(18), width)
+    assert ''.join(lines) == english and len(lines) > 2
+    assert all(line.endswith(' ') for line in lines[:-1])
+
+    code = 'def f():\n    return 1\n'
+    assert wrap_lines(code, Pt(14), width, True) == ('def f():\n', '    return 1\n', '')
+    assert text_height(2, Pt(18)) == 2 * Pt(18) * 1.2 + Inches(0.1)
+
+
+def test_short_content_keeps_spacing():
+    converter = MarkdownToPPT()
+    converter.process_markdown('## 标题\n<p>第一段</p>\n<p>第二段</p>\n- 列表')
+    tops = [shape.top for _, shape in _shapes(converter)]
+    assert tops == [Inches(0.5), Inches(1.5), Inches(2), Inches(2.5)]
+
+
+def test_long_content_continues_on_new_slides():
+    converter = MarkdownToPPT()
+    converter.process_markdown('## 第一章\n' + '\n'.join(f'<p>{i}{PARAGRAPH}</p>' for i in range(12)))
+    _assert_inside(converter)
+    headings = [slide.shapes[0].text_frame.text for slide in converter.prs.slides]
+    assert headings[0] == '第一章' and len(headings) == 3
+    assert set(headings[1:]) == {'第一章（续）'}
+    # 段落不拆开，按顺序分布在各页
+    texts = [shape.text_frame.text for slide, shape in _shapes(converter) if shape != slide.shapes[0]]
+    assert texts == [f'{i}{PARAGRAPH}' for i in range(12)]
+
+
+def test_oversized_blocks_are_split():
+    long_text = PARAGRAPH * 12
+    code = '\n'.join(f'line_{i} = {i}' for i in range(60))
+    table = '| 名称 | 说明 |\n|---|---|\n' + '\n'.join(f'| 第{i}行 | {PARAGRAPH[:20]} |' for i in range(40))
+    converter = MarkdownToPPT()
+    converter.process_markdown(f'## 长内容\n<p>{long_text}</p>\n\n```\n{code}\n```\n\n{table}\n')
+    _assert_inside(converter)
+
+    texts, code_lines, table_rows = [], [], []
+    for slide, shape in _shapes(converter):
+        if shape.has_table:
+            rows = [[cell.text for cell in row.cells] for row in shape.table.rows]
+            assert rows[0] == ['名称', '说明']
+            table_rows.extend(rows[1:])
+        elif shape.text_frame.paragraphs[0].font.name == 'Courier New':
+            code_lines.append(shape.text_frame.text)
+        elif shape != slide.shapes[0]:
+            texts.append(shape.text_frame.text)
+    assert ''.join(texts) == long_text and len(texts) > 1
+    # 与HTML解析路径一致，代码块的 <pre> 和其中的 <code> 各渲染一次
+    assert '\n'.join(code_lines) == code + '\n' + code and len(code_lines) > 2
+    assert [row[0] for row in table_rows] == [f'第{i}行' for i in range(40)]
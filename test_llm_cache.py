@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+LLM响应缓存测试：提示词规范化、TTL、LRU淘汰，以及SSE回放
+"""
+import time
+
+import pytest
+
+import app as app_module
+from llm_cache import MemoryCache, SQLiteCache, cache_key
+from llm_client import LLMClient
+
+
+def test_cache_key_normalizes_whitespace():
+    options = {'temperature': 0.7}
+    a = cache_key('chat', 'm', [{'role': 'user', 'content': '\n    以 AI  为主题\n\n    生成标题\n'}], options)
+    b = cache_key('chat', 'm', [{'role': 'user', 'content': '以 AI 为主题\n生成标题'}], options)
+    assert a == b
+    assert a != cache_key('stream', 'm', [{'role': 'user', 'content': '以 AI 为主题\n生成标题'}], options)
+    assert a != cache_key('chat', 'm', [{'role': 'user', 'content': '以 AI 为主题\n生成标题'}], {'temperature': 0})
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_ttl_and_lru(backend, tmp_path):
+    def make(ttl):
+        if backend == 'memory':
+            return MemoryCache(max_size=2, ttl=ttl)
+        return SQLiteCache(str(tmp_path / f'cache{ttl}.sqlite3'), max_size=2, ttl=ttl)
+
+    cache = make(60)
+    cache.set('a', '1')
+    cache.set('b', ['x', 'y'])
+    assert cache.get('a') == '1'
+    time.sleep(0.01)
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.stats()['hits'] == 3
+    assert cache.stats()['misses'] == 1
+
+    cache = make(0.05)
+    cache.set('a', '1')
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    path = str(tmp_path / 'llm_cache.sqlite3')
+    SQLiteCache(path).set('key', ['你好', '世界'])
+    assert SQLiteCache(path).get('key') == ['你好', '世界']
+
+
+def test_endpoints_replay_from_cache(fake_llm_server, monkeypatch):
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    monkeypatch.setattr(app_module, 'llm_cache', MemoryCache())
+    client = app_module.app.test_client()
+
+    outlines = [client.post('/api/generate_outline', json={'title': '测试'}).get_data() for _ in range(2)]
+    assert outlines[0] == outlines[1]
+    topics = [client.post('/api/generate_topics', json={'role': '老师', 'title': '测试', 'topicNum': 1}).get_json()
+              for _ in range(2)]
+    assert topics[0] == topics[1] == {'topics': ['你好，世界']}
+
+    assert len(fake_llm_server.requests) == 2
+    stats = client.get('/api/stats').get_json()['llm_cache']
+    assert (stats['hits'], stats['misses']) == (2, 2)
+
+    # 正文每次按新大纲生成，不走缓存
+    client.post('/api/generate_content', json={'outline': '# 测试'}).get_data()
+    client.post('/api/generate_content', json={'outline': '# 测试'}).get_data()
+    assert len(fake_llm_server.requests) == 4
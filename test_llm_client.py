@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+LLM客户端测试：连接复用、超时、并发限制，以及SSE接口
+"""
+import threading
+
+import pytest
+
+import app as app_module
+from llm_client import LLMBusyError, LLMClient, LLMError
+from metrics import LLM_TOKENS, LLM_TOKENS_PER_SECOND
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def test_chat_and_stream_reuse_connection(fake_llm_server):
+    client = LLMClient(fake_llm_server.url, 'test-model')
+    for _ in range(3):
+        assert client.chat(MESSAGES, temperature=0.5) == '你好，世界'
+        assert ''.join(client.stream_chat(MESSAGES)) == '你好，世界'
+
+    assert fake_llm_server.connections == 1
+    assert fake_llm_server.requests[0]['model'] == 'test-model'
+    assert fake_llm_server.requests[0]['temperature'] == 0.5
+    stats = client.stats()
+    assert stats['requests_total'] == 6
+    assert stats['in_flight'] == 0
+
+
+def test_read_timeout(fake_llm_server):
+    fake_llm_server.delay = 0.5
+    client = LLMClient(fake_llm_server.url, 'test-model', read_timeout=0.1)
+    with pytest.raises(LLMError):
+        client.chat(MESSAGES)
+    with pytest.raises(LLMError):
+        list(client.stream_chat(MESSAGES))
+    assert client.stats()['errors_total'] == 2
+    assert client.stats()['in_flight'] == 0
+
+
+def test_stream_close_is_not_an_error(fake_llm_server):
+    client = LLMClient(fake_llm_server.url, 'test-model')
+    tokens = LLM_TOKENS.value('stream')
+    observed = LLM_TOKENS_PER_SECOND.snapshot()[0]
+
+    # 调用方读了三个增量块后关闭，不算失败，只统计已生成的token
+    chunks = client.stream_chat(MESSAGES)
+    assert [next(chunks) for _ in range(3)] == ['你', '好', '，']
+    chunks.close()
+    assert client.stats()['errors_total'] == 0 and client.stats()['in_flight'] == 0
+    assert LLM_TOKENS.value('stream') == tokens + 3
+    assert LLM_TOKENS_PER_SECOND.snapshot()[0] == observed + 1
+
+    # 失败的请求不计入token数
+    fake_llm_server.failures = 1
+    with pytest.raises(LLMError):
+        list(client.stream_chat(MESSAGES))
+    assert client.stats()['errors_total'] == 1
+    assert LLM_TOKENS.value('stream') == tokens + 3
+def test_inflight_limit_queues_requests(fake_llm_server):
+    fake_llm_server.delay = 0.02
+    client = LLMClient(fake_llm_server.url, 'test-model', max_inflight=2)
+    results = []
+
+    def consume():
+        results.append(''.join(client.stream_chat(MESSAGES)))
+
+    threads = [threading.Thread(target=consume) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['你好，世界'] * 6
+    assert fake_llm_server.max_active <= 2
+    assert client.stats()['max_waiting'] >= 1
+
+
+def test_queue_timeout_rejects(fake_llm_server):
+    fake_llm_server.delay = 0.1
+    client = LLMClient(fake_llm_server.url, 'test-model', max_inflight=1, queue_timeout=0.05)
+    stream = client.stream_chat(MESSAGES)
+    next(stream)
+    with pytest.raises(LLMBusyError):
+        client.chat(MESSAGES)
+    stream.close()
+    assert client.stats()['rejected_total'] == 1
+    assert client.chat(MESSAGES) == '你好，世界'
+
+
+def test_sse_endpoint(fake_llm_server, monkeypatch):
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    monkeypatch.setattr(app_module, 'llm_cache', None)
+    client = app_module.app.test_client()
+    response = client.post('/api/generate_outline', json={'title': '测试'})
+    body = response.get_data(as_text=True)
+    assert body.count('"content"') == len('你好，世界')
+    assert body.endswith('data: [DONE]\n\n')
+
+    response = client.post('/api/generate_topics', json={'role': '老师', 'title': '测试', 'topicNum': 1})
+    assert response.get_json() == {'topics': ['你好，世界']}
+    assert client.get('/api/stats').get_json()['llm']['requests_total'] == 2
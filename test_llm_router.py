@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+多后端LLM路由测试：按未完成请求数分配、失败换后端重试、熔断、主动健康检查和对冲请求
+"""
+import threading
+import time
+
+import pytest
+
+import app as app_module
+from llm_client import LLMError
+from llm_router import CLOSED, OPEN, LLMRouter
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def make_router(servers, **options):
+    options.setdefault('health_interval', 0)
+    return LLMRouter([server.url for server in servers], 'test-model', **options)
+
+
+def test_least_outstanding_balancing(fake_llm_servers):
+    slow, fast, other = fake_llm_servers
+    slow.delay = 0.3
+    router = make_router([slow, fast])
+
+    # 慢的后端上有未完成的请求时，新请求都分配到快的后端
+    thread = threading.Thread(target=router.chat, args=(MESSAGES,))
+    thread.start()
+    time.sleep(0.05)
+    for _ in range(5):
+        assert router.chat(MESSAGES) == '你好，世界'
+    thread.join()
+    assert len(slow.requests) == 1 and len(fast.requests) == 5
+
+    # 同时进行的请求平均分配
+    other.delay = 0.3
+    router = make_router([slow, other])
+    threads = [threading.Thread(target=router.chat, args=(MESSAGES,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(slow.requests) == 3 and len(other.requests) == 2
+    stats = router.stats()
+    assert stats['requests_total'] == 4
+    assert all(backend['outstanding'] == 0 for backend in stats['backends'])
+
+
+def test_retry_on_another_backend(fake_llm_servers):
+    failing, healthy, _ = fake_llm_servers
+    router = make_router([failing, healthy])
+    failing.failures = 2
+    assert router.chat(MESSAGES) == '你好，世界'
+    assert ''.join(router.stream_chat(MESSAGES)) == '你好，世界'
+    stats = router.stats()
+    assert stats['retries_total'] == 2
+    assert len(failing.requests) == 2 and len(healthy.requests) == 2
+
+    # 所有后端都失败时返回最后一次的错误
+    failing.failures = healthy.failures = 1
+    with pytest.raises(LLMError):
+        router.chat(MESSAGES)
+
+
+def test_circuit_breaker(fake_llm_servers):
+    failing, healthy, _ = fake_llm_servers
+    router = make_router([failing, healthy], failure_threshold=2, open_seconds=0.2)
+    failing.failures = 100
+    for _ in range(6):
+        assert router.chat(MESSAGES) == '你好，世界'
+    # 连续失败两次后熔断，之后的请求不再发往失败的后端
+    assert len(failing.requests) == 2
+    assert router.stats()['backends'][0]['state'] == OPEN
+    assert router.stats()['circuit_opens_total'] == 1
+
+    # 熔断时长过后放行一个试探请求，成功后恢复
+    failing.failures = 0
+    time.sleep(0.25)
+    for _ in range(4):
+        router.chat(MESSAGES)
+    assert len(failing.requests) >= 3
+    assert router.stats()['backends'][0]['state'] == CLOSED
+
+
+def test_active_health_check(fake_llm_servers):
+    down, up, _ = fake_llm_servers
+    down.healthy = False
+    router = make_router([down, up], health_interval=0.05)
+    try:
+        router.chat(MESSAGES)
+        time.sleep(0.15)
+        assert down.health_checks >= 1
+        assert router.stats()['available_backends'] == 1
+        count = len(down.requests)
+        for _ in range(4):
+            router.chat(MESSAGES)
+        assert len(down.requests) == count
+
+        down.healthy = True
+        time.sleep(0.15)
+        assert router.stats()['available_backends'] == 2
+        for _ in range(4):
+            router.chat(MESSAGES)
+        assert len(down.requests) > count
+    finally:
+        router.close()
+
+
+def test_hedged_chat(fake_llm_servers, monkeypatch):
+    slow, fast, _ = fake_llm_servers
+    slow.delay = 1.0
+    fast.reply = '标题一\n标题二'
+    router = make_router([slow, fast], hedge_delay=0.05)
+
+    start = time.perf_counter()
+    result = {}
+    assert router.hedged_chat(MESSAGES, result) == '标题一\n标题二'
+    assert time.perf_counter() - start < 0.5
+    assert result['finish_reason'] == 'stop'
+    assert router.stats()['hedged_total'] == 1
+
+    # /api/generate_topics 使用对冲调用
+    router = make_router([slow, fast], hedge_delay=0.05)
+    monkeypatch.setattr(app_module, 'llm_client', router)
+    monkeypatch.setattr(app_module, 'llm_cache', None)
+    start = time.perf_counter()
+    response = app_module.app.test_client().post('/api/generate_topics', json={
+        'role': '讲师', 'title': '人工智能', 'topicNum': 2})
+    assert response.get_json()['topics'] == ['标题一', '标题二']
+    assert time.perf_counter() - start < 0.5
+    assert 'pptgenius_llm_backend1_requests_total' in app_module.app.test_client().get('/metrics').get_data(as_text=True)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+低内存渲染测试：结果与普通模式一致、流式保存、峰值内存不随页数增长
+"""
+import io
+import threading
+import zipfile
+
+import pytest
+from pptx import Presentation
+
+import app as app_module
+import config
+from benchmarks.suite import make_document, make_images_dir, run_case_subprocess
+from low_memory import stream_save
+from md2ppt import MarkdownToPPT
+
+
+def deck_shapes(data):
+    shapes = []
+    for slide in Presentation(io.BytesIO(data)).slides:
+        for shape in slide.shapes:
+            shapes.append((shape.shape_type, shape.left, shape.top, shape.width, shape.height,
+                           shape.text_frame.text if shape.has_text_frame else None,
+                           shape.image.sha1 if shape.shape_type == 13 else None))
+    return shapes
+
+
+def test_low_memory_matches_normal_render(tmp_path):
+    image_dir = make_images_dir(str(tmp_path))
+    document = make_document('images', 12) + make_document('tables', 5)
+    outputs = []
+    for low_memory in (False, True):
+        converter = MarkdownToPPT(low_memory=low_memory)
+        converter.set_image_dir(image_dir)
+        converter.process_markdown(document)
+        outputs.append(b''.join(converter.stream(chunk_size=1024)))
+    assert deck_shapes(outputs[0]) == deck_shapes(outputs[1])
+    # 同一图片只嵌入一次
+    media = [name for name in zipfile.ZipFile(io.BytesIO(outputs[1])).namelist() if name.startswith('ppt/media/')]
+    assert len(media) == len(set(shape[-1] for shape in deck_shapes(outputs[1]) if shape[-1]))
+
+
+def test_stream_save_errors_and_close():
+    def fail(output):
+        output.write(b'x' * 10)
+        raise RuntimeError('保存失败')
+
+    with pytest.raises(RuntimeError):
+        list(stream_save(fail, chunk_size=4))
+
+    def endless(output):
+        while True:
+            output.write(b'x' * 1024)
+
+    chunks = stream_save(endless, chunk_size=1024, max_chunks=2)
+    assert next(chunks) == b'x' * 1024
+    # 关闭后保存线程停止
+    chunks.close()
+
+
+def test_generate_ppt_streams_large_decks(monkeypatch):
+    monkeypatch.setattr(config, 'LOW_MEMORY_MIN_SLIDES', 3)
+    client = app_module.app.test_client()
+    response = client.post('/api/generate_ppt', data={'content': make_document('paragraphs', 5)})
+    assert response.status_code == 200 and response.is_streamed
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert len(Presentation(io.BytesIO(response.data)).slides) >= 5
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_streamed_save_holds_render_slot(monkeypatch, cached):
+    monkeypatch.setattr(config, 'LOW_MEMORY_MIN_SLIDES', 3)
+    monkeypatch.setattr(app_module, 'render_slots', threading.BoundedSemaphore(1))
+    if not cached:
+        monkeypatch.setattr(app_module, 'result_cache', None)
+    client = app_module.app.test_client()
+    response = client.post('/api/generate_ppt', data={'content': make_document('paragraphs', 5)})
+    assert response.is_streamed
+
+    # 保存（压缩）还没有完成时渲染槽仍被占用
+    assert not app_module.render_slots.acquire(blocking=False)
+    assert len(Presentation(io.BytesIO(response.data)).slides) >= 5
+    response.close()
+    assert app_module.render_slots.acquire(blocking=False)
+
+
+def test_peak_memory_is_flat(tmp_path):
+    image_dir = make_images_dir(str(tmp_path))
+    small = run_case_subprocess('images', 50, 1, image_dir, low_memory=True)
+    large = run_case_subprocess('images', 300, 1, image_dir, low_memory=True)
+    assert large['slides'] == 300
+    assert large['peak_rss_mb'] - small['peak_rss_mb'] < 5
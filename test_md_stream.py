@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+流式Markdown解析器与HTML解析路径的一致性测试
+"""
+import os
+import random
+
+from lxml import etree
+
+from md2ppt import MarkdownToPPT, iter_html_elements
+from md_stream import UnsupportedMarkdown, parse_elements
+
+# 接近LLM实际输出的文档，流式解析器必须能直接处理
+LLM_CONTENT = """# 人工智能发展简介
+## 第一章 人工智能概述
+### 定义与范畴
+<p>人工智能（AI）是研究、开发用于模拟、延伸和扩展人的智能的理论、方法及应用系统的一门技术科学。</p>
+### 发展历程
+<p>从1956年达特茅斯会议至今，人工智能经历了三次浪潮，&amp; 每一次都伴随着<b>算法</b>与算力的突破。</p>
+
+## 第二章 关键技术
+- 机器学习：让计算机从**数据**中学习
+- 深度学习：基于多层`神经网络`
+1. 第一步
+2. 第二步
+继续第二步
+
+| 技术 | 应用 | 成熟度 |
+|:---|:---:|---:|
+| NLP | 对话 | 高 |
+| CV | *识别* |
+| 语音 | 合成 | 中 | 多余 |
+
+```python
+# 训练模型
+model.fit(X, y)
+```
+
+    indented_code = True
+
+![架构图](/uploads/arch.png)
+
+> 引用：AI将改变[世界](https://example.com)。
+
+段落第一行
+段落第二行
+## 总结
+<p>人工智能的未来。</p> 补充说明
+"""
+
+CORPUS = [
+    open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example.md'), encoding='utf-8').read(),
+    LLM_CONTENT,
+    "",
+    "纯文本，没有标题",
+    "## 标题\n段落紧跟标题\n### 小节\n<p>a</p>\n<p>b</p>",
+    "# 标题 #\n#没有空格\n#### 四级标题不生成元素 ![图](a.png)",
+    "设置标题\n===\n\n二级\n---\n\n***\n\n正文",
+    "## 转义 \\# 与代码\n\\*不是强调\\* a\\_b \\[注\\] C:\\temp `x = 1` 和 `y`\n\n"
+    "| 名称 | 公式 |\n|---|---|\n| a\\|b | 1 \\| 2 \\\\ ![图](c.png) |\n\n- 列表 `code` 项",
+]
+
+WORDS = ['数据', '分析', 'hello', '**加粗**', '*斜体*', '`code`', '[链接](http://a.com)',
+         '![图](img/a.png)', 'a_b', '&amp;', '<b>粗</b>', 'x  ', '__强__', '&lt;', '<br>',
+         '\\|', '\\*', 'a\\_b', '\\[注\\]', '\\\\', 'C:\\temp', '\\`']
+
+
+def _random_line(r):
+    text = ' '.join(r.choice(WORDS) for _ in range(r.randint(1, 4)))
+    return r.choice([
+        '# ' + text, '## ' + text, '### ' + text, text, text, '- ' + text, '1. ' + text,
+        '', '', '<p>' + text + '</p>', '```\nprint(1)\n# 注释\n```', '    code',
+        '| a | b |\n|---|---|\n| ' + text + ' | 2 |', '> ' + text, '---', '<div>x</div>',
+        '- a\n    - nested', '\\*转义',
+    ])
+
+
+def _slides_xml(converter):
+    return [etree.tostring(slide._element) for slide in converter.prs.slides]
+
+
+def test_corpus_matches_html_path():
+    for doc in CORPUS:
+        assert parse_elements(doc) == list(iter_html_elements(doc)), doc
+
+
+def test_random_documents_match_or_fall_back():
+    supported = 0
+    for seed in range(500):
+        r = random.Random(seed)
+        doc = '\n'.join(_random_line(r) for _ in range(r.randint(1, 10)))
+        try:
+            elements = parse_elements(doc)
+        except UnsupportedMarkdown:
+            continue
+        supported += 1
+        assert elements == list(iter_html_elements(doc)), doc
+    assert supported > 100
+
+
+def test_excel_table_with_pipes_uses_stream_parser():
+    import pandas as pd
+    from excel_table import dataframe_to_markdown
+
+    doc = dataframe_to_markdown(pd.DataFrame({'条件': ['a|b', 'c'], '值': ['x \\ y', '|']}))
+    elements = parse_elements(doc)
+    assert elements == list(iter_html_elements(doc))
+    assert elements[0][1][1:] == [['a|b', 'x \\ y'], ['c', '|']]
+def test_unsupported_markdown_falls_back():
+    doc = "## 标题\n\n- a\n    - 嵌套\n\n<div>原始HTML</div>"
+    try:
+        parse_elements(doc)
+    except UnsupportedMarkdown:
+        pass
+    else:
+        raise AssertionError('nested list should not be handled by the stream parser')
+
+    stream = MarkdownToPPT()
+    stream.process_markdown(doc)
+    reference = MarkdownToPPT()
+    reference.process_markdown_html(doc)
+    assert _slides_xml(stream) == _slides_xml(reference)
+
+
+def test_decks_match_html_path():
+    for doc in CORPUS:
+        stream = MarkdownToPPT()
+        stream.set_image_dir('images')
+        stream.process_markdown(doc)
+        reference = MarkdownToPPT()
+        reference.set_image_dir('images')
+        reference.process_markdown_html(doc)
+        assert _slides_xml(stream) == _slides_xml(reference), doc
+
+
+if __name__ == "__main__":
+    test_corpus_matches_html_path()
+    test_random_documents_match_or_fall_back()
+    test_unsupported_markdown_falls_back()
+    test_decks_match_html_path()
+    print("OK")
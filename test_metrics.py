@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+运行指标测试：直方图输出格式、转换和LLM调用的耗时记录、/metrics 接口和按请求的cProfile
+"""
+import io
+import os
+import pstats
+
+import app as app_module
+import config
+from llm_client import LLMClient
+from md2ppt import MarkdownToPPT
+from metrics import (ELEMENT_SECONDS, LLM_FIRST_TOKEN_SECONDS, LLM_TOKENS_PER_SECOND,
+                     STAGE_SECONDS, Registry)
+
+
+def test_histogram_prometheus_format():
+    registry = Registry()
+    histogram = registry.histogram('demo_seconds', 'Demo', ('stage',), buckets=(0.1, 1))
+    histogram.observe(0.05, 'parse')
+    histogram.observe(0.5, 'parse')
+    histogram.observe(5, 'parse')
+    registry.counter('demo_total', 'Demo').inc(2)
+    text = registry.render({'demo_in_flight': ('Demo gauge', 3)})
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'demo_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="parse"} 3' in text
+    assert 'demo_seconds_sum{stage="parse"} 5.55' in text
+    assert 'demo_total 2' in text
+    assert '# TYPE demo_in_flight gauge\ndemo_in_flight 3' in text
+
+
+def test_conversion_stages_are_timed():
+    before = {name: STAGE_SECONDS.snapshot(name)[0] for name in ('parse', 'render', 'save')}
+    paragraphs = ELEMENT_SECONDS.snapshot('p')[0]
+    converter = MarkdownToPPT()
+    converter.process_markdown('# 标题\n\n## 章节\n\n第一段\n\n第二段')
+    converter.save(io.BytesIO())
+    for name, count in before.items():
+        assert STAGE_SECONDS.snapshot(name)[0] == count + 1
+    assert ELEMENT_SECONDS.snapshot('p')[0] == paragraphs + 2
+
+
+def test_llm_stream_metrics(fake_llm_server):
+    first_tokens = LLM_FIRST_TOKEN_SECONDS.snapshot()[0]
+    rates = LLM_TOKENS_PER_SECOND.snapshot()[0]
+    client = LLMClient(fake_llm_server.url, 'test-model')
+    assert ''.join(client.stream_chat([{'role': 'user', 'content': '你好'}])) == '你好，世界'
+    assert LLM_FIRST_TOKEN_SECONDS.snapshot()[0] == first_tokens + 1
+    assert LLM_TOKENS_PER_SECOND.snapshot()[0] == rates + 1
+
+
+def test_metrics_endpoint_and_profile(tmp_path, monkeypatch):
+    client = app_module.app.test_client()
+    client.post('/api/generate_ppt', data={'content': '# 标题\n\n## 章节\n\n内容'})
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'pptgenius_stage_seconds_count{stage="save"}' in text
+    assert 'pptgenius_http_request_seconds_count{endpoint="generate_ppt",status="200"}' in text
+    assert 'pptgenius_llm_in_flight 0' in text
+
+    # 未开启时忽略profile参数
+    response = client.post('/api/generate_ppt?profile=1', data={'content': '# 标题'})
+    assert 'X-Profile-File' not in response.headers
+
+    monkeypatch.setattr(config, 'PROFILE_ENABLED', True)
+    monkeypatch.setattr(app_module, 'PROFILE_FOLDER', str(tmp_path))
+    response = client.post('/api/generate_ppt', data={'content': '# 性能分析'}, headers={'X-Profile': '1'})
+    assert response.status_code == 200
+    path = os.path.join(str(tmp_path), response.headers['X-Profile-File'])
+    functions = {name for _, _, name in pstats.Stats(path).stats}
+    assert 'render_ir' in functions
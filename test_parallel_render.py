@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+多进程并行渲染与串行渲染的一致性测试
+"""
+import io
+import zipfile
+
+from PIL import Image
+
+from md2ppt import MarkdownToPPT
+
+
+def _render(md_text, image_dir, workers):
+    converter = MarkdownToPPT()
+    converter.set_image_dir(image_dir)
+    converter.process_markdown(md_text, workers=workers)
+    output = io.BytesIO()
+    converter.save(output)
+    return zipfile.ZipFile(output)
+
+
+def test_parallel_output_matches_serial(tmp_path):
+    for i in range(3):
+        Image.new('RGB', (200 + i * 50, 100), (i * 80, 0, 0)).save(tmp_path / f'p{i}.png')
+    md_text = "开场白，第一个标题之前的内容\n\n# 封面\n\n" + "".join(
+        f"## 第{i}章\n<p>段落{i}</p>\n- 要点\n\n![图](p{i % 3}.png)\n\n"
+        f"| a | b |\n|---|---|\n| {i} | 2 |\n\n```\ncode\n```\n"
+        for i in range(20)
+    )
+
+    serial = _render(md_text, str(tmp_path), 1)
+    parallel = _render(md_text, str(tmp_path), 3)
+
+    assert sorted(serial.namelist()) == sorted(parallel.namelist())
+    for name in serial.namelist():
+        assert serial.read(name) == parallel.read(name), name
+
+
+def test_parallel_continues_current_slide():
+    converter = MarkdownToPPT()
+    converter.process_markdown("## 第一页\n\n内容")
+    converter.process_markdown("接着第一页的内容\n\n## 第二页\n\n## 第三页", workers=2)
+    assert len(converter.prs.slides) == 3
+    assert len(converter.prs.slides[0].shapes) == 3
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+生成结果缓存测试：按大小淘汰最久没有使用的文件、相同请求返回缓存和ETag、并发的相同请求只渲染一次
+"""
+import os
+import threading
+import time
+
+import app as app_module
+from result_cache import DiskCache, KeyedLocks
+
+
+def add(cache, key, size):
+    path = cache.tmp_path()
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return cache.add(key, path)
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250)
+    add(cache, 'aa1', 100)
+    add(cache, 'bb2', 100)
+    # 文件的修改时间即最近使用时间，打开时更新
+    os.utime(cache.path('aa1'), (time.time() - 120, time.time() - 120))
+    os.utime(cache.path('bb2'), (time.time() - 90, time.time() - 90))
+    cache.open('aa1').close()
+    add(cache, 'cc3', 100)
+    assert cache.open('bb2') is None
+    assert not os.path.exists(cache.path('bb2'))
+    assert cache.stats()['bytes'] == 200 and cache.stats()['evictions'] == 1
+
+    # 重新打开时按文件的使用时间恢复顺序
+    os.utime(cache.path('aa1'), (time.time() - 60, time.time() - 60))
+    reopened = DiskCache(str(tmp_path), max_bytes=250)
+    assert len(reopened) == 2
+    add(reopened, 'dd4', 100)
+    assert reopened.open('aa1') is None
+    with reopened.open('cc3') as f:
+        assert f.read() == b'x' * 100
+
+
+def test_disk_cache_budget_shared_by_processes(tmp_path):
+    # 两个进程（两个实例）共享目录，按目录中的总大小淘汰
+    first = DiskCache(str(tmp_path), max_bytes=250)
+    second = DiskCache(str(tmp_path), max_bytes=250)
+    for i in range(3):
+        add(first, 'a%d' % i, 100)
+        add(second, 'b%d' % i, 100)
+    files = [name for _, _, names in os.walk(str(tmp_path)) for name in names if name.endswith('.pptx')]
+    assert len(files) == 2 and 'b2.pptx' in files
+    assert second.stats()['bytes'] == 200
+    assert first.stats()['evictions'] + second.stats()['evictions'] == 4
+
+
+def test_keyed_locks_serialize_same_key():
+    locks = KeyedLocks()
+    active = []
+    overlap = []
+
+    def run(key):
+        with locks.hold(key):
+            active.append(key)
+            overlap.append(active.count(key))
+            time.sleep(0.05)
+            active.remove(key)
+
+    threads = [threading.Thread(target=run, args=(key,)) for key in ('a', 'a', 'a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(overlap) == 1
+    assert locks.waited == 2 and not locks._locks
+
+
+def test_generate_ppt_result_cache(monkeypatch):
+    renders = []
+    render_deck = app_module.render_deck
+
+    def slow_render(*args, **kwargs):
+        renders.append(1)
+        time.sleep(0.2)
+        return render_deck(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, 'render_deck', slow_render)
+    client = app_module.app.test_client()
+    data = {'content': '# 标题\n\n## 章节\n\n缓存的内容'}
+
+    responses = []
+
+    def post():
+        responses.append(app_module.app.test_client().post('/api/generate_ppt', data=data))
+
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(renders) == 1
+    assert sorted(response.headers['X-Cache'] for response in responses) == ['HIT', 'HIT', 'HIT', 'MISS']
+    assert len({response.data for response in responses}) == 1
+    etag = responses[0].headers['ETag']
+
+    assert client.post('/api/generate_ppt', data=data, headers={'If-None-Match': etag}).status_code == 304
+    changed = client.post('/api/generate_ppt', data={'content': data['content'] + '\n\n新段落'})
+    assert changed.headers['X-Cache'] == 'MISS' and changed.headers['ETag'] != etag
+    assert len(renders) == 2
+
+
+def test_low_memory_response_streams_into_cache(monkeypatch):
+    monkeypatch.setattr(app_module.config, 'LOW_MEMORY_MIN_SLIDES', 1)
+    client = app_module.app.test_client()
+    data = {'content': '# 标题\n\n## 章节\n\n低内存模式的内容'}
+
+    # 边保存边发送，发送完成后写入缓存
+    response = client.post('/api/generate_ppt', data=data)
+    assert response.headers['X-Cache'] == 'MISS' and 'Content-Length' not in response.headers
+    streamed = response.data
+    response.close()
+    assert not app_module.result_flights._locks
+    assert len(app_module.result_cache) == 1
+
+    cached = client.post('/api/generate_ppt', data=data)
+    assert cached.headers['X-Cache'] == 'HIT' and cached.data == streamed
+    assert cached.headers['ETag'] == response.headers['ETag']
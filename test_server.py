@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+生产环境服务测试：gunicorn配置
+"""
+import config
+from server import gunicorn_options
+
+
+def test_gunicorn_options(monkeypatch):
+    monkeypatch.setattr(config, 'SERVE_WORKERS', None)
+    options = gunicorn_options(port=8000, threads=8)
+    assert options['bind'] == '0.0.0.0:8000'
+    assert options['worker_class'] == 'gthread'
+    assert options['workers'] >= 1
+    assert options['threads'] == 8
+    assert options['graceful_timeout'] == config.SERVE_GRACEFUL_TIMEOUT
+    assert callable(options['post_worker_init']) and callable(options['worker_exit'])
+
+    options = gunicorn_options(workers=3, graceful_timeout=5)
+    assert (options['workers'], options['graceful_timeout']) == (3, 5)
+    assert options['threads'] == config.SERVE_THREADS
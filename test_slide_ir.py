@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+幻灯片IR测试：分页、序列化往返、从IR渲染与直接渲染一致，以及预览接口
+"""
+import io
+import pickle
+
+import pytest
+from pptx import Presentation
+
+import app as app_module
+import slide_ir
+from md2ppt import MarkdownToPPT
+
+DOC = '''开头的段落
+
+# 标题
+
+## 第一章
+
+- 要点一
+- 要点二
+
+| 名称 | 数值 |
+|---|---|
+| a | 1 |
+| b | 2 |
+
+## 第二章
+
+![图](a.png)
+
+```
+code
+```
+'''
+
+
+def _texts(converter):
+    return [[shape.text_frame.text for shape in slide.shapes if shape.has_text_frame]
+            for slide in converter.prs.slides]
+
+
+def test_slides_and_roundtrip():
+    deck = slide_ir.parse_document(DOC)
+    assert [(slide.level, slide.title) for slide in deck.slides] == [(0, ''), (1, '标题'), (2, '第一章'), (2, '第二章')]
+    assert deck.slides[2].elements[2] == ('table', (('名称', '数值'), ('a', '1'), ('b', '2')))
+    assert deck.slides[2].preview()['elements'][2] == {'type': 'table', 'header': ['名称', '数值'], 'rows': 2}
+
+    assert slide_ir.loads(slide_ir.dumps(deck)) == deck
+    assert pickle.loads(pickle.dumps(deck)) == deck
+    # 紧凑格式比HTML小
+    assert len(slide_ir.dumps(deck)) < len(DOC.encode('utf-8')) * 2
+
+
+def test_msgpack_roundtrip():
+    pytest.importorskip('msgpack')
+    deck = slide_ir.parse_document(DOC)
+    assert slide_ir.loads(slide_ir.dumps(deck, 'msgpack'), 'msgpack') == deck
+
+
+def test_render_from_ir_matches_markdown():
+    direct = MarkdownToPPT()
+    direct.process_markdown(DOC)
+    from_ir = MarkdownToPPT()
+    from_ir.render_ir(slide_ir.loads(slide_ir.dumps(slide_ir.parse_document(DOC))))
+    assert _texts(from_ir) == _texts(direct)
+
+
+def test_preview_then_generate_by_ir_id():
+    client = app_module.app.test_client()
+    response = client.post('/api/preview', json={'content': DOC})
+    body = response.get_json()
+    assert [slide['title'] for slide in body['slides']] == ['', '标题', '第一章', '第二章']
+    assert body['ir_id'] == slide_ir.content_id(DOC)
+
+    response = client.post('/api/preview?format=ir', data={'content': DOC})
+    assert slide_ir.loads(response.data) == slide_ir.parse_document(DOC)
+
+    hits = app_module.ir_cache.hits
+    response = client.post('/api/generate_ppt', data={'ir_id': body['ir_id']})
+    assert response.status_code == 200
+    assert app_module.ir_cache.hits == hits + 1
+    prs = Presentation(io.BytesIO(response.data))
+    assert prs.slides[1].shapes[0].text_frame.text == '标题'
+
+    assert client.post('/api/generate_ppt', data={'ir_id': 'missing'}).status_code == 404
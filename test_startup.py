@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+启动测试：导入app时不加载渲染依赖，预热后加载完成并注册模板
+"""
+import json
+import os
+import subprocess
+import sys
+
+from pptx import Presentation
+
+HEAVY_MODULES = ('pandas', 'pptx', 'bs4', 'markdown', 'md2ppt')
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _loaded_modules(code):
+    script = ('import sys, config\n'
+              + code +
+              f'\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))')
+    output = subprocess.run([sys.executable, '-c', 'import json\n' + script], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE).stdout
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def test_app_import_is_lazy():
+    assert _loaded_modules('import app') == []
+
+
+def test_warmup_loads_dependencies_and_templates(tmp_path):
+    template = str(tmp_path / 'template.pptx')
+    Presentation().save(template)
+    code = (f'config.WARMUP_TEMPLATES = [{template!r}]\n'
+            'import app\n'
+            'app.warmup()\n'
+            'assert len(app.template_cache) == 1')
+    assert _loaded_modules(code) == list(HEAVY_MODULES)
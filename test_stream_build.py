@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+边生成边渲染测试：按段渲染的结果与整篇渲染相同，每段渲染占用渲染名额
+"""
+import io
+import json
+import threading
+
+from pptx import Presentation
+
+import app as app_module
+from llm_client import LLMClient
+from md2ppt import MarkdownToPPT
+from md_stream import SectionBuffer
+from test_md_stream import CORPUS, _slides_xml
+
+FENCED = "# 标题\n```\n## 不是标题\n```\n| a | b |\n|---|---|\n## 表格行\n\n## 第二章\n<p>正文</p>"
+
+
+def _feed(doc, size):
+    buffer = SectionBuffer()
+    sections = []
+    for i in range(0, len(doc), size):
+        sections.extend(buffer.feed(doc[i:i + size]))
+    sections.append(buffer.flush())
+    return sections
+
+
+def test_sections_render_like_whole_document():
+    for doc in CORPUS + [FENCED]:
+        for size in (1, 7, 1000):
+            sections = _feed(doc, size)
+            assert ''.join(sections) == doc
+            incremental = MarkdownToPPT()
+            for section in sections:
+                incremental.process_markdown(section)
+            whole = MarkdownToPPT()
+            whole.process_markdown(doc)
+            assert _slides_xml(incremental) == _slides_xml(whole), doc
+
+
+def test_fence_and_table_rows_do_not_split():
+    assert [s.split('\n', 1)[0] for s in _feed(FENCED, 1)] == ['# 标题', '## 第二章']
+
+
+def test_generate_content_ppt(fake_llm_server, monkeypatch):
+    fake_llm_server.reply = CORPUS[1]
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    client = app_module.app.test_client()
+
+    body = client.post('/api/generate_content_ppt', json={'outline': '# 测试'}).get_data(as_text=True)
+    events = [json.loads(line[6:]) for line in body.split('\n\n') if line.startswith('data: {')]
+    assert ''.join(e['content'] for e in events if 'content' in e) == CORPUS[1]
+    slides = [e for e in events if 'slide' in e]
+    assert [e['title'] for e in slides] == ['人工智能发展简介', '第一章 人工智能概述', '第二章 关键技术', '总结']
+
+    response = client.get(events[-1]['url'])
+    deck = Presentation(io.BytesIO(response.data))
+    whole = MarkdownToPPT()
+    whole.process_markdown(CORPUS[1])
+    assert len(deck.slides) == slides[-1]['slide'] == len(whole.prs.slides)
+    assert client.get('/api/decks/missing').status_code == 404
+
+
+def test_generate_content_ppt_holds_render_slot(fake_llm_server, monkeypatch):
+    fake_llm_server.reply = CORPUS[1]
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    monkeypatch.setattr(app_module, 'render_slots', threading.BoundedSemaphore(1))
+    held = []
+    for name in ('process_markdown', 'save'):
+        def wrapper(self, *args, original=getattr(MarkdownToPPT, name), **kwargs):
+            held.append(not app_module.render_slots.acquire(blocking=False))
+            return original(self, *args, **kwargs)
+        monkeypatch.setattr(MarkdownToPPT, name, wrapper)
+    client = app_module.app.test_client()
+
+    body = client.post('/api/generate_content_ppt', json={'outline': '# 测试'}).get_data(as_text=True)
+    assert '"deck_id"' in body
+    assert len(held) == 5 and all(held)
+    # 段落之间不占用名额
+    assert app_module.render_slots.acquire(blocking=False)
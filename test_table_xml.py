@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+表格XML批量生成测试：与python-pptx逐个单元格设置的结果一致，不规则的行和特殊字符，大表格分页
+"""
+import io
+
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+from md2ppt import MarkdownToPPT
+from table_xml import normalize_rows
+
+
+def table_cells(table):
+    return [[(cell.text, cell.text_frame.paragraphs[0].font.size) for cell in row.cells] for row in table.rows]
+
+
+def test_matches_per_cell_table():
+    rows = [['名称', '数值'], ['a&b <c>', '1'], ['多行\n文本', '']]
+    converter = MarkdownToPPT()
+    converter.add_table(rows)
+    bulk = converter.prs.slides[0].shapes[-1]
+
+    reference = converter.prs.slides[0].shapes.add_table(3, 2, bulk.left, bulk.top, bulk.width, bulk.height).table
+    for i, row in enumerate(rows):
+        reference.rows[i].height = bulk.table.rows[i].height
+        for j, text in enumerate(row):
+            reference.cell(i, j).text = text
+            for paragraph in reference.cell(i, j).text_frame.paragraphs:
+                paragraph.font.size = Pt(14)
+
+    assert table_cells(bulk.table) == table_cells(reference)
+    assert [column.width for column in bulk.table.columns] == [column.width for column in reference.columns]
+    assert bulk.table.first_row and bulk.table.horz_banding
+
+
+def test_ragged_rows_and_invalid_characters():
+    assert normalize_rows([['a'], ['1', 2, '3'], []]) == ([['a', '', ''], ['1', '2', '3'], ['', '', '']], 3)
+    converter = MarkdownToPPT()
+    converter.add_table([['a', 'b'], ['1', '2', '3'], ['控制\x0b字符']])
+    converter.add_table([[]])
+    output = io.BytesIO()
+    converter.save(output)
+    shapes = Presentation(io.BytesIO(output.getvalue())).slides[0].shapes
+    assert len(shapes) == 1
+    assert [[cell.text for cell in row.cells] for row in shapes[0].table.rows] == [
+        ['a', 'b', ''], ['1', '2', '3'], ['控制字符', '', '']]
+
+
+def test_large_table_is_paginated():
+    rows = [[f'列{j}' for j in range(10)]] + [[f'{i}-{j}' for j in range(10)] for i in range(1000)]
+    converter = MarkdownToPPT()
+    converter.add_table(rows)
+    body = []
+    for slide in converter.prs.slides:
+        table = slide.shapes[-1]
+        assert table.top + table.height <= converter.content_bottom() + Inches(0.01)
+        cells = [[cell.text for cell in row.cells] for row in table.table.rows]
+        assert cells[0] == rows[0]
+        body.extend(cells[1:])
+    assert body == rows[1:]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+模板缓存测试：按模板ID注册和取用、LRU淘汰、未知模板返回404、每次请求取到独立的副本
+"""
+import io
+
+from pptx import Presentation
+from pptx.util import Inches
+
+import app as app_module
+from template_cache import TemplateCache, template_hash
+
+
+def make_template(width=10, title=None):
+    """生成模板字节，带一张示例幻灯片（注册时会被删除）"""
+    prs = Presentation()
+    prs.slide_width = Inches(width)
+    slide = prs.slides.add_slide(prs.slide_layouts[0])
+    slide.shapes.title.text = title or '示例'
+    output = io.BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+def test_register_and_get_by_id():
+    cache = TemplateCache()
+    data = make_template(12)
+    template_id = cache.register(io.BytesIO(data))
+    assert template_id == template_hash(data) and template_id in cache
+    # 相同内容只注册一次
+    assert cache.register(data) == template_id and len(cache) == 1
+
+    prs = cache.get(template_id)
+    assert prs.slide_width == Inches(12) and len(prs.slides) == 0
+    assert cache.get('unknown') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_lru_eviction():
+    cache = TemplateCache(max_size=2)
+    first, second, third = (cache.register(make_template(title=str(i))) for i in range(3))
+    assert first not in cache and second in cache and third in cache
+
+    # 使用过的模板不会被淘汰
+    cache.get(second)
+    fourth = cache.register(make_template(title='3'))
+    assert third not in cache and second in cache and fourth in cache
+
+
+def test_unknown_template_id_returns_404():
+    client = app_module.app.test_client()
+    response = client.post('/api/generate_ppt', data={'content': '# 标题', 'template_id': 'unknown'})
+    assert response.status_code == 404
+    assert client.get('/api/templates/unknown').status_code == 404
+
+
+def test_cached_template_is_isolated_between_requests():
+    cache = TemplateCache()
+    template_id = cache.register(make_template(12))
+    prs = cache.get(template_id)
+    prs.slides.add_slide(prs.slide_layouts[0]).shapes.title.text = '第一次请求'
+    assert len(cache.get(template_id).slides) == 0
+
+    # 接口中两次使用同一个模板，第二次的结果不包含第一次的幻灯片
+    client = app_module.app.test_client()
+    template_id = client.post('/api/templates', data={
+        'template': (io.BytesIO(make_template(12)), 'a.pptx')}).get_json()['template_id']
+    first = client.post('/api/generate_ppt', data={'content': '# 第一份\n\n## 章节\n\n内容', 'template_id': template_id})
+    second = client.post('/api/generate_ppt', data={'content': '# 第二份', 'template_id': template_id})
+    first, second = Presentation(io.BytesIO(first.data)), Presentation(io.BytesIO(second.data))
+    assert len(first.slides) == 2 and len(second.slides) == 1
+    assert second.slide_width == Inches(12)
+    assert second.slides[0].shapes[0].text_frame.text == '第二份'
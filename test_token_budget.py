@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+LLM token预算测试：提示词token估算和校准、按路由和标题数计算max_tokens、截断后自动续写
+"""
+import json
+
+import app as app_module
+from llm_client import LLMClient
+from metrics import LLM_CONTINUATIONS, LLM_ROUTE_TOKENS
+from token_budget import TokenBudget, count_headings, estimate_tokens
+
+BUDGETS = {'topics': (64, 40, 1024), 'content': (256, 150, 8000), 'default': (2000, 0, 2000)}
+OUTLINE = '# 年度总结\n\n## 第一章\n### 要点一\n### 要点二\n\n## 第二章\n### 要点\n'
+
+
+def test_count_and_calibrate():
+    assert estimate_tokens('你好世界') == 3
+    assert estimate_tokens('hello world') == 3
+    budget = TokenBudget(BUDGETS, 32768)
+    messages = [{"role": "user", "content": '你好世界' * 100}]
+    estimated = budget.count(messages)
+    assert estimated == 284
+
+    # 服务端返回的token数是估算的两倍，校准后估算结果逐渐接近
+    for _ in range(20):
+        budget.calibrate(messages, estimated * 2)
+    assert 1.9 < budget.ratio < 2.0
+    assert 540 < budget.count(messages) < 570
+
+
+def test_max_tokens_by_route():
+    budget = TokenBudget(BUDGETS, 4096)
+    assert budget.max_tokens('topics', 100, items=5) == 264
+    assert budget.max_tokens('content', 100, items=count_headings(OUTLINE)) == 256 + 150 * 6
+    assert budget.max_tokens('content', 100, items=200) == 4096 - 100 - 64
+    assert budget.max_tokens('unknown', 100) == 2000
+    assert budget.max_tokens('content', 4090) == 0
+
+
+def test_generate_content_continues_truncated_reply(fake_llm_server, monkeypatch):
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    # 续写请求带有已输出的内容
+    fake_llm_server.reply_for = lambda body: '后半部分' if len(body['messages']) > 1 else '前半部分'
+    fake_llm_server.truncated = 1
+    continuations = LLM_CONTINUATIONS.value('content')
+    completion = LLM_ROUTE_TOKENS.value('content', 'completion')
+
+    client = app_module.app.test_client()
+    response = client.post('/api/generate_content', json={'outline': OUTLINE, 'fanout': False})
+    contents = [json.loads(line[6:]).get('content', '') for line in response.get_data(as_text=True).split('\n\n')
+                if line.startswith('data: ') and line != 'data: [DONE]']
+    assert ''.join(contents) == '前半部分后半部分'
+
+    first, second = fake_llm_server.requests
+    assert first['max_tokens'] == app_module.token_budget.max_tokens(
+        'content', app_module.token_budget.count(first['messages']), 6)
+    assert second['messages'][-2] == {'role': 'assistant', 'content': '前半部分'}
+    assert LLM_CONTINUATIONS.value('content') == continuations + 1
+    assert LLM_ROUTE_TOKENS.value('content', 'completion') == completion + 8
+    assert client.get('/api/stats').get_json()['llm_tokens']['routes']['content']['continuations'] >= 1
+
+
+def test_generate_topics_small_budget(fake_llm_server, monkeypatch):
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(fake_llm_server.url, 'test-model'))
+    monkeypatch.setattr(app_module, 'llm_cache', None)
+    fake_llm_server.reply = '标题一\n标题二\n标题三'
+    response = app_module.app.test_client().post('/api/generate_topics', json={
+        'role': '讲师', 'title': '人工智能', 'topicNum': 3})
+    assert response.get_json()['topics'] == ['标题一', '标题二', '标题三']
+    assert fake_llm_server.requests[0]['max_tokens'] == 64 + 40 * 3
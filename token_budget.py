@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM token预算
+
+固定的 max_tokens 对只有几行的回复（子主题标题）在模型服务端预留了过多的KV缓存，
+对标题多的大纲生成正文时又不够用，输出被截断。这里按路由和提示词长度估算每次调用的 max_tokens：
+
+- 提示词的token数优先用本地分词器（config.LLM_TOKENIZER，需要安装 tokenizers 或 transformers）计算，
+  没有分词器时按字符数估算（中日韩文字和其他字符按不同比例），估算结果按服务端返回的
+  usage.prompt_tokens 校准；
+- 输出预算 = 基础token数 + 每项token数 × 项数（子主题数、大纲标题数），不超过路由的上限，
+  也不超过上下文长度减去提示词；
+- 回复因长度截断（finish_reason 为 length）时，调用方用 continuation_messages 把已输出的内容
+  作为assistant消息，请求模型从中断处继续。
+
+各路由的提示词、输出、预留（max_tokens）token数和续写次数记录在 metrics 中，用于容量规划。
+"""
+
+import logging
+import re
+import threading
+
+from metrics import LLM_CONTINUATIONS, LLM_ROUTE_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# 按字符估算：中日韩文字约1.4个字一个token，其他字符约3个一个token
+_CJK_CHARS = re.compile('[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+CJK_TOKENS_PER_CHAR = 0.7
+OTHER_TOKENS_PER_CHAR = 0.3
+# 每条消息的角色和分隔符
+MESSAGE_TOKENS = 4
+
+CONTINUE_PROMPT = '你的回答因长度限制被截断了，请从中断处继续输出，不要重复已经输出的内容，也不要添加任何说明。'
+
+
+def count_headings(markdown):
+    """Markdown中的标题行数，用于估算正文的输出长度"""
+    return sum(1 for line in (markdown or '').splitlines() if line.lstrip().startswith('#'))
+
+
+def continuation_messages(messages, partial):
+    """回复被截断后请求继续生成的消息列表"""
+    return list(messages) + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+
+
+def load_tokenizer(name):
+    """加载本地分词器，返回计算文本token数的函数；没有安装依赖或加载失败时返回None
+
+    name为 tokenizer.json 文件路径（使用 tokenizers），或 transformers 的模型名、目录。
+    """
+    try:
+        if name.endswith('.json'):
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(name)
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    except Exception as e:
+        logger.warning('无法加载分词器 %s，按字符数估算token数: %s', name, e)
+        return None
+
+
+class TokenBudget:
+    def __init__(self, budgets, context_window, tokenizer=None, margin=64):
+        """初始化预算
+
+        budgets: {路由: (基础token数, 每项token数, 上限)}，没有配置的路由使用 default
+        context_window: 模型的上下文长度（提示词加输出）
+        tokenizer: 本地分词器（见 load_tokenizer），第一次计算时才加载，None时按字符估算
+        margin: 估算误差的余量
+        """
+        self.budgets = budgets
+        self.context_window = context_window
+        self.tokenizer_name = tokenizer
+        self.margin = margin
+        self._tokenizer = None
+        self._tokenizer_loaded = not tokenizer
+        self._lock = threading.Lock()
+        # 服务端返回的实际token数与字符估算之比
+        self.ratio = 1.0
+        self._usage = {}
+
+    def _count_text(self):
+        """返回计算文本token数的函数和是否精确"""
+        if not self._tokenizer_loaded:
+            with self._lock:
+                if not self._tokenizer_loaded:
+                    self._tokenizer = load_tokenizer(self.tokenizer_name)
+                    self._tokenizer_loaded = True
+        if self._tokenizer is not None:
+            return self._tokenizer, True
+        return estimate_tokens, False
+
+    def count(self, messages):
+        """估算消息列表的提示词token数"""
+        count_text, exact = self._count_text()
+        tokens = sum(count_text(message.get('content') or '') + MESSAGE_TOKENS for message in messages)
+        return tokens if exact else int(tokens * self.ratio + 0.5)
+
+    def calibrate(self, messages, prompt_tokens):
+        """按服务端返回的提示词token数校准字符估算的比例"""
+        if not prompt_tokens or self._count_text()[1]:
+            return
+        estimated = sum(estimate_tokens(message.get('content') or '') + MESSAGE_TOKENS for message in messages)
+        if estimated:
+            with self._lock:
+                self.ratio = 0.8 * self.ratio + 0.2 * (prompt_tokens / estimated)
+
+    def max_tokens(self, route, prompt_tokens, items=0):
+        """按路由和项数计算max_tokens，没有剩余上下文时返回0"""
+        base, per_item, limit = self.budgets.get(route) or self.budgets['default']
+        available = self.context_window - prompt_tokens - self.margin
+        return max(0, min(base + per_item * items, limit, available))
+
+    def record(self, route, prompt_tokens, max_tokens, result, continued=False):
+        """记录一次调用的token用量，result为LLM客户端返回的 finish_reason 和 usage"""
+        prompt_tokens = result.get('prompt_tokens') or prompt_tokens
+        completion_tokens = result.get('completion_tokens') or 0
+        LLM_ROUTE_TOKENS.inc(prompt_tokens, route, 'prompt')
+        LLM_ROUTE_TOKENS.inc(completion_tokens, route, 'completion')
+        LLM_ROUTE_TOKENS.inc(max_tokens, route, 'reserved')
+        if continued:
+            LLM_CONTINUATIONS.inc(1, route)
+        with self._lock:
+            usage = self._usage.setdefault(route, {
+                'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'reserved_tokens': 0, 'continuations': 0, 'truncated': 0,
+            })
+            usage['calls'] += 1
+            usage['prompt_tokens'] += prompt_tokens
+            usage['completion_tokens'] += completion_tokens
+            usage['reserved_tokens'] += max_tokens
+            usage['continuations'] += continued
+            usage['truncated'] += result.get('finish_reason') == 'length'
+
+    def stats(self):
+        """返回各路由的token用量和估算比例"""
+        with self._lock:
+            return {
+                'ratio': round(self.ratio, 3),
+                'tokenizer': self._tokenizer is not None,
+                'routes': {route: dict(usage) for route, usage in self._usage.items()},
+            }
+
+
+def estimate_tokens(text):
+    """按字符数估算文本的token数"""
+    cjk = len(_CJK_CHARS.findall(text))
+    return int(cjk * CJK_TOKENS_PER_CHAR + (len(text) - cjk) * OTHER_TOKENS_PER_CHAR + 0.5)